@@ -3,12 +3,23 @@ Admin endpoints for file management and system monitoring.
 """
 
 import os
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Depends
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 
 from app.core.config import settings
+from app.core.profiler import (
+    PROFILE_FORMATS,
+    SamplingProfiler,
+    new_profile_id,
+    profile_extension,
+    profile_summary
+)
+from app.core.queue_stats import queue_stats_collector
+from app.core.autoscaler import worker_autoscaler
 from app.middleware.auth import RequireAdminAuth
 from app.workers.cleanup import (
     cleanup_old_files,
@@ -68,6 +79,17 @@ class DirectoryListResponse(BaseModel):
     items: List[FileInfo]
 
 
+class ProfileRequest(BaseModel):
+    """Request model for on-demand profiling."""
+    seconds: float = 10
+    interval_ms: float = 10
+    format: str = "collapsed"
+
+
+# One on-demand profile at a time per API process
+_profile_lock = asyncio.Lock()
+
+
 @router.get("/disk-usage", response_model=DiskUsageResponse)
 async def get_disk_usage_endpoint():
     """
@@ -300,4 +322,214 @@ async def get_system_health():
         raise HTTPException(
             status_code=500, 
             detail="Failed to get system health information"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/queues")
+async def get_queue_stats():
+    """
+    Get the backlog of every Celery queue.
+    
+    Returns the latest snapshot of the queue statistics collector: per queue
+    the waiting messages, age of the oldest one, recent throughput, estimated
+    wait and consuming worker slots, plus the reserved (unacked) task count.
+    """
+    try:
+        snapshot = await queue_stats_collector.get_snapshot()
+        if snapshot is None:
+            # Nothing collected yet (e.g. right after startup)
+            snapshot = await queue_stats_collector.collect()
+        return snapshot
+    except Exception as e:
+        logger.error(f"Error getting queue statistics: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get queue statistics")
+
+
+@router.get("/autoscaler")
+async def get_autoscaler_state():
+    """
+    Get the state of the worker pool autoscaler.
+    
+    Returns whether it is enabled, its bounds and its last decision: action,
+    demand, rate limited share of FAL.AI requests and the current and target
+    pool size of every worker.
+    """
+    try:
+        state = await worker_autoscaler.get_state()
+        return {
+            "enabled": settings.AUTOSCALE_ENABLED,
+            "dry_run": settings.AUTOSCALE_DRY_RUN,
+            "queue": settings.AUTOSCALE_QUEUE,
+            "min_concurrency": settings.AUTOSCALE_MIN_CONCURRENCY,
+            "max_concurrency": settings.AUTOSCALE_MAX_CONCURRENCY,
+            "max_total_concurrency": settings.AUTOSCALE_MAX_TOTAL_CONCURRENCY,
+            "last_decision": state.get("last_decision")
+        }
+    except Exception as e:
+        logger.error(f"Error getting autoscaler state: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get autoscaler state")
+
+
+def _validate_profile_request(request: ProfileRequest) -> None:
+    """Reject profiling requests while the profiler is disabled or out of bounds."""
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(
+            status_code=403,
+            detail="Profiler is disabled. Set PROFILER_ENABLED=true to enable it."
+        )
+    if request.format not in PROFILE_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Format must be one of: {', '.join(PROFILE_FORMATS)}"
+        )
+    if not 0 < request.seconds <= settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be between 0 and {settings.PROFILER_MAX_SECONDS}"
+        )
+    if not 1 <= request.interval_ms <= 1000:
+        raise HTTPException(
+            status_code=400,
+            detail="interval_ms must be between 1 and 1000"
+        )
+
+
+@router.post("/profiler/api")
+async def profile_api_process(request: ProfileRequest = ProfileRequest()):
+    """
+    Profile the API process handling this request for ``seconds``.
+    
+    With several API workers only the process serving the request is profiled;
+    its identifier is returned with the profile summary.
+    
+    Args:
+        request: Duration, sampling interval and output format
+    """
+    _validate_profile_request(request)
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running in this process")
+    
+    async with _profile_lock:
+        interval = request.interval_ms / 1000
+        profiler = SamplingProfiler(interval=interval).start()
+        try:
+            await asyncio.sleep(request.seconds)
+        finally:
+            profiler.stop()
+        stacks, duration = profiler.drain()
+        try:
+            return await asyncio.to_thread(
+                profile_summary, stacks, new_profile_id(), "api", request.format, interval, duration
+            )
+        except OSError as e:
+            logger.error(f"Error writing API profile: {str(e)}")
+            raise HTTPException(status_code=500, detail="Failed to write profile")
+
+
+@router.post("/profiler/workers")
+async def profile_worker_processes(request: ProfileRequest = ProfileRequest()):
+    """
+    Profile all worker processes for ``seconds``.
+    
+    A control task on the priority queue publishes the request; every worker
+    process writes its own profile when the window ends. List them with
+    ``GET /admin/profiler/profiles/{profile_id}``.
+    
+    Args:
+        request: Duration, sampling interval and output format
+    """
+    _validate_profile_request(request)
+    from app.workers.tasks import start_worker_profile
+    
+    profile_id = new_profile_id()
+    try:
+        task = start_worker_profile.delay(
+            profile_id=profile_id,
+            seconds=request.seconds,
+            interval=request.interval_ms / 1000,
+            format=request.format
+        )
+        accepted = await asyncio.to_thread(task.get, timeout=10)
+    except Exception as e:
+        logger.error(f"Error starting worker profile: {str(e)}")
+        raise HTTPException(status_code=503, detail="No worker accepted the profiling request")
+    
+    return {
+        "profile_id": profile_id,
+        "accepted_by": accepted.get("worker"),
+        "seconds": request.seconds,
+        "format": request.format,
+        "profiles_url": f"/api/v1/admin/profiler/profiles/{profile_id}"
+    }
+
+
+def _profile_dir(profile_id: str) -> str:
+    """Get the directory of a profile, rejecting ids that escape PROFILES_DIR."""
+    if not profile_id or os.path.basename(profile_id) != profile_id or profile_id.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid profile id")
+    return os.path.join(settings.PROFILES_DIR, profile_id)
+
+
+@router.get("/profiler/profiles")
+async def list_profiles(limit: int = Query(50, description="Maximum number of profiles to return")):
+    """
+    List recorded profiles, newest first.
+    """
+    if not os.path.isdir(settings.PROFILES_DIR):
+        return {"profiles": []}
+    
+    profile_ids = sorted(os.listdir(settings.PROFILES_DIR), reverse=True)[:limit]
+    return {
+        "profiles": [
+            {"profile_id": profile_id, "files": len(os.listdir(os.path.join(settings.PROFILES_DIR, profile_id)))}
+            for profile_id in profile_ids
+            if os.path.isdir(os.path.join(settings.PROFILES_DIR, profile_id))
+        ]
+    }
+
+
+@router.get("/profiler/profiles/{profile_id}")
+async def get_profile_files(profile_id: str):
+    """
+    List the per-process files of a profile.
+    
+    Args:
+        profile_id: Profile identifier
+    """
+    profile_dir = _profile_dir(profile_id)
+    if not os.path.isdir(profile_dir):
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    
+    files = []
+    for name in sorted(os.listdir(profile_dir)):
+        if name.endswith(".partial"):
+            continue
+        stat_info = os.stat(os.path.join(profile_dir, name))
+        files.append({
+            "file": name,
+            "size_bytes": stat_info.st_size,
+            "modified": str(stat_info.st_mtime),
+            "download_url": f"/api/v1/admin/profiler/profiles/{profile_id}/{name}"
+        })
+    return {"profile_id": profile_id, "files": files}
+
+
+@router.get("/profiler/profiles/{profile_id}/{filename}")
+async def download_profile(profile_id: str, filename: str):
+    """
+    Download one profile file.
+    
+    Args:
+        profile_id: Profile identifier
+        filename: File name from the profile listing
+    """
+    profile_dir = _profile_dir(profile_id)
+    if os.path.basename(filename) != filename:
+        raise HTTPException(status_code=400, detail="Invalid file name")
+    
+    path = os.path.join(profile_dir, filename)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Profile file {filename} not found")
+    
+    media_type = "application/json" if filename.endswith(profile_extension("speedscope")) else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=filename)
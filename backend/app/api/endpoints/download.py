@@ -4,7 +4,7 @@ Download endpoints for generated 3D model files.
 
 import os
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pathlib import Path
 
 from fastapi import APIRouter, HTTPException, Request, Depends
@@ -28,12 +28,23 @@ class FileInfo(BaseModel):
     rendered_image: Dict[str, Any] = None  # Optional rendered image data
 
 
+class FileStatus(BaseModel):
+    """Processing status of one file of a batch."""
+    file_index: int
+    status: str
+    filename: Optional[str] = None
+    error: Optional[str] = None
+
+
 class JobFilesResponse(BaseModel):
     """Response model for job files listing."""
     job_id: str
     files: List[FileInfo]
     download_urls: List[str]
     total_files: int
+    status: str = "completed"  # "processing" while files of the batch are still pending
+    file_statuses: List[FileStatus] = []
+    pending_files: int = 0
 
 
 def _validate_job_id(job_id: str) -> None:
@@ -176,6 +187,10 @@ async def list_job_files(job_id: str, request: Request):
     """
     List all available files for a specific job.
     
+    Files are listed as soon as they complete, so a batch still processing
+    returns its finished files with status "processing", the status of every
+    file and the number still pending.
+    
     Args:
         job_id: Unique job identifier
         request: FastAPI request object for logging
@@ -198,43 +213,13 @@ async def list_job_files(job_id: str, request: Request):
         
         logger.info(f"Job store result for {job_id}: {job_result is not None}")
         
-        # If not in job store, try to get from Celery task result
-        if not job_result:
-            try:
-                from app.core.celery_app import celery_app
-                # Look for any recent task with this job_id in the result
-                # This is a bit hacky but works for now
-                inspect = celery_app.control.inspect()
-                active_tasks = inspect.active()
-                
-                # Also check Redis directly for completed tasks
-                from celery.result import AsyncResult
-                # We need to find the task ID for this job
-                # For now, check if we stored it in upload response
-                # As a fallback, scan recent results
-                
-                # Try Redis backend directly
-                import redis
-                r = redis.Redis(host='redis', port=6379, db=0)
-                
-                # Look for keys matching celery-task-meta-*
-                for key in r.scan_iter(match="celery-task-meta-*", count=100):
-                    try:
-                        task_data = r.get(key)
-                        if task_data:
-                            import json
-                            result = json.loads(task_data)
-                            if result.get('status') == 'SUCCESS':
-                                task_result = result.get('result', {})
-                                if task_result.get('job_id') == job_id and 'job_result' in task_result:
-                                    job_result = task_result['job_result']
-                                    logger.info(f"Found job result in Celery backend for {job_id}")
-                                    break
-                    except Exception as e:
-                        continue
-                        
-            except Exception as e:
-                logger.warning(f"Failed to check Celery results: {e}")
+        # Files are published one by one as they complete, before the batch is finalized
+        file_results = job_store.get_file_results(job_id)
+        if not job_result and file_results:
+            job_result = {
+                "job_id": job_id,
+                "files": [f for f in file_results["files"] if f["status"] == "completed" and f.get("model_url")]
+            }
         
         if job_result:
             # We have FAL.AI results - return them directly
@@ -256,14 +241,32 @@ async def list_job_files(job_id: str, request: Request):
                 # Use the direct FAL.AI URL
                 download_urls.append(file_data.get("model_url", ""))
             
+            # Per-file status of the whole batch, including failed and pending files
+            file_statuses = []
+            pending_files = 0
+            if file_results:
+                file_statuses = [
+                    FileStatus(
+                        file_index=f["file_index"],
+                        status=f["status"],
+                        filename=f.get("filename"),
+                        error=f.get("error")
+                    )
+                    for f in file_results["files"]
+                ]
+                pending_files = max(0, file_results["total_files"] - len(file_statuses))
+            
             # Log successful listing
-            logger.info(f"Listed {len(files)} FAL.AI files for job {job_id} to {client_ip}")
+            logger.info(f"Listed {len(files)} FAL.AI files for job {job_id} to {client_ip} ({pending_files} pending)")
             
             return JobFilesResponse(
                 job_id=job_id,
                 files=files,
                 download_urls=download_urls,
-                total_files=len(files)
+                total_files=len(files),
+                status="processing" if pending_files else "completed",
+                file_statuses=file_statuses,
+                pending_files=pending_files
             )
         
         # Fallback to local file system (for backward compatibility)
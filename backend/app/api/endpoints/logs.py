@@ -3,17 +3,32 @@ Log management and monitoring endpoints.
 """
 
 import asyncio
+import re
+import uuid
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 from fastapi import APIRouter, HTTPException, status, Query, BackgroundTasks
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 import logging
 
+from app.core.config import settings
+from app.core.log_export import export_extension
 from app.core.log_management import log_manager, log_aggregator
+from app.middleware.auth import RequireAdminAuth
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+EXPORT_ID_PATTERN = re.compile(r"^export_[0-9a-f]{32}$")
+
+EXPORT_MEDIA_TYPES = {
+    "json": "application/x-ndjson",
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+    "txt": "text/plain"
+}
+
 
 class LogStatisticsResponse(BaseModel):
     """Log statistics response model."""
@@ -191,49 +206,74 @@ async def get_log_types():
         )
 
 
+def _parse_export_range(start_date: str, end_date: str):
+    """Parse an export date range; date-only end dates include the whole day."""
+    start_dt = datetime.fromisoformat(start_date)
+    end_dt = datetime.fromisoformat(end_date)
+    if len(end_date) == 10:
+        end_dt += timedelta(days=1)
+    
+    if start_dt >= end_dt:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "Start date must be before end date"}
+        )
+    return start_dt, end_dt
+
+
+def _parse_log_types(log_types: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated list of log types."""
+    if not log_types:
+        return None
+    return [t.strip() for t in log_types.split(",") if t.strip()]
+
+
 @router.post("/export")
 async def export_logs(
     background_tasks: BackgroundTasks,
     start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
     end_date: str = Query(..., description="End date in YYYY-MM-DD format"),
     log_types: Optional[str] = Query(None, description="Comma-separated log types"),
-    format: str = Query("json", regex="^(json|csv|txt)$", description="Export format")
+    format: str = Query("json", regex="^(json|csv|txt)$", description="Export format"),
+    compress: bool = Query(False, description="Gzip the exported file")
 ):
     """
     Export logs for a date range (background task).
+    
+    Progress is available from /status/jobs/{export_id}/progress and the file
+    from /logs/export/{export_id}/download once complete.
     """
     try:
-        start_dt = datetime.fromisoformat(start_date)
-        end_dt = datetime.fromisoformat(end_date)
-        
-        if start_dt > end_dt:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail={"error": "Start date must be before end date"}
-            )
+        start_dt, end_dt = _parse_export_range(start_date, end_date)
         
         # Parse log types
-        log_type_list = None
-        if log_types:
-            log_type_list = [t.strip() for t in log_types.split(",")]
+        log_type_list = _parse_log_types(log_types)
+        
+        export_id = f"export_{uuid.uuid4().hex}"
         
         # Start background export task
         background_tasks.add_task(
             _background_export_logs,
-            start_dt, end_dt, log_type_list, format
+            start_dt, end_dt, log_type_list, format, compress, export_id
         )
         
         return {
+            "export_id": export_id,
             "status": "export_started",
             "message": "Log export started in background",
+            "progress_url": f"{settings.API_V1_STR}/status/jobs/{export_id}/progress",
+            "download_url": f"{settings.API_V1_STR}/logs/export/{export_id}/download",
             "parameters": {
                 "start_date": start_date,
                 "end_date": end_date,
                 "log_types": log_type_list,
-                "format": format
+                "format": format,
+                "compress": compress
             }
         }
         
+    except HTTPException:
+        raise
     except ValueError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -247,6 +287,62 @@ async def export_logs(
         )
 
 
+@router.get("/export/stream", dependencies=[RequireAdminAuth])
+async def stream_logs_export(
+    start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
+    end_date: str = Query(..., description="End date in YYYY-MM-DD format"),
+    log_types: Optional[str] = Query(None, description="Comma-separated log types"),
+    format: str = Query("json", regex="^(json|csv|txt)$", description="Export format"),
+    compress: bool = Query(False, description="Gzip the exported data")
+):
+    """
+    Stream a log export directly as a chunked download.
+    
+    Requires the admin API key: exports contain client IPs, user agents and paths.
+    """
+    try:
+        start_dt, end_dt = _parse_export_range(start_date, end_date)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "Invalid date format. Use YYYY-MM-DD format."}
+        )
+    
+    # The blocking generator is iterated in the threadpool by StreamingResponse
+    chunks = log_aggregator.iter_export(start_dt, end_dt, _parse_log_types(log_types), format, compress)
+    filename = f"logs_export_{start_dt.date()}_{end_dt.date()}.{export_extension(format, compress)}"
+    
+    return StreamingResponse(
+        chunks,
+        media_type="application/gzip" if compress else EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/export/{export_id}/download", dependencies=[RequireAdminAuth])
+async def download_logs_export(export_id: str):
+    """
+    Download a completed background log export (admin API key required).
+    """
+    if not EXPORT_ID_PATTERN.match(export_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "Invalid export id"}
+        )
+    
+    export_path = log_aggregator.get_export_path(export_id)
+    if export_path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "Export not found or not complete yet", "export_id": export_id}
+        )
+    
+    media_type = "application/gzip" if export_path.suffix == ".gz" else EXPORT_MEDIA_TYPES.get(
+        export_path.suffix.lstrip("."), "application/octet-stream"
+    )
+    return FileResponse(str(export_path), media_type=media_type, filename=export_path.name)
+
+
 @router.get("/health")
 async def log_system_health():
     """
@@ -309,12 +405,14 @@ async def _background_export_logs(
     start_date: datetime,
     end_date: datetime,
     log_types: Optional[List[str]],
-    format: str
+    format: str,
+    compress: bool,
+    export_id: str
 ):
     """Background task for log export."""
     try:
         export_path = await log_aggregator.export_logs(
-            start_date, end_date, log_types, format
+            start_date, end_date, log_types, format, compress, export_id
         )
         logger.info(f"Log export completed: {export_path}")
     except Exception as e:
@@ -14,6 +14,7 @@ from fastapi.responses import StreamingResponse
 from app.core.celery_app import celery_app
 from app.core.exceptions import ProcessingException, NetworkException, log_exception
 from app.core.progress_tracker import progress_tracker
+from app.core.job_timeline import job_timeline
 
 logger = logging.getLogger(__name__)
 
@@ -150,7 +151,8 @@ async def stream_task_status(
                         # Task completed successfully
                         result = task_result.result or {}
                         
-                        # Check if this is a chord starter task
+                        # Check if this is a chord starter task (process_batch); uploads return
+                        # the chord callback id directly, which needs no switch
                         if isinstance(result, dict) and result.get('chord_task_id'):
                             # This is a batch processing task that started a chord
                             # We need to continue tracking the chord
@@ -554,4 +556,32 @@ async def get_job_progress(job_id: str):
         raise HTTPException(
             status_code=500,
             detail=f"Failed to retrieve job progress: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/jobs/{job_id}/timeline")
+async def get_job_timeline(job_id: str):
+    """
+    Get the phase timeline of a batch job.
+    
+    Phases are recorded from upload to stored results, including the
+    upload/submit/first-progress/completion marks of every file, so that
+    slow jobs can be broken down along their critical path.
+    
+    Args:
+        job_id: The job identifier
+        
+    Returns:
+        Dict with job timeline information including:
+        - phases: Job phase timestamps and offsets from the first mark
+        - durations: Seconds spent in each job segment (queue waits, processing, finalize)
+        - critical_file_index: Index of the last file to complete
+        - files: Per-file phases and durations
+    """
+    timeline = await asyncio.to_thread(job_timeline.get_timeline, job_id)
+    if not timeline:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No timeline found for job {job_id}"
+        )
+    return timeline
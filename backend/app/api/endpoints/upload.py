@@ -3,11 +3,14 @@ File upload endpoints.
 """
 
 import os
+import time
+import asyncio
+import hashlib
 import uuid
 import logging
 from typing import List, Optional
 
-from fastapi import APIRouter, File, HTTPException, UploadFile, Form, Query, Depends, Request
+from fastapi import APIRouter, File, HTTPException, UploadFile, Form, Query, Depends, Request, Header
 from pydantic import BaseModel, Field
 
 from app.core.config import settings
@@ -15,6 +18,9 @@ from app.middleware.auth import RequireAuth
 from app.middleware.rate_limit import upload_rate_limit
 from fastapi.security import HTTPAuthorizationCredentials
 from app.core.session_store import session_store
+from app.core.job_timeline import job_timeline
+from app.core.admission import admission_controller, AdmissionRejected, client_id
+from app.core.idempotency import idempotency_store, request_fingerprint, PENDING, PENDING_REFRESH_SECONDS
 from app.core.exceptions import (
     FileValidationException, 
     DatabaseException, 
@@ -25,7 +31,7 @@ from app.core.error_handlers import (
     handle_file_validation_error,
     safe_file_operation
 )
-from app.workers.tasks import process_batch
+from app.workers.tasks import dispatch_batch
 
 logger = logging.getLogger(__name__)
 
@@ -39,19 +45,20 @@ class UploadResponse(BaseModel):
     file_size: int
     content_type: str
     status: str
-    task_id: Optional[str] = None  # Added for automatic processing
+    task_id: Optional[str] = None  # Task processing this file (batch uploads)
 
 
 class BatchUploadResponse(BaseModel):
     """Batch upload response model."""
     batch_id: str
     job_id: str
-    task_id: Optional[str] = None  # Actual Celery task ID for status tracking
+    task_id: Optional[str] = None  # Chord callback task ID, tracks the whole batch
     uploaded_files: List[UploadResponse]
     face_limit: Optional[int] = None
     total_files: int
     status: str = "uploaded"
     message: str = "Files uploaded successfully, processing started"
+    estimated_completion_seconds: Optional[float] = None  # Set by admission control when known
 
 
 class ValidationError(BaseModel):
@@ -162,6 +169,7 @@ async def upload(
     request: Request,
     files: List[UploadFile] = File(...),
     face_limit: Optional[int] = Form(None, description="Maximum number of faces for 3D model generation"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     api_key: str = RequireAuth
 ):
     """
@@ -170,10 +178,13 @@ async def upload(
     Args:
         files: List of image files to upload (max 25 files)
         face_limit: Optional parameter to limit the number of faces in generated 3D models
+        idempotency_key: Optional client key; retries with the same key get the first response
         
     Returns:
         Batch upload response with file details and job information
     """
+    received_at = time.time()
+    
     # Validate batch size
     max_files = 25  # As per requirements
     if len(files) > max_files:
@@ -217,6 +228,74 @@ async def upload(
             }
         )
     
+    if not idempotency_key:
+        return await _start_upload(files, face_limit, api_key, batch_id, job_id, received_at)
+    
+    # Retried uploads get the response of the first request instead of a second job
+    owner = client_id(api_key)
+    fingerprint = await asyncio.to_thread(_upload_fingerprint, files, face_limit)
+    previous = await idempotency_store.begin(owner, idempotency_key)
+    if previous == PENDING:
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is already in progress",
+            headers={"Retry-After": str(PENDING_REFRESH_SECONDS)}
+        )
+    if previous is not None:
+        if previous.get("fingerprint") != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="This Idempotency-Key was already used for a different upload"
+            )
+        logger.info(f"Replaying upload response for job {previous['response'].get('job_id')}")
+        return BatchUploadResponse(**previous["response"])
+    
+    try:
+        async with idempotency_store.pending(owner, idempotency_key):
+            response = await _start_upload(files, face_limit, api_key, batch_id, job_id, received_at)
+    except Exception:
+        await idempotency_store.abandon(owner, idempotency_key)
+        raise
+    if response.task_id is None:
+        # Processing did not start; let the client retry with the same key
+        await idempotency_store.abandon(owner, idempotency_key)
+    else:
+        await idempotency_store.complete(owner, idempotency_key, fingerprint, response.model_dump())
+    return response
+
+
+def _upload_fingerprint(files: List[UploadFile], face_limit: Optional[int]) -> str:
+    """Fingerprint the files (names and content) and parameters of an upload (blocking, run in a thread)."""
+    digests = []
+    for file in files:
+        digest = hashlib.sha256()
+        file.file.seek(0)
+        for chunk in iter(lambda: file.file.read(1024 * 1024), b""):
+            digest.update(chunk)
+        file.file.seek(0)
+        digests.append((file.filename, digest.hexdigest()))
+    return request_fingerprint(digests, face_limit=face_limit)
+
+
+async def _start_upload(files: List[UploadFile], face_limit: Optional[int], api_key: Optional[str],
+                        batch_id: str, job_id: str, received_at: float) -> BatchUploadResponse:
+    """Admit, save and dispatch the validated files of an upload."""
+    # Admission control: reject before saving anything when processing is over capacity
+    try:
+        admission = await admission_controller.admit(api_key, job_id, len(files))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={
+                "message": e.message,
+                "retry_after": e.retry_after,
+                "estimated_completion_seconds": e.estimated_completion_seconds
+            },
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    # Rejected uploads never become jobs, so the timeline starts once admitted
+    await job_timeline.mark_async(job_id, "upload_received", received_at)
+    
     # Save all files
     uploaded_files = []
     try:
@@ -236,11 +315,14 @@ async def upload(
         except:
             pass  # Best effort cleanup
         
+        await admission_controller.cancel(job_id, api_key)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to save files: {str(e)}"
         )
     
+    await job_timeline.mark_async(job_id, "files_saved")
+    
     # Initiate Celery background job for batch processing
     try:
         file_paths = [
@@ -248,27 +330,21 @@ async def upload(
             for file in uploaded_files
         ]
         
-        # Start background processing task
-        # Always use process_batch for consistency (handles both single and multiple files)
-        task_result = process_batch.delay(
-            job_id=job_id,
-            file_paths=file_paths,
-            face_limit=face_limit
+        # Dispatch the per-file chord directly; the chord callback id tracks the whole batch
+        dispatch = await asyncio.to_thread(
+            dispatch_batch, job_id, file_paths, face_limit, admission.get("inflight_files", 0)
         )
-        logger.info(f"Started batch processing for {len(file_paths)} files, task_id: {task_result.id}")
-        
-        actual_task_id = task_result.id
-        
-        # Ensure we have a task ID
-        if not actual_task_id:
-            logger.error("No task ID generated for job")
-            raise Exception("Failed to generate task ID")
+        actual_task_id = dispatch["chord_task_id"]
+        for uploaded_file, file_task_id in zip(uploaded_files, dispatch["file_task_ids"]):
+            uploaded_file.task_id = file_task_id
+        logger.info(f"Started batch processing for {len(file_paths)} files, task_id: {actual_task_id}")
         
     except Exception as e:
         # Log error but don't fail the upload
         # The files are saved and can be processed manually if needed
         logger.error(f"Failed to start background task: {str(e)}")
         actual_task_id = None
+        await admission_controller.cancel(job_id, api_key)
     
     # Track job ownership for access control
     if api_key and settings.ENVIRONMENT == "production":
@@ -282,10 +358,22 @@ async def upload(
         uploaded_files=uploaded_files,
         face_limit=face_limit,
         total_files=len(uploaded_files),
-        status="uploaded"
+        **_admission_response_fields(admission)
     )
 
 
+def _admission_response_fields(admission: dict) -> dict:
+    """Get the status, message and ETA of an upload response from the admission decision."""
+    estimate = admission.get("estimated_completion_seconds")
+    if admission.get("status") == "queued":
+        return {
+            "status": "queued",
+            "message": f"Files uploaded successfully, processing queued (estimated completion in {int(estimate)}s)",
+            "estimated_completion_seconds": estimate
+        }
+    return {"status": "uploaded", "estimated_completion_seconds": estimate}
+
+
 @router.get("/batch/{batch_id}/status")
 async def get_batch_status(batch_id: str):
     """
@@ -0,0 +1,240 @@
+"""
+Admission control for batch uploads.
+
+Before files are saved, ``AdmissionController`` estimates when a new job would
+complete. The estimate comes from the model generation backlog in the latest
+queue statistics snapshot and from its processing rate. It also checks how many
+files the caller already has in flight. Over capacity, uploads are rejected with
+``Retry-After`` instead of sitting in the queue until clients time out:
+
+- 429 when the API key exceeds its in-flight file limit
+- 503 when the estimated completion is beyond ``ADMISSION_MAX_ETA_SECONDS``
+  or no worker consumes the queue
+
+Jobs whose estimate exceeds ``ADMISSION_QUEUED_ETA_SECONDS`` are admitted
+with a "queued" status and their ETA.
+"""
+
+import hashlib
+import logging
+import math
+import time
+from typing import Dict, Any, Optional, Tuple
+
+import redis
+from app.core.config import settings
+from app.core.queue_stats import queue_stats_collector
+from app.core.worker_health import get_async_clients
+
+logger = logging.getLogger(__name__)
+
+INFLIGHT_KEY_PREFIX = "admission:inflight:"
+JOB_KEY_PREFIX = "admission:job:"
+
+# In-flight reservations of jobs that never finalize (crashes) are dropped after this
+RESERVATION_TTL_SECONDS = 2 * 60 * 60
+
+_release_client = None
+
+# Count the caller's unexpired in-flight files and reserve the job's files if
+# they fit, in one step so that concurrent uploads cannot overshoot the limit.
+# KEYS: in-flight hash, job owner key
+# ARGV: now, file count, limit, job id, reservation expiry, ttl, owner
+# Returns {reserved (0/1), files already in flight}
+_RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local total = 0
+local reservations = redis.call('HGETALL', KEYS[1])
+for i = 1, #reservations, 2 do
+    local count, expires_at = string.match(reservations[i + 1], '^(%d+):(.*)$')
+    if count == nil or (tonumber(expires_at) or 0) < now then
+        redis.call('HDEL', KEYS[1], reservations[i])
+    else
+        total = total + tonumber(count)
+    end
+end
+if total + tonumber(ARGV[2]) > tonumber(ARGV[3]) then
+    return {0, total}
+end
+redis.call('HSET', KEYS[1], ARGV[4], ARGV[2] .. ':' .. ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('SET', KEYS[2], ARGV[7], 'EX', ARGV[6])
+return {1, total}
+"""
+
+
+def parse_api_key_limits(value: str) -> Dict[str, int]:
+    """Parse comma-separated ``api_key=max_inflight_files`` pairs."""
+    limits = {}
+    for pair in value.split(","):
+        key, separator, limit = pair.strip().rpartition("=")
+        if not separator or not key:
+            continue
+        try:
+            limits[key.strip()] = max(0, int(limit))
+        except ValueError:
+            logger.warning("Ignoring invalid admission limit for an API key")
+    return limits
+
+
+def client_id(api_key: Optional[str]) -> str:
+    """Get the identifier in-flight files are tracked under (never the key itself)."""
+    if not api_key:
+        return "anonymous"
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def release_job(job_id: str) -> None:
+    """Release the in-flight reservation of a finished job (worker side)."""
+    global _release_client
+    try:
+        if _release_client is None:
+            _release_client = redis.from_url(settings.CELERY_RESULT_BACKEND, decode_responses=True)
+        owner = _release_client.get(f"{JOB_KEY_PREFIX}{job_id}")
+        if owner:
+            pipe = _release_client.pipeline(transaction=False)
+            pipe.hdel(f"{INFLIGHT_KEY_PREFIX}{owner}", job_id)
+            pipe.delete(f"{JOB_KEY_PREFIX}{job_id}")
+            pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to release admission reservation of job {job_id}: {e}")
+
+
+class AdmissionController:
+    """Decide whether a batch upload is admitted now."""
+
+    def __init__(self):
+        self.api_key_limits = parse_api_key_limits(settings.ADMISSION_API_KEY_LIMITS)
+        self._reserve_script = None
+
+    def inflight_limit(self, api_key: Optional[str]) -> int:
+        """Get the in-flight file limit of an API key."""
+        return self.api_key_limits.get(api_key or "", settings.ADMISSION_MAX_INFLIGHT_FILES)
+
+    @staticmethod
+    def estimate_completion_seconds(queue_stats: Dict[str, Any], file_count: int) -> Optional[float]:
+        """
+        Estimate when the last file of a new job would complete.
+
+        The processing rate is the observed throughput, but never less than
+        the consuming pool slots can sustain at ``ADMISSION_FILE_SECONDS`` per
+        file. An idle queue completes few tasks without being slow.
+
+        Returns:
+            Seconds, or None if no worker consumes the queue
+        """
+        slots = queue_stats.get("concurrency") or 0
+        if slots <= 0:
+            return None
+        capacity_per_minute = slots * 60 / settings.ADMISSION_FILE_SECONDS
+        rate_per_minute = max(queue_stats.get("throughput_per_minute") or 0.0, capacity_per_minute)
+        return round((queue_stats.get("depth", 0) + file_count) / rate_per_minute * 60, 1)
+
+    async def _reserve(self, client, owner: str, job_id: str, file_count: int, limit: int) -> Tuple[bool, int]:
+        """
+        Count the job's files as in flight until it finalizes (or the reservation expires).
+
+        Returns:
+            Tuple of whether the files fit within the limit and were reserved,
+            and the caller's files already in flight
+        """
+        if self._reserve_script is None:
+            self._reserve_script = client.register_script(_RESERVE_SCRIPT)
+        reserved, inflight = await self._reserve_script(
+            keys=[f"{INFLIGHT_KEY_PREFIX}{owner}", f"{JOB_KEY_PREFIX}{job_id}"],
+            args=[time.time(), file_count, limit, job_id, time.time() + RESERVATION_TTL_SECONDS,
+                  RESERVATION_TTL_SECONDS, owner]
+        )
+        return bool(reserved), int(inflight)
+
+    async def admit(self, api_key: Optional[str], job_id: str, file_count: int) -> Dict[str, Any]:
+        """
+        Admit a job or raise the rejection.
+
+        Args:
+            api_key: Caller's API key (None without authentication)
+            job_id: Job identifier, used to release the reservation when it finishes
+            file_count: Number of files in the job
+
+        Returns:
+            Dict with the admission status ("admitted" or "queued"), the
+            estimated completion in seconds (None when unknown) and the caller's
+            files already in flight (used to schedule the job's files fairly)
+
+        Raises:
+            AdmissionRejected: When over capacity
+        """
+        if not settings.ADMISSION_ENABLED:
+            return {"status": "admitted", "estimated_completion_seconds": None, "inflight_files": 0}
+
+        _, backend = get_async_clients()
+        owner = client_id(api_key)
+        inflight = 0
+
+        try:
+            limit = self.inflight_limit(api_key)
+            reserved, inflight = await self._reserve(backend, owner, job_id, file_count, limit)
+            if not reserved:
+                raise AdmissionRejected(
+                    status_code=429,
+                    message=f"Too many files in progress for this API key ({inflight} of {limit})",
+                    retry_after=settings.ADMISSION_FILE_SECONDS
+                )
+
+            snapshot = await queue_stats_collector.get_snapshot()
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            # Admission must not take uploads down with Redis; fail open
+            logger.warning(f"Admission check unavailable, admitting job {job_id}: {e}")
+            return {"status": "admitted", "estimated_completion_seconds": None, "inflight_files": inflight}
+
+        estimate = None
+        queue_stats = (snapshot or {}).get("queues", {}).get(settings.ADMISSION_QUEUE)
+        if queue_stats is not None:
+            estimate = self.estimate_completion_seconds(queue_stats, file_count)
+            rejection = None
+            if estimate is None:
+                rejection = AdmissionRejected(
+                    status_code=503,
+                    message=f"No workers are processing the {settings.ADMISSION_QUEUE} queue",
+                    retry_after=60
+                )
+            elif estimate > settings.ADMISSION_MAX_ETA_SECONDS:
+                rejection = AdmissionRejected(
+                    status_code=503,
+                    message="Processing capacity exceeded, please retry later",
+                    retry_after=estimate - settings.ADMISSION_MAX_ETA_SECONDS,
+                    estimated_completion_seconds=estimate
+                )
+            if rejection is not None:
+                await self.cancel(job_id, api_key)
+                raise rejection
+
+        status = "queued" if estimate is not None and estimate > settings.ADMISSION_QUEUED_ETA_SECONDS else "admitted"
+        return {"status": status, "estimated_completion_seconds": estimate, "inflight_files": inflight}
+
+    async def cancel(self, job_id: str, api_key: Optional[str]) -> None:
+        """Drop the reservation of a job that was admitted but not started."""
+        _, backend = get_async_clients()
+        try:
+            await backend.hdel(f"{INFLIGHT_KEY_PREFIX}{client_id(api_key)}", job_id)
+            await backend.delete(f"{JOB_KEY_PREFIX}{job_id}")
+        except Exception as e:
+            logger.warning(f"Failed to cancel admission reservation of job {job_id}: {e}")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job is not admitted; carries the HTTP status and retry delay."""
+
+    def __init__(self, status_code: int, message: str, retry_after: float,
+                 estimated_completion_seconds: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        self.estimated_completion_seconds = estimated_completion_seconds
+
+
+# Global admission controller instance
+admission_controller = AdmissionController()
@@ -0,0 +1,263 @@
+"""
+Worker pool autoscaling for the model generation queue.
+
+Model generation tasks spend almost all their time waiting on FAL.AI, so pool
+size is bounded by upstream quota rather than local CPU. The API runs
+``WorkerAutoscaler`` in the background: one process per interval (elected
+through a Redis key) reads the queue depth, the running tasks and pool size
+reported in worker heartbeats, and the share of recent FAL.AI requests that
+were rate limited. It then resizes the prefork pool of each consuming worker
+with the ``pool_grow``/``pool_shrink`` control commands:
+
+- rate limited above ``AUTOSCALE_RATE_LIMIT_THRESHOLD``: shrink all pools by
+  ``AUTOSCALE_DECREASE_FACTOR`` (at most once per rate limit window); the
+  reduced total is a ceiling for ``AUTOSCALE_COOLDOWN_SECONDS``
+- more waiting and running tasks than slots: grow by ``AUTOSCALE_STEP`` per
+  worker
+- fewer: shrink by ``AUTOSCALE_STEP`` per worker once the cooldown has passed
+
+Pools never shrink below their running tasks and stay within the configured
+bounds. Every decision is counted in Prometheus and kept in Redis for the admin
+endpoint.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+import redis
+from app.core.config import settings
+from app.core.monitoring import (
+    AUTOSCALER_DECISIONS,
+    AUTOSCALER_TARGET_CONCURRENCY,
+    AUTOSCALER_DEMAND,
+    AUTOSCALER_RATE_LIMITED_RATIO
+)
+from app.core.worker_health import get_async_clients, get_live_workers, get_queue_depths
+
+logger = logging.getLogger(__name__)
+
+FAL_OUTCOMES_KEY_PREFIX = "fal_outcomes:"
+STATE_KEY = "autoscaler:state"
+LEADER_KEY = "autoscaler:leader"
+
+# Fewer FAL.AI requests than this in the window are too few to judge the rate limit share
+MIN_RATE_LIMIT_SAMPLES = 5
+
+_outcome_client = None
+
+
+def fal_outcomes_key(minute: int) -> str:
+    """Get the Redis hash counting FAL.AI requests (total, rate_limited, hedged) of a minute."""
+    return f"{FAL_OUTCOMES_KEY_PREFIX}{minute}"
+
+
+def record_fal_outcome(rate_limited: bool) -> None:
+    """Count a FAL.AI request, and whether it was rate limited, in the current minute (worker side)."""
+    global _outcome_client
+    try:
+        if _outcome_client is None:
+            _outcome_client = redis.from_url(settings.CELERY_RESULT_BACKEND, decode_responses=True)
+        key = fal_outcomes_key(int(time.time() // 60))
+        pipe = _outcome_client.pipeline(transaction=False)
+        pipe.hincrby(key, "total", 1)
+        if rate_limited:
+            pipe.hincrby(key, "rate_limited", 1)
+        pipe.expire(key, (settings.AUTOSCALE_RATE_LIMIT_WINDOW_MINUTES + 1) * 60)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Failed to record FAL.AI request outcome: {e}")
+
+
+def plan_pool_sizes(workers: List[Dict[str, Any]], depth: int, rate_limited_ratio: float,
+                    state: Dict[str, Any], now: float) -> Dict[str, Any]:
+    """
+    Decide the pool size of every worker consuming the autoscaled queue.
+
+    Args:
+        workers: Heartbeats of the consuming workers (concurrency, active)
+        depth: Messages waiting in the queue
+        rate_limited_ratio: Share of recent FAL.AI requests that were rate limited
+        state: Previous decisions (last_change_at, last_throttle_at and the
+            ceiling on total slots set by the last rate limit decrease)
+        now: Current epoch seconds
+
+    Returns:
+        Dict with the action (grow, shrink, throttle or hold), demand, current
+        and target total slots, the ceiling in force and the current/target
+        pool size per worker
+    """
+    current = {w["hostname"]: int(w.get("concurrency") or 0) for w in workers}
+    active = {w["hostname"]: int(w.get("active") or 0) for w in workers}
+    current_total = sum(current.values())
+    demand = depth + sum(active.values())
+
+    # The per-worker minimum wins over the overall quota
+    min_total = len(workers) * settings.AUTOSCALE_MIN_CONCURRENCY
+    max_total = max(min_total, min(len(workers) * settings.AUTOSCALE_MAX_CONCURRENCY,
+                                   settings.AUTOSCALE_MAX_TOTAL_CONCURRENCY))
+    step = settings.AUTOSCALE_STEP * len(workers)
+    since_change = now - state.get("last_change_at", 0)
+    since_throttle = now - state.get("last_throttle_at", 0)
+
+    # After a decrease, slots still busy are removed as their tasks finish, up to the cooldown
+    ceiling = state.get("ceiling") if since_throttle < settings.AUTOSCALE_COOLDOWN_SECONDS else None
+
+    if (rate_limited_ratio > settings.AUTOSCALE_RATE_LIMIT_THRESHOLD
+            and since_throttle >= settings.AUTOSCALE_RATE_LIMIT_WINDOW_MINUTES * 60):
+        # Earlier 429s stay in the window, so decrease only once per window
+        action = "throttle"
+        target_total = ceiling = math.floor(min(current_total, ceiling or current_total)
+                                            * settings.AUTOSCALE_DECREASE_FACTOR)
+    elif demand > current_total and ceiling is None:
+        action, target_total = "grow", min(demand, current_total + step)
+    elif demand < current_total and since_change >= settings.AUTOSCALE_COOLDOWN_SECONDS:
+        action, target_total = "shrink", max(demand, current_total - step)
+    else:
+        action, target_total = "hold", current_total
+    if ceiling is not None:
+        target_total = min(target_total, ceiling)
+    target_total = min(max(target_total, min_total), max_total)
+
+    # Spread slots evenly; the remainder goes to the largest pools to move as few processes as possible
+    hostnames = sorted(current, key=lambda hostname: (-current[hostname], hostname))
+    base, remainder = divmod(target_total, len(hostnames)) if hostnames else (0, 0)
+    targets = {}
+    for index, hostname in enumerate(hostnames):
+        target = base + (1 if index < remainder else 0)
+        target = min(max(target, settings.AUTOSCALE_MIN_CONCURRENCY), settings.AUTOSCALE_MAX_CONCURRENCY)
+        # Busy processes cannot be removed from a prefork pool
+        targets[hostname] = max(target, min(current[hostname], active[hostname]))
+
+    if action == "hold" and sum(targets.values()) != current_total:
+        # Pools outside the configured bounds (or above the ceiling) are brought back within them
+        action = "grow" if sum(targets.values()) > current_total else "shrink"
+
+    return {
+        "action": action,
+        "demand": demand,
+        "current_total": current_total,
+        "target_total": sum(targets.values()),
+        "ceiling": ceiling,
+        "workers": {
+            hostname: {"current": current[hostname], "target": targets[hostname], "active": active[hostname]}
+            for hostname in sorted(current)
+        }
+    }
+
+
+class WorkerAutoscaler:
+    """Periodic controller of the prefork pool size of model generation workers."""
+
+    def __init__(self, interval_seconds: Optional[float] = None):
+        self.interval_seconds = interval_seconds or settings.AUTOSCALE_INTERVAL_SECONDS
+
+    async def get_rate_limited_ratio(self, client) -> float:
+        """Get the share of FAL.AI requests rate limited over the rate limit window."""
+        current = int(time.time() // 60)
+        window = settings.AUTOSCALE_RATE_LIMIT_WINDOW_MINUTES
+        async with client.pipeline(transaction=False) as pipe:
+            for minute in range(current - window + 1, current + 1):
+                pipe.hgetall(fal_outcomes_key(minute))
+            buckets = await pipe.execute()
+
+        total = sum(int(bucket.get("total", 0)) for bucket in buckets)
+        rate_limited = sum(int(bucket.get("rate_limited", 0)) for bucket in buckets)
+        if total < MIN_RATE_LIMIT_SAMPLES:
+            return 0.0
+        return round(rate_limited / total, 3)
+
+    async def _is_leader(self, client) -> bool:
+        """Elect one controlling process per interval across all API processes."""
+        return bool(await client.set(LEADER_KEY, os.getpid(), nx=True, ex=max(1, int(self.interval_seconds))))
+
+    async def _resize(self, hostname: str, current: int, target: int) -> None:
+        """Send the pool_grow or pool_shrink control command to one worker."""
+        from app.core.celery_app import celery_app
+
+        if target > current:
+            await asyncio.to_thread(celery_app.control.pool_grow, target - current, destination=[hostname])
+        elif target < current:
+            await asyncio.to_thread(celery_app.control.pool_shrink, current - target, destination=[hostname])
+
+    async def get_state(self) -> Dict[str, Any]:
+        """Get the times and the last decision of the autoscaler (empty if none was made)."""
+        _, backend = get_async_clients()
+        data = await backend.get(STATE_KEY)
+        return json.loads(data) if data else {}
+
+    async def run_once(self) -> Optional[Dict[str, Any]]:
+        """
+        Decide and apply pool sizes if this process is the controller for this interval.
+
+        Returns:
+            The decision (see plan_pool_sizes), or None if another process
+            controls this interval or no worker consumes the queue
+        """
+        broker, backend = get_async_clients()
+        if not await self._is_leader(backend):
+            return None
+
+        queue = settings.AUTOSCALE_QUEUE
+        depths, workers, ratio, state = await asyncio.gather(
+            get_queue_depths(broker, [queue]),
+            get_live_workers(backend),
+            self.get_rate_limited_ratio(backend),
+            self.get_state()
+        )
+        workers = [w for w in workers if queue in w.get("queues", []) and w.get("concurrency")]
+        AUTOSCALER_RATE_LIMITED_RATIO.set(ratio)
+        if not workers:
+            return None
+
+        now = time.time()
+        decision = plan_pool_sizes(workers, depths[queue], ratio, state, now)
+        decision.update(rate_limited_ratio=ratio, dry_run=settings.AUTOSCALE_DRY_RUN, timestamp=now)
+
+        AUTOSCALER_DECISIONS.labels(action=decision["action"]).inc()
+        AUTOSCALER_DEMAND.set(decision["demand"])
+        for hostname, pool in decision["workers"].items():
+            AUTOSCALER_TARGET_CONCURRENCY.labels(worker=hostname).set(pool["target"])
+
+        if decision["action"] != "hold":
+            logger.info(
+                f"Autoscaler {decision['action']}: {decision['current_total']} -> "
+                f"{decision['target_total']} slots (demand {decision['demand']}, "
+                f"rate limited {ratio:.1%}){' [dry run]' if settings.AUTOSCALE_DRY_RUN else ''}"
+            )
+            if not settings.AUTOSCALE_DRY_RUN:
+                resized = False
+                for hostname, pool in decision["workers"].items():
+                    try:
+                        await self._resize(hostname, pool["current"], pool["target"])
+                        resized = resized or pool["target"] != pool["current"]
+                    except Exception as e:
+                        logger.warning(f"Failed to resize the pool of worker {hostname}: {e}")
+                # The cooldown starts only once pools were actually resized
+                if resized:
+                    state["last_change_at"] = now
+        if decision["action"] == "throttle":
+            state["last_throttle_at"], state["ceiling"] = now, decision["ceiling"]
+
+        state["last_decision"] = decision
+        await backend.set(STATE_KEY, json.dumps(state), ex=24 * 60 * 60)
+        return decision
+
+    async def start_background_control(self):
+        """Adjust worker pools every interval (returns immediately unless AUTOSCALE_ENABLED)."""
+        if not settings.AUTOSCALE_ENABLED:
+            return
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning(f"Worker autoscaling failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+# Global worker autoscaler instance
+worker_autoscaler = WorkerAutoscaler()
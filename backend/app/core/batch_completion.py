@@ -0,0 +1,118 @@
+"""
+Chord-free batch completion.
+
+With ``BATCH_COMPLETION=counter`` a batch is dispatched as plain file tasks
+instead of a chord. ``dispatch_batch`` sets a per-job counter of remaining files
+and each file task decrements it once its entry is published to
+``job_files:{job_id}`` (the job-scoped result list, see JobStore.add_file_result).
+The task that brings the counter to zero finalizes the batch inline and stores
+the summary under the batch task id clients track. This avoids the chord
+callback message, the re-read of every member result from the backend and the
+finalize queue wait.
+
+A file is counted once however often it is delivered: its index is added to a
+per-job set in the same script that decrements the counter.
+"""
+
+import logging
+import time
+from typing import Tuple
+
+import redis
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REMAINING_KEY_PREFIX = "batch_remaining:"
+COUNTED_KEY_PREFIX = "batch_counted:"
+
+# Same lifetime as the job records (see JobStore)
+COUNTER_TTL_SECONDS = 24 * 3600
+
+# Attempts at counting a file while Redis is unavailable, 1, 2, 4 and 8 seconds apart
+COUNT_ATTEMPTS = 5
+
+# KEYS: remaining counter, counted file set; ARGV: file index, ttl
+# Returns {counted now (0/1), remaining files}; -1 remaining once the batch was finalized
+_COMPLETE_FILE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {0, -1}
+end
+if redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+    return {1, redis.call('DECR', KEYS[1])}
+end
+return {0, tonumber(redis.call('GET', KEYS[1]) or '0')}
+"""
+
+
+def counter_enabled() -> bool:
+    """Whether new batches are completed by the per-job counter instead of a chord."""
+    return settings.BATCH_COMPLETION == "counter"
+
+
+class BatchCounter:
+    """Remaining files of counter-completed batches (dispatcher and worker side)."""
+
+    def __init__(self):
+        self._redis_client = None
+        self._complete_file = None
+
+    def _client(self):
+        if self._redis_client is None:
+            self._redis_client = redis.from_url(settings.CELERY_RESULT_BACKEND, decode_responses=True)
+        return self._redis_client
+
+    def start(self, job_id: str, total_files: int) -> None:
+        """
+        Set the remaining files of a batch before its file tasks are published.
+
+        Raises:
+            redis.RedisError: If the counter cannot be set (the batch must not be dispatched)
+        """
+        pipe = self._client().pipeline(transaction=True)
+        pipe.set(f"{REMAINING_KEY_PREFIX}{job_id}", total_files, ex=COUNTER_TTL_SECONDS)
+        pipe.delete(f"{COUNTED_KEY_PREFIX}{job_id}")
+        pipe.execute()
+
+    def complete_file(self, job_id: str, file_index: int) -> Tuple[bool, int]:
+        """
+        Count a finished file of a batch.
+
+        Args:
+            job_id: Job identifier
+            file_index: Index of the file in the batch
+
+        Returns:
+            Tuple of whether this call counted the file (False for a redelivery
+            of a counted file) and the files still remaining (-1 if the
+            batch was already finalized)
+
+        Raises:
+            redis.RedisError: If Redis stays unavailable for COUNT_ATTEMPTS attempts
+        """
+        if self._complete_file is None:
+            self._complete_file = self._client().register_script(_COMPLETE_FILE_SCRIPT)
+        for attempt in range(COUNT_ATTEMPTS):
+            try:
+                counted, remaining = self._complete_file(
+                    keys=[f"{REMAINING_KEY_PREFIX}{job_id}", f"{COUNTED_KEY_PREFIX}{job_id}"],
+                    args=[file_index, COUNTER_TTL_SECONDS]
+                )
+                return bool(counted), int(remaining)
+            except redis.RedisError as e:
+                if attempt == COUNT_ATTEMPTS - 1:
+                    raise
+                logger.warning(f"Failed to count file {file_index} of job {job_id} (attempt {attempt + 1}): {e}")
+                time.sleep(2 ** attempt)
+
+    def clear(self, job_id: str) -> None:
+        """Delete the counter of a finalized batch."""
+        try:
+            self._client().delete(f"{REMAINING_KEY_PREFIX}{job_id}", f"{COUNTED_KEY_PREFIX}{job_id}")
+        except Exception as e:
+            logger.debug(f"Failed to clear the completion counter of job {job_id}: {e}")
+
+
+# Global batch counter instance
+batch_counter = BatchCounter()
@@ -5,10 +5,20 @@ Celery application for background tasks with Redis configuration.
 import os
 import logging
 from celery import Celery
-from celery.signals import task_prerun, task_postrun, task_failure, task_retry, worker_ready
+from celery.signals import (
+    before_task_publish, task_prerun, task_postrun, task_failure, task_retry,
+    worker_ready, worker_init, worker_shutdown, worker_process_init, worker_process_shutdown
+)
 from celery.schedules import crontab
 from app.core.config import settings
 from app.core.logging_config import setup_logging, set_correlation_id, get_task_logger
+from app.core.metrics_multiprocess import mark_process_dead, remove_stale_metric_files, start_metric_files_heartbeat
+from app.core.monitoring import task_monitor
+from app.core.profiler import start_process_profiling, stop_process_profiling
+from app.core.worker_health import WorkerHeartbeat
+from app.core.queue_stats import record_task_completion
+from app.core.scheduling import PRIORITY_STEPS, PRIORITY_SEP
+from app.core.serialization import get_celery_serializer, get_accept_content
 
 # Create Celery app instance
 celery_app = Celery(
@@ -20,10 +30,10 @@ celery_app = Celery(
 
 # Configure Celery
 celery_app.conf.update(
-    # Serialization settings
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    # Serialization settings (JSON unless CELERY_SERIALIZER=msgpack, see app.core.serialization)
+    task_serializer=get_celery_serializer(),
+    accept_content=get_accept_content(),
+    result_serializer=get_celery_serializer(),
     
     # Timezone settings
     timezone="UTC",
@@ -81,6 +91,8 @@ celery_app.conf.update(
     broker_pool_limit=10,  # Redis connection pool size
     result_backend_pool_limit=10,  # Result backend pool size
     broker_connection_retry_on_startup=True,  # Retry broker connection on startup
+    # Priority lanes per queue for fair scheduling (0 is served first, see app.core.scheduling)
+    broker_transport_options={'priority_steps': PRIORITY_STEPS, 'sep': PRIORITY_SEP},
     
     # Monitoring
     worker_send_task_events=True,
@@ -91,6 +103,7 @@ celery_app.conf.update(
 celery_app.conf.task_routes = {
     # High priority tasks
     'app.workers.tasks.health_check_task': {'queue': 'priority'},
+    'app.workers.tasks.start_worker_profile': {'queue': 'priority'},
     
     # Batch processing tasks
     'app.workers.tasks.process_batch': {'queue': 'batch_processing'},
@@ -111,6 +124,9 @@ celery_app.conf.worker_task_log_format = '[%(asctime)s: %(levelname)s/%(processN
 
 # Celery signal handlers for comprehensive error handling and logging
 
+# Heartbeat of this worker's main process, used by health checks instead of broadcast inspect
+_worker_heartbeat = None
+
 @worker_ready.connect
 def setup_worker_logging(sender=None, **kwargs):
     """Set up logging when worker starts."""
@@ -118,12 +134,67 @@ def setup_worker_logging(sender=None, **kwargs):
     logger = get_task_logger('worker', 'startup')
     logger.info(f"Worker ready: {sender}")
 
+@worker_ready.connect
+def start_worker_heartbeat(sender=None, **kwargs):
+    """Start publishing this worker's heartbeat (hostname, queues, pool size, running tasks)."""
+    global _worker_heartbeat
+    from celery.worker import state as worker_state
+    controller = getattr(sender, 'controller', None)
+
+    def pool_size():
+        # The pool is resized by pool_grow/pool_shrink control commands (see app.core.autoscaler)
+        pool = getattr(controller, 'pool', None)
+        return getattr(pool, 'num_processes', None) or getattr(controller, 'concurrency', None)
+
+    _worker_heartbeat = WorkerHeartbeat(
+        hostname=getattr(sender, 'hostname', None) or os.uname().nodename,
+        queues=celery_app.amqp.queues.consume_from.keys(),
+        concurrency=pool_size,
+        active=lambda: len(worker_state.active_requests)
+    )
+    _worker_heartbeat.start()
+
+@worker_shutdown.connect
+def stop_worker_heartbeat(sender=None, **kwargs):
+    """Remove the heartbeat so the worker stops counting as capacity right away."""
+    if _worker_heartbeat is not None:
+        _worker_heartbeat.stop()
+
+@worker_init.connect
+def cleanup_worker_metrics(sender=None, **kwargs):
+    """Remove Prometheus metric files left by a previous run before children are forked."""
+    remove_stale_metric_files()
+    start_metric_files_heartbeat()
+
+@worker_process_init.connect
+def start_worker_profiling(**kwargs):
+    """Start the opt-in profiler threads in each pool process (no-op unless PROFILER_ENABLED)."""
+    start_process_profiling("worker", watch_requests=True)
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs):
+    """Drop the live gauge values of an exiting pool process (e.g. after max_tasks_per_child)."""
+    stop_process_profiling()
+    mark_process_dead(pid or os.getpid())
+
+@before_task_publish.connect
+def stamp_task_publish_time(sender=None, headers=None, **kwargs):
+    """Stamp the publish time so workers can measure queue wait."""
+    task_monitor.stamp_published(headers)
+
 @task_prerun.connect
 def task_prerun_handler(sender=None, task_id=None, task=None, args=None, kwargs=None, **kwds):
     """Handle task start - set up logging context."""
     correlation_id = set_correlation_id()
     logger = get_task_logger(task.name, task_id)
     logger.info(f"Starting task {task.name} with ID {task_id} (correlation: {correlation_id})")
+    
+    delivery_info = getattr(task.request, 'delivery_info', None) or {}
+    task_monitor.on_task_started(
+        task.name, task_id,
+        sent_at=getattr(task.request, 'sent_at', None),
+        queue=delivery_info.get('routing_key')
+    )
 
 @task_postrun.connect
 def task_postrun_handler(sender=None, task_id=None, task=None, args=None, kwargs=None, 
@@ -131,6 +202,10 @@ def task_postrun_handler(sender=None, task_id=None, task=None, args=None, kwargs
     """Handle task completion."""
     logger = get_task_logger(task.name, task_id)
     logger.info(f"Task {task.name} completed with state: {state}")
+    task_monitor.on_task_finished(task.name, task_id, state)
+    
+    delivery_info = getattr(task.request, 'delivery_info', None) or {}
+    record_task_completion(delivery_info.get('routing_key'))
 
 @task_failure.connect
 def task_failure_handler(sender=None, task_id=None, exception=None, traceback=None, einfo=None, **kwds):
@@ -152,6 +227,7 @@ def task_retry_handler(sender=None, task_id=None, reason=None, einfo=None, **kwd
     """Handle task retries."""
     logger = get_task_logger(sender.name if sender else 'unknown', task_id)
     logger.warning(f"Task {sender.name if sender else 'unknown'} retry: {reason}")
+    task_monitor.on_task_retry(sender.name if sender else 'unknown', reason)
 
 # Dead letter queue configuration for failed tasks
 # Note: task_reject_on_worker_lost and task_acks_late are already set above
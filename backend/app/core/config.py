@@ -66,6 +66,14 @@ class Settings(BaseSettings):
         "CELERY_RESULT_BACKEND",
         "redis://localhost:6379/0"
     )
+    # Serializer of task messages and results ("json" or "msgpack"); msgpack payloads larger than
+    # CELERY_COMPRESSION_THRESHOLD_BYTES (0 disables) are zlib compressed at CELERY_COMPRESSION_LEVEL
+    CELERY_SERIALIZER: str = os.getenv("CELERY_SERIALIZER", "json")
+    CELERY_COMPRESSION_THRESHOLD_BYTES: int = int(os.getenv("CELERY_COMPRESSION_THRESHOLD_BYTES", "0"))
+    CELERY_COMPRESSION_LEVEL: int = int(os.getenv("CELERY_COMPRESSION_LEVEL", "6"))
+    # How batch completion is detected: "chord" (Celery chord callback) or "counter" (per-job
+    # counter in Redis; the last file task finalizes the batch inline)
+    BATCH_COMPLETION: str = os.getenv("BATCH_COMPLETION", "chord")
     
     # Redis settings
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
@@ -78,6 +86,106 @@ class Settings(BaseSettings):
     # FAL.AI Configuration
     FAL_API_KEY: str = os.getenv("FAL_API_KEY", "")
     
+    # Monitoring
+    # Maximum distinct endpoint label values on request metrics; further routes share "other"
+    METRICS_MAX_ENDPOINTS: int = int(os.getenv("METRICS_MAX_ENDPOINTS", "200"))
+    
+    # Request logging: default sample rate, per-route overrides as comma-separated
+    # "route_prefix=rate" pairs, and the duration above which requests are always logged
+    REQUEST_LOG_SAMPLE_RATE: float = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "1.0"))
+    REQUEST_LOG_ROUTE_SAMPLE_RATES: str = os.getenv(
+        "REQUEST_LOG_ROUTE_SAMPLE_RATES",
+        "/health=0.1,/api/v1/health=0.1"
+    )
+    REQUEST_LOG_SLOW_MS: float = float(os.getenv("REQUEST_LOG_SLOW_MS", "1000"))
+    # Format and write request logs on a background thread instead of the event loop
+    REQUEST_LOG_ASYNC: bool = os.getenv("REQUEST_LOG_ASYNC", "True").lower() == "true"
+    
+    # Sampling profiler (admin endpoints and worker control task); off unless enabled
+    PROFILER_ENABLED: bool = os.getenv("PROFILER_ENABLED", "False").lower() == "true"
+    PROFILES_DIR: str = os.getenv("PROFILES_DIR", "profiles")
+    PROFILER_MAX_SECONDS: int = int(os.getenv("PROFILER_MAX_SECONDS", "300"))
+    # Continuous low-rate sampling interval (0 disables) and how often its profile is written
+    PROFILER_CONTINUOUS_INTERVAL_MS: int = int(os.getenv("PROFILER_CONTINUOUS_INTERVAL_MS", "0"))
+    PROFILER_FLUSH_SECONDS: int = int(os.getenv("PROFILER_FLUSH_SECONDS", "300"))
+    # Continuous profiles older than this are deleted when a new one is flushed
+    PROFILER_CONTINUOUS_RETENTION_HOURS: float = float(os.getenv("PROFILER_CONTINUOUS_RETENTION_HOURS", "24"))
+    
+    # Health checks: component results are cached for HEALTH_CACHE_SECONDS, each probe
+    # times out after HEALTH_CHECK_TIMEOUT_SECONDS; workers refresh heartbeats every
+    # WORKER_HEARTBEAT_SECONDS
+    HEALTH_CACHE_SECONDS: float = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))
+    HEALTH_CHECK_TIMEOUT_SECONDS: float = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "2"))
+    WORKER_HEARTBEAT_SECONDS: float = float(os.getenv("WORKER_HEARTBEAT_SECONDS", "10"))
+    
+    # Queue statistics: collection interval and the window throughput is measured over
+    QUEUE_STATS_INTERVAL_SECONDS: float = float(os.getenv("QUEUE_STATS_INTERVAL_SECONDS", "10"))
+    QUEUE_THROUGHPUT_WINDOW_MINUTES: int = int(os.getenv("QUEUE_THROUGHPUT_WINDOW_MINUTES", "5"))
+    
+    # Upload admission control: uploads whose estimated completion exceeds ADMISSION_MAX_ETA_SECONDS
+    # are rejected (503), above ADMISSION_QUEUED_ETA_SECONDS they are accepted as "queued";
+    # ADMISSION_FILE_SECONDS is the typical processing time of one file
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "True").lower() == "true"
+    ADMISSION_QUEUE: str = os.getenv("ADMISSION_QUEUE", "model_generation")
+    ADMISSION_MAX_ETA_SECONDS: float = float(os.getenv("ADMISSION_MAX_ETA_SECONDS", "1800"))
+    ADMISSION_QUEUED_ETA_SECONDS: float = float(os.getenv("ADMISSION_QUEUED_ETA_SECONDS", "300"))
+    ADMISSION_FILE_SECONDS: float = float(os.getenv("ADMISSION_FILE_SECONDS", "90"))
+    # Files in flight per API key (429 beyond), with per-key overrides as comma-separated "api_key=limit" pairs
+    ADMISSION_MAX_INFLIGHT_FILES: int = int(os.getenv("ADMISSION_MAX_INFLIGHT_FILES", "100"))
+    ADMISSION_API_KEY_LIMITS: str = os.getenv("ADMISSION_API_KEY_LIMITS", "")
+    
+    # Worker pool autoscaling: pool size of each worker consuming AUTOSCALE_QUEUE follows its
+    # backlog within [AUTOSCALE_MIN_CONCURRENCY, AUTOSCALE_MAX_CONCURRENCY], with at most
+    # AUTOSCALE_MAX_TOTAL_CONCURRENCY slots overall (the FAL.AI quota); with AUTOSCALE_DRY_RUN
+    # decisions are only exported as metrics
+    AUTOSCALE_ENABLED: bool = os.getenv("AUTOSCALE_ENABLED", "False").lower() == "true"
+    AUTOSCALE_DRY_RUN: bool = os.getenv("AUTOSCALE_DRY_RUN", "False").lower() == "true"
+    AUTOSCALE_QUEUE: str = os.getenv("AUTOSCALE_QUEUE", "model_generation")
+    AUTOSCALE_INTERVAL_SECONDS: float = float(os.getenv("AUTOSCALE_INTERVAL_SECONDS", "30"))
+    AUTOSCALE_MIN_CONCURRENCY: int = int(os.getenv("AUTOSCALE_MIN_CONCURRENCY", "2"))
+    AUTOSCALE_MAX_CONCURRENCY: int = int(os.getenv("AUTOSCALE_MAX_CONCURRENCY", "12"))
+    AUTOSCALE_MAX_TOTAL_CONCURRENCY: int = int(os.getenv("AUTOSCALE_MAX_TOTAL_CONCURRENCY", "24"))
+    AUTOSCALE_STEP: int = int(os.getenv("AUTOSCALE_STEP", "2"))
+    AUTOSCALE_COOLDOWN_SECONDS: float = float(os.getenv("AUTOSCALE_COOLDOWN_SECONDS", "120"))
+    # Share of FAL.AI requests answered with 429 (over the window) above which pools shrink
+    # by AUTOSCALE_DECREASE_FACTOR
+    AUTOSCALE_RATE_LIMIT_THRESHOLD: float = float(os.getenv("AUTOSCALE_RATE_LIMIT_THRESHOLD", "0.05"))
+    AUTOSCALE_RATE_LIMIT_WINDOW_MINUTES: int = int(os.getenv("AUTOSCALE_RATE_LIMIT_WINDOW_MINUTES", "2"))
+    AUTOSCALE_DECREASE_FACTOR: float = float(os.getenv("AUTOSCALE_DECREASE_FACTOR", "0.75"))
+    
+    # Hedged FAL.AI requests: a generation running longer than the HEDGE_PERCENTILE latency of
+    # recent generations (at least HEDGE_MIN_DEADLINE_SECONDS, once HEDGE_MIN_SAMPLES are known)
+    # is submitted again; hedges are limited to HEDGE_MAX_FRACTION of recent requests
+    HEDGE_ENABLED: bool = os.getenv("HEDGE_ENABLED", "False").lower() == "true"
+    HEDGE_PERCENTILE: float = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_MIN_DEADLINE_SECONDS: float = float(os.getenv("HEDGE_MIN_DEADLINE_SECONDS", "60"))
+    HEDGE_MAX_FRACTION: float = float(os.getenv("HEDGE_MAX_FRACTION", "0.1"))
+    
+    # Fair scheduling: batch files are published to priority lanes by their rank within their job,
+    # FAIR_LANE_FILES files per lane. With distinct API keys per tenant, FAIR_KEY_LANE_FILES (0
+    # disables) moves larger jobs down one lane per that many files in flight for their key
+    FAIR_SCHEDULING_ENABLED: bool = os.getenv("FAIR_SCHEDULING_ENABLED", "True").lower() == "true"
+    FAIR_LANE_FILES: int = int(os.getenv("FAIR_LANE_FILES", "3"))
+    FAIR_KEY_LANE_FILES: int = int(os.getenv("FAIR_KEY_LANE_FILES", "0"))
+    
+    # Idempotency: responses to uploads sent with an Idempotency-Key are replayed for
+    # IDEMPOTENCY_TTL_SECONDS; a file being processed is claimed for up to FILE_CLAIM_SECONDS
+    # (the task time limit) and its result kept for FILE_RESULT_TTL_SECONDS
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    FILE_CLAIM_SECONDS: int = int(os.getenv("FILE_CLAIM_SECONDS", "1800"))
+    FILE_RESULT_TTL_SECONDS: int = int(os.getenv("FILE_RESULT_TTL_SECONDS", "3600"))
+    # Coalescing: an image already being generated with the same parameters by another job is
+    # not submitted again; its result is shared with such jobs for COALESCE_RESULT_SECONDS
+    COALESCE_ENABLED: bool = os.getenv("COALESCE_ENABLED", "True").lower() == "true"
+    COALESCE_RESULT_SECONDS: int = int(os.getenv("COALESCE_RESULT_SECONDS", "30"))
+    
+    # FAL.AI request checkpoints: submitted request ids are kept for FAL_CHECKPOINT_TTL_SECONDS so
+    # that a task retried (up to FAL_RESUME_RETRIES times after its soft time limit) or redelivered
+    # reattaches to its generation
+    FAL_CHECKPOINT_TTL_SECONDS: int = int(os.getenv("FAL_CHECKPOINT_TTL_SECONDS", "3600"))
+    FAL_RESUME_RETRIES: int = int(os.getenv("FAL_RESUME_RETRIES", "1"))
+    
     class Config:
         case_sensitive = True
         env_file = ".env"
@@ -0,0 +1,111 @@
+"""
+Error message normalization and bounded pattern counting.
+
+Error messages often embed job ids, file paths and durations, which makes every
+occurrence unique. ``normalize_error_message`` masks those variable parts with
+precompiled patterns so that occurrences of the same error share a template.
+Templates are counted with the Space-Saving algorithm, which keeps at most
+``capacity`` counters while reliably retaining the most frequent templates.
+Request paths are templated the same way by ``normalize_request_path``.
+"""
+
+import re
+from typing import Dict, Optional
+
+# Maximum number of distinct templates counted per aggregate
+DEFAULT_PATTERN_CAPACITY = 100
+
+# Templates are truncated to this length
+MAX_TEMPLATE_LENGTH = 300
+
+_UUID = re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b")
+_HEX = re.compile(r"\b(?:0x)?[0-9a-fA-F]{16,}\b")
+_NUMBER = re.compile(r"(?<![A-Za-z0-9<])[-+]?\d+(?:[.,:]\d+)*(?:[eE][-+]?\d+)?")
+
+# Applied in order: specific shapes first so that numbers inside them are not masked separately
+_MASKS = (
+    (_UUID, "<uuid>"),
+    (re.compile(r"\b[a-z][a-z0-9+.-]*://\S+", re.IGNORECASE), "<url>"),
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"(?:[A-Za-z]:)?(?:[\\/][\w.@%+-]+){2,}[\\/]?"
+                r"|(?:~|\.{1,2})[\\/][\w.@%+/\\-]+"
+                r"|[\w.@%+-]+(?:[\\/][\w.@%+-]+){2,}"), "<path>"),
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?"), "<timestamp>"),
+    (_HEX, "<hex>"),
+    (_NUMBER, "<num>"),
+    (re.compile(r"\s+"), " "),
+)
+
+# Identifiers in request paths, e.g. "/api/v1/download/<uuid>/all"
+_PATH_MASKS = ((_UUID, "<uuid>"), (_HEX, "<hex>"), (_NUMBER, "<num>"))
+
+# Header of traditional log lines: bracketed fields and the level,
+# e.g. "[2024-01-01 12:00:00,123] ERROR [app.workers:42] [-] [task:id] "
+_LINE_PREFIX = re.compile(r"^(?:\[[^\]]*\]\s*|(?:DEBUG|INFO|WARNING|ERROR|CRITICAL)\b:?\s*)+")
+
+
+def normalize_error_message(message: str) -> str:
+    """
+    Reduce an error message to its template.
+
+    Example:
+        "FAL.AI job failed after 1234.56ms: /tmp/uploads/a.png" ->
+        "FAL.AI job failed after <num>ms: <path>"
+    """
+    template = message.strip()
+    for pattern, replacement in _MASKS:
+        template = pattern.sub(replacement, template)
+    return template.strip()[:MAX_TEMPLATE_LENGTH]
+
+
+def normalize_log_line(line: str) -> str:
+    """Normalize a traditional log line, dropping its header fields."""
+    return normalize_error_message(_LINE_PREFIX.sub("", line, count=1))
+
+
+def normalize_request_path(path: str) -> str:
+    """
+    Reduce a request path to a template by masking the identifiers in it.
+
+    Example:
+        "/api/v1/status/tasks/0b5e.../stream" -> "/api/v1/status/tasks/<uuid>/stream"
+    """
+    template = path.split("?", 1)[0]
+    for pattern, replacement in _PATH_MASKS:
+        template = pattern.sub(replacement, template)
+    return template[:MAX_TEMPLATE_LENGTH]
+
+
+def count_top_k(counts: Dict[str, int], key: str, capacity: int = DEFAULT_PATTERN_CAPACITY,
+                increment: int = 1) -> None:
+    """
+    Count ``key`` in a Space-Saving summary.
+
+    When the summary is full, the least frequent key is replaced and the new key
+    inherits its count, so counts are upper bounds for recently admitted keys.
+    """
+    if key in counts:
+        counts[key] += increment
+    elif len(counts) < capacity:
+        counts[key] = increment
+    else:
+        evicted = min(counts, key=counts.__getitem__)
+        counts[key] = counts.pop(evicted) + increment
+
+
+def merge_top_k(target: Dict[str, int], source: Dict[str, int],
+                capacity: int = DEFAULT_PATTERN_CAPACITY) -> Dict[str, int]:
+    """Merge two summaries, keeping the ``capacity`` most frequent keys."""
+    for key, count in source.items():
+        target[key] = target.get(key, 0) + count
+    if len(target) > capacity:
+        kept = sorted(target.items(), key=lambda item: item[1], reverse=True)[:capacity]
+        target.clear()
+        target.update(kept)
+    return target
+
+
+def top_patterns(counts: Dict[str, int], limit: Optional[int] = None) -> Dict[str, int]:
+    """Get the summary's keys ordered by count, most frequent first."""
+    ordered = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    return dict(ordered[:limit] if limit else ordered)
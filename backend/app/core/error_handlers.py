@@ -89,15 +89,22 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> JSONRe
     """
     logger.warning(f"HTTP exception at {request.url.path}: {exc.status_code} - {exc.detail}")
     
+    # Structured details (e.g. retry_after) keep their fields instead of being stringified
+    message, details = str(exc.detail), {}
+    if isinstance(exc.detail, dict) and "message" in exc.detail:
+        details = {key: value for key, value in exc.detail.items() if key != "message"}
+        message = str(exc.detail["message"])
+    
     return JSONResponse(
         status_code=exc.status_code,
         content={
             "error": True,
             "error_code": f"HTTP_{exc.status_code}",
-            "message": str(exc.detail),
+            "message": message,
             "status_code": exc.status_code,
-            "details": {}
-        }
+            "details": details
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 
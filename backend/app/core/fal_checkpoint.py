@@ -0,0 +1,80 @@
+"""
+Checkpoints of submitted FAL.AI generations.
+
+A generation keeps running upstream when the task waiting for it is lost: the
+worker child is recycled or killed, or the task hits its soft time limit. The
+FAL.AI request id and arguments are saved right after submission under the id
+of the task, which stays the same across Celery retries and redeliveries. The
+next run of the task reattaches to the request instead of uploading and
+generating again (see ``FalAIClient.process_single_image``).
+"""
+
+import json
+import logging
+import time
+from typing import Dict, Any, Optional
+
+import redis
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY_PREFIX = "fal_request:"
+
+
+class FalCheckpointStore:
+    """FAL.AI request ids of running generations, by task (worker side)."""
+
+    def __init__(self):
+        self._redis_client = None
+
+    def _client(self):
+        if self._redis_client is None:
+            self._redis_client = redis.from_url(settings.CELERY_RESULT_BACKEND, decode_responses=True)
+        return self._redis_client
+
+    def save(self, key: str, request_id: str, input_data: Dict[str, Any], submitted_at: float) -> None:
+        """
+        Checkpoint a submitted generation.
+
+        Args:
+            key: Identity of the work that survives retries (the task id)
+            request_id: FAL.AI request id
+            input_data: Generation arguments (used again for a hedged duplicate)
+            submitted_at: Epoch seconds of the submission
+        """
+        try:
+            self._client().set(f"{CHECKPOINT_KEY_PREFIX}{key}", json.dumps({
+                "request_id": request_id,
+                "input_data": input_data,
+                "submitted_at": submitted_at
+            }), ex=settings.FAL_CHECKPOINT_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Failed to checkpoint FAL.AI request {request_id}: {e}")
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get the checkpointed generation of a task, if it has one."""
+        try:
+            data = self._client().get(f"{CHECKPOINT_KEY_PREFIX}{key}")
+        except Exception as e:
+            logger.warning(f"Failed to read FAL.AI request checkpoint: {e}")
+            return None
+        if not data:
+            return None
+        checkpoint = json.loads(data)
+        logger.info(
+            f"Found FAL.AI request {checkpoint['request_id']} submitted "
+            f"{time.time() - checkpoint['submitted_at']:.0f}s ago"
+        )
+        return checkpoint
+
+    def clear(self, key: str) -> None:
+        """Forget the checkpoint of a generation that failed, so that the next attempt submits again."""
+        try:
+            self._client().delete(f"{CHECKPOINT_KEY_PREFIX}{key}")
+        except Exception as e:
+            logger.debug(f"Failed to clear FAL.AI request checkpoint: {e}")
+
+
+# Global FAL.AI checkpoint store instance
+fal_checkpoints = FalCheckpointStore()
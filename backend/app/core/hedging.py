@@ -0,0 +1,132 @@
+"""
+Hedged FAL.AI generations for straggler files.
+
+Workers record the latency of every successful generation in a capped Redis
+list. The deadline of a generation is the ``HEDGE_PERCENTILE`` of those
+latencies. A file still running past it gets one duplicate submission; the
+first successful result wins and the other request is cancelled (see
+``FalAIClient._subscribe_hedged``).
+
+Hedges spend upstream quota, so they come out of the outbound request budget
+tracked in the per-minute FAL.AI request counters (see app.core.autoscaler).
+No hedge is sent while FAL.AI is rate limiting, and hedges stay within
+``HEDGE_MAX_FRACTION`` of the requests in the window.
+"""
+
+import logging
+import math
+import time
+from typing import List, Optional
+
+import redis
+from app.core.config import settings
+from app.core.autoscaler import fal_outcomes_key
+from app.core.monitoring import FAL_HEDGES
+
+logger = logging.getLogger(__name__)
+
+LATENCY_KEY = "fal_latency:samples"
+
+# Recent latencies kept for the percentile
+MAX_LATENCY_SAMPLES = 500
+
+# How long a worker process reuses a computed deadline
+DEADLINE_CACHE_SECONDS = 60
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Get the ``pct`` percentile of values (nearest rank)."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def record_hedge(outcome: str) -> None:
+    """Count a hedging outcome (submitted, skipped, hedge_won, primary_won)."""
+    FAL_HEDGES.labels(outcome=outcome).inc()
+
+
+class HedgePolicy:
+    """Deadline and budget of hedged generations (worker side)."""
+
+    def __init__(self):
+        self._redis_client = None
+        self._deadline: Optional[float] = None
+        self._deadline_read_at = 0.0
+
+    def _client(self):
+        if self._redis_client is None:
+            self._redis_client = redis.from_url(settings.CELERY_RESULT_BACKEND, decode_responses=True)
+        return self._redis_client
+
+    def record_latency(self, seconds: float) -> None:
+        """Record the latency of a successful generation (submission to result)."""
+        try:
+            pipe = self._client().pipeline(transaction=False)
+            pipe.lpush(LATENCY_KEY, f"{seconds:.3f}")
+            pipe.ltrim(LATENCY_KEY, 0, MAX_LATENCY_SAMPLES - 1)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Failed to record generation latency: {e}")
+
+    def get_deadline(self) -> Optional[float]:
+        """
+        Get the running time after which a generation is hedged.
+
+        Returns:
+            Seconds, or None when hedging is disabled or too few latencies are known
+        """
+        if not settings.HEDGE_ENABLED:
+            return None
+        if time.monotonic() - self._deadline_read_at < DEADLINE_CACHE_SECONDS:
+            return self._deadline
+
+        deadline = None
+        try:
+            samples = [float(value) for value in self._client().lrange(LATENCY_KEY, 0, -1)]
+            if len(samples) >= settings.HEDGE_MIN_SAMPLES:
+                deadline = max(settings.HEDGE_MIN_DEADLINE_SECONDS, percentile(samples, settings.HEDGE_PERCENTILE))
+        except Exception as e:
+            logger.warning(f"Failed to read generation latencies: {e}")
+        self._deadline, self._deadline_read_at = deadline, time.monotonic()
+        return deadline
+
+    def acquire(self) -> bool:
+        """
+        Take a hedge out of the outbound request budget.
+
+        Returns:
+            True if a hedge may be submitted (it is then counted as a request)
+        """
+        try:
+            client = self._client()
+            current = int(time.time() // 60)
+            window = settings.AUTOSCALE_RATE_LIMIT_WINDOW_MINUTES
+            pipe = client.pipeline(transaction=False)
+            for minute in range(current - window + 1, current + 1):
+                pipe.hgetall(fal_outcomes_key(minute))
+            buckets = pipe.execute()
+
+            total = sum(int(bucket.get("total", 0)) for bucket in buckets)
+            rate_limited = sum(int(bucket.get("rate_limited", 0)) for bucket in buckets)
+            hedged = sum(int(bucket.get("hedged", 0)) for bucket in buckets)
+            if total and rate_limited / total > settings.AUTOSCALE_RATE_LIMIT_THRESHOLD:
+                return False
+            # At least one hedge per window, so that low traffic can hedge at all
+            if hedged >= max(1, int(total * settings.HEDGE_MAX_FRACTION)):
+                return False
+
+            key = fal_outcomes_key(current)
+            pipe = client.pipeline(transaction=False)
+            pipe.hincrby(key, "hedged", 1)
+            pipe.hincrby(key, "total", 1)
+            pipe.expire(key, (window + 1) * 60)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"Hedge budget unavailable, not hedging: {e}")
+            return False
+
+
+# Global hedge policy instance
+hedge_policy = HedgePolicy()
@@ -0,0 +1,265 @@
+"""
+Idempotent uploads and deduplicated file processing.
+
+Uploads: a client may send an ``Idempotency-Key`` header. The first request
+with a key reserves it; its response is stored for
+``IDEMPOTENCY_TTL_SECONDS`` and returned to every retry with the same key (per
+API key), so a retried upload does not start a second job. A retry arriving
+while the first request is still being handled gets a 409; the reservation is
+refreshed for as long as the first request runs. The response is stored with a
+fingerprint of the request, and a request reusing the key for different files
+or parameters gets a 422 instead of the replay.
+
+Files: ``process_file_in_batch`` claims each (job id, file content hash) before
+calling FAL.AI. A task finding the file claimed by another task (the same image
+twice in a job) gets ``ClaimHeld`` and is retried after
+``CLAIM_RETRY_SECONDS``, so that it does not hold a worker slot while waiting;
+its next run reuses the claimant's result instead of submitting it again. A
+claim expires after ``FILE_CLAIM_SECONDS``, which bounds the wait when the
+claimant is stuck. A task redelivered after its worker died finds the claim
+under its own task id and takes it over. Results stay in Redis for
+``FILE_RESULT_TTL_SECONDS``, so a task redelivered after finishing returns the
+stored result.
+
+Generations are also coalesced across jobs: the same image with the same
+generation parameters is claimed under its digest and parameters. Tasks of
+other jobs that start while it is being generated attach to the result. Only
+successful results are shared this way, and only for
+``COALESCE_RESULT_SECONDS``, so this is single-flight rather than a cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Callable, Iterable, Optional, Tuple
+
+import redis
+from app.core.config import settings
+from app.core.worker_health import get_async_clients
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_PREFIX = "idempotency:"
+FILE_CLAIM_KEY_PREFIX = "file_claim:"
+FILE_RESULT_KEY_PREFIX = "file_result:"
+
+# Stored for an upload key while its first request is being handled
+PENDING = "pending"
+
+# How long a first request may go without refreshing its reservation before the key can be reused
+PENDING_TTL_SECONDS = 120
+
+# Interval at which a running first request refreshes its reservation
+PENDING_REFRESH_SECONDS = 30
+
+# Delay before a task waiting for another task's claim runs again
+CLAIM_RETRY_SECONDS = 5
+
+# KEYS: claim; ARGV: claimant. Deletes the claim only while the claimant still holds it.
+_RELEASE_CLAIM_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def file_digest(file_path: str) -> str:
+    """Get the SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def request_fingerprint(file_digests: Iterable[Tuple[str, str]], **params: Any) -> str:
+    """
+    Get the fingerprint of an upload, compared when its idempotency key is reused.
+
+    Args:
+        file_digests: (filename, content SHA-256) of each file, in upload order
+        params: Request parameters, e.g. face_limit
+    """
+    fingerprint = hashlib.sha256()
+    for filename, digest in file_digests:
+        fingerprint.update(f"{filename}\0{digest}\n".encode())
+    fingerprint.update(json.dumps(params, sort_keys=True).encode())
+    return fingerprint.hexdigest()
+
+
+class IdempotencyStore:
+    """Responses of uploads sent with an ``Idempotency-Key`` (API side)."""
+
+    def _key(self, owner: str, idempotency_key: str) -> str:
+        # Client keys are arbitrary strings; hash them into a bounded Redis key
+        return f"{IDEMPOTENCY_KEY_PREFIX}{owner}:{hashlib.sha256(idempotency_key.encode()).hexdigest()}"
+
+    async def begin(self, owner: str, idempotency_key: str) -> Optional[Any]:
+        """
+        Reserve an idempotency key for a new request.
+
+        Args:
+            owner: Identifier of the caller (see app.core.admission.client_id)
+            idempotency_key: Key sent by the client
+
+        Returns:
+            None if the key was reserved for this request, PENDING if another
+            request with the key is in progress, or the stored record (dict
+            with the request "fingerprint" and the "response")
+        """
+        _, backend = get_async_clients()
+        key = self._key(owner, idempotency_key)
+        try:
+            if await backend.set(key, PENDING, nx=True, ex=PENDING_TTL_SECONDS):
+                return None
+            value = await backend.get(key)
+        except Exception as e:
+            # Without Redis the upload proceeds as if no key had been sent
+            logger.warning(f"Idempotency store unavailable: {e}")
+            return None
+        if value is None or value == PENDING:
+            return PENDING
+        return json.loads(value)
+
+    @asynccontextmanager
+    async def pending(self, owner: str, idempotency_key: str) -> AsyncIterator[None]:
+        """Keep the key reserved while its first request is handled, however long that takes."""
+        _, backend = get_async_clients()
+        key = self._key(owner, idempotency_key)
+
+        async def refresh():
+            while True:
+                await asyncio.sleep(PENDING_REFRESH_SECONDS)
+                try:
+                    await backend.expire(key, PENDING_TTL_SECONDS)
+                except Exception as e:
+                    logger.debug(f"Failed to refresh idempotency key reservation: {e}")
+
+        refresher = asyncio.create_task(refresh())
+        try:
+            yield
+        finally:
+            refresher.cancel()
+
+    async def complete(self, owner: str, idempotency_key: str, fingerprint: str, response: Dict[str, Any]) -> None:
+        """Store the response returned to retries of the request, with the request's fingerprint."""
+        _, backend = get_async_clients()
+        try:
+            await backend.set(self._key(owner, idempotency_key),
+                              json.dumps({"fingerprint": fingerprint, "response": response}),
+                              ex=settings.IDEMPOTENCY_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Failed to store idempotent response: {e}")
+
+    async def abandon(self, owner: str, idempotency_key: str) -> None:
+        """Release the key of a request that failed, so that it can be retried."""
+        _, backend = get_async_clients()
+        try:
+            await backend.delete(self._key(owner, idempotency_key))
+        except Exception as e:
+            logger.warning(f"Failed to release idempotency key: {e}")
+
+
+class ClaimHeld(Exception):
+    """Raised when another task is computing the result of a scope; retry later to reuse it."""
+
+    def __init__(self, scope: str, holder: str):
+        super().__init__(f"{scope} is claimed by task {holder}")
+        self.scope = scope
+        self.holder = holder
+
+
+class FileClaims:
+    """Claims and results of files being processed (worker side)."""
+
+    def __init__(self):
+        self._redis_client = None
+        self._release_claim = None
+
+    def _client(self):
+        if self._redis_client is None:
+            self._redis_client = redis.from_url(settings.CELERY_RESULT_BACKEND, decode_responses=True)
+        return self._redis_client
+
+    def _release(self, claim_key: str, claimant: str) -> None:
+        # Atomic: the claim may have expired and been taken by another task since it was read
+        if self._release_claim is None:
+            self._release_claim = self._client().register_script(_RELEASE_CLAIM_SCRIPT)
+        self._release_claim(keys=[claim_key], args=[claimant])
+
+    def run_once(self, scope: str, claimant: str, compute: Callable[[], Dict[str, Any]],
+                 result_ttl: Optional[int] = None,
+                 shareable: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Compute the result of a scope once, or reuse the result another task computed.
+
+        Args:
+            scope: What is deduplicated, e.g. "<job_id>:<file digest>"
+            claimant: Id of the calling task
+            compute: Produces the result when this task holds the claim
+            result_ttl: How long the result is reused (FILE_RESULT_TTL_SECONDS by default)
+            shareable: Whether a result may be reused; others are not stored and
+                waiting tasks compute their own
+
+        Returns:
+            Tuple of the result and whether it came from another task (or an
+            earlier delivery of this one)
+
+        Raises:
+            ClaimHeld: If another task holds the claim and has not stored its result yet
+        """
+        claim_key = f"{FILE_CLAIM_KEY_PREFIX}{scope}"
+        result_key = f"{FILE_RESULT_KEY_PREFIX}{scope}"
+        try:
+            client = self._client()
+            stored = client.get(result_key)
+            if stored:
+                return json.loads(stored), True
+            if not client.set(claim_key, claimant, nx=True, ex=int(settings.FILE_CLAIM_SECONDS)):
+                holder = client.get(claim_key)
+                if holder == claimant:
+                    # Redelivered after the worker died mid-file
+                    logger.warning(f"Taking over the claim on {scope} from an earlier delivery")
+                    client.set(claim_key, claimant, ex=int(settings.FILE_CLAIM_SECONDS))
+                elif holder is not None or not client.set(claim_key, claimant, nx=True,
+                                                          ex=int(settings.FILE_CLAIM_SECONDS)):
+                    # Held, or the claim just expired and another task took it first
+                    raise ClaimHeld(scope, holder or client.get(claim_key) or "unknown")
+            # The claimant may have stored its result and released the claim since the first read
+            stored = client.get(result_key)
+            if stored:
+                self._release(claim_key, claimant)
+                return json.loads(stored), True
+        except redis.RedisError as e:
+            logger.warning(f"File claims unavailable, processing {scope} without deduplication: {e}")
+            return compute(), False
+
+        try:
+            result = compute()
+            try:
+                if shareable is None or shareable(result):
+                    client.set(result_key, json.dumps(result), ex=result_ttl or settings.FILE_RESULT_TTL_SECONDS)
+            except Exception as e:
+                logger.warning(f"Failed to store the result of {scope}: {e}")
+            return result, False
+        finally:
+            try:
+                self._release(claim_key, claimant)
+            except Exception as e:
+                logger.debug(f"Failed to release the claim on {scope}: {e}")
+
+
+def generation_scope(digest: str, **params: Any) -> str:
+    """Get the claim scope of generating an image with given parameters, shared by all jobs."""
+    encoded = ",".join(f"{name}={params[name]}" for name in sorted(params))
+    return f"generation:{digest}:{hashlib.sha256(encoded.encode()).hexdigest()[:16]}"
+
+
+# Global idempotency store instance
+idempotency_store = IdempotencyStore()
+
+# Global file claims instance
+file_claims = FileClaims()
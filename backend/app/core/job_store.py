@@ -6,6 +6,7 @@ allowing sharing between worker and API processes.
 
 import logging
 import json
+import time
 from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
 import redis
@@ -13,6 +14,9 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Attempts at publishing a file result while Redis is unavailable, 1, 2, 4 and 8 seconds apart
+PUBLISH_ATTEMPTS = 5
+
 class JobStore:
     """Redis-based store for job results."""
     
@@ -66,6 +70,70 @@ class JobStore:
             logger.error(f"Failed to get job result from Redis for job {job_id}: {e}", exc_info=True)
             return None
     
+    def _get_files_key(self, job_id: str) -> str:
+        """Get Redis key of the per-file results of a job."""
+        return f"job_files:{job_id}"
+    
+    def add_file_result(self, job_id: str, file_index: int, total_files: int, file_entry: Dict[str, Any]) -> None:
+        """
+        Publish the result of one file of a batch as soon as it completes.
+        
+        Each file is a separate field of a per-job hash, so files finishing in
+        parallel never overwrite each other and a retried file replaces its entry.
+        
+        Args:
+            job_id: Job identifier
+            file_index: Index of the file in the batch
+            total_files: Number of files in the batch
+            file_entry: File entry (status, filename, model_url, error, ...)
+        
+        Raises:
+            redis.RedisError: If Redis stays unavailable for PUBLISH_ATTEMPTS attempts;
+                the entry is the only copy of the file's model URL, so it must not be dropped
+        """
+        key = self._get_files_key(job_id)
+        for attempt in range(PUBLISH_ATTEMPTS):
+            try:
+                pipe = self._redis_client.pipeline(transaction=False)
+                pipe.hset(key, mapping={
+                    "total_files": total_files,
+                    f"file:{file_index}": json.dumps(file_entry)
+                })
+                pipe.expire(key, self._ttl)
+                pipe.execute()
+                return
+            except redis.RedisError as e:
+                if attempt == PUBLISH_ATTEMPTS - 1:
+                    logger.error(f"Failed to store file result {file_index} of job {job_id} in Redis: {e}")
+                    raise
+                logger.warning(f"Failed to store file result {file_index} of job {job_id} (attempt {attempt + 1}): {e}")
+                time.sleep(2 ** attempt)
+    
+    def get_file_results(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the per-file results published so far.
+        
+        Returns:
+            Dict with total_files and the file entries in batch order, or None
+            if no file of the job has completed
+        """
+        try:
+            data = self._redis_client.hgetall(self._get_files_key(job_id))
+        except Exception as e:
+            logger.error(f"Failed to get file results from Redis for job {job_id}: {e}")
+            return None
+        if not data:
+            return None
+        
+        entries = {
+            int(field.split(":", 1)[1]): json.loads(value)
+            for field, value in data.items() if field.startswith("file:")
+        }
+        return {
+            "total_files": int(data.get("total_files", len(entries))),
+            "files": [entries[index] for index in sorted(entries)]
+        }
+    
     def set_job_metadata(self, job_id: str, metadata: Dict[str, Any]) -> None:
         """Store job metadata separately from results."""
         try:
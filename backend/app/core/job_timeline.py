@@ -0,0 +1,225 @@
+"""
+Redis-based per-job timeline of phase timestamps.
+
+Each job keeps one hash of ``phase -> epoch seconds`` written by the API and
+worker processes as the job moves through upload, queueing, parallel file
+processing and finalization. Marks use HSETNX so that the first occurrence of
+a phase wins when a task is retried. Durations between phases are derived when
+the timeline is read, which keeps the write path to a single round trip.
+API handlers use ``mark_async``, which writes through the pooled async client.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+import redis
+from app.core.config import settings
+from app.core.worker_health import get_async_clients
+
+logger = logging.getLogger(__name__)
+
+# Job-level phases, in the order a job normally goes through them
+JOB_PHASES = (
+    "upload_received",    # upload request accepted
+    "files_saved",        # all files written to the upload directory
+    "batch_queued",       # process_batch published (batches not dispatched by the upload)
+    "batch_started",      # process_batch running on a worker
+    "chord_dispatched",   # per-file tasks published
+    "finalize_started",   # finalize_batch_results running
+    "results_stored",     # results written to the job store
+)
+
+# Per-file phases, recorded by process_file_in_batch and the FAL.AI client
+FILE_PHASES = ("started", "uploaded", "submitted", "first_progress", "completed")
+
+# Named segments (name, from phase, to phase); "files_completed" is the last file completion
+JOB_SEGMENTS = (
+    ("upload", "upload_received", "files_saved"),
+    ("enqueue", "files_saved", "batch_queued"),
+    ("batch_queue_wait", "batch_queued", "batch_started"),
+    ("chord_dispatch", "batch_started", "chord_dispatched"),
+    # Files saved until per-file tasks are published, with or without the process_batch hop
+    ("dispatch", "files_saved", "chord_dispatched"),
+    ("file_processing", "chord_dispatched", "files_completed"),
+    ("finalize_queue_wait", "files_completed", "finalize_started"),
+    ("finalize", "finalize_started", "results_stored"),
+    ("total", "upload_received", "results_stored"),
+)
+
+# Per-file segments; "dispatched" is the job's chord_dispatched mark
+FILE_SEGMENTS = (
+    ("file_queue_wait", "dispatched", "started"),
+    ("fal_upload", "started", "uploaded"),
+    ("fal_queue_wait", "submitted", "first_progress"),
+    ("fal_inference", "first_progress", "completed"),
+    ("file_total", "started", "completed"),
+)
+
+
+def _segment_durations(marks: Dict[str, float], segments) -> Dict[str, float]:
+    """Get the duration (seconds) of every segment whose both ends were marked."""
+    durations = {}
+    for name, start, end in segments:
+        if start in marks and end in marks:
+            durations[name] = round(max(0.0, marks[end] - marks[start]), 3)
+    return durations
+
+
+class JobTimeline:
+    """Redis-based store for job phase timestamps."""
+
+    def __init__(self, ttl_hours: int = 24):
+        """Initialize Redis connection for timeline storage."""
+        self._redis_client = redis.from_url(
+            settings.CELERY_RESULT_BACKEND,
+            decode_responses=True
+        )
+        self._ttl = int(timedelta(hours=ttl_hours).total_seconds())
+        self._key_prefix = "job_timeline:"
+
+    def _get_key(self, job_id: str) -> str:
+        """Get Redis key for a job."""
+        return f"{self._key_prefix}{job_id}"
+
+    def _set_fields(self, job_id: str, fields: Dict[str, str], overwrite: bool = False) -> None:
+        """Write fields in one round trip; failures are logged and never interrupt processing."""
+        try:
+            key = self._get_key(job_id)
+            pipe = self._redis_client.pipeline(transaction=False)
+            for field, value in fields.items():
+                if overwrite:
+                    pipe.hset(key, field, value)
+                else:
+                    pipe.hsetnx(key, field, value)
+            pipe.expire(key, self._ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to record timeline for job {job_id}: {e}")
+
+    async def _set_fields_async(self, job_id: str, fields: Dict[str, str]) -> None:
+        """Write first-occurrence fields like _set_fields, without blocking the event loop."""
+        try:
+            _, backend = get_async_clients()
+            key = self._get_key(job_id)
+            pipe = backend.pipeline(transaction=False)
+            for field, value in fields.items():
+                pipe.hsetnx(key, field, value)
+            pipe.expire(key, self._ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to record timeline for job {job_id}: {e}")
+
+    def mark(self, job_id: str, phase: str, timestamp: Optional[float] = None) -> None:
+        """
+        Record the time a job reached a phase.
+
+        Args:
+            job_id: Job identifier
+            phase: One of JOB_PHASES
+            timestamp: Epoch seconds (defaults to now)
+        """
+        if phase not in JOB_PHASES:
+            raise ValueError(f"Unknown job phase: {phase}")
+        self._set_fields(job_id, {phase: f"{timestamp or time.time():.3f}"})
+
+    async def mark_async(self, job_id: str, phase: str, timestamp: Optional[float] = None) -> None:
+        """Record the time a job reached a phase (see mark), from async code."""
+        if phase not in JOB_PHASES:
+            raise ValueError(f"Unknown job phase: {phase}")
+        await self._set_fields_async(job_id, {phase: f"{timestamp or time.time():.3f}"})
+
+    def mark_file(self, job_id: str, file_index: int, phase: str,
+                  timestamp: Optional[float] = None, status: Optional[str] = None) -> None:
+        """
+        Record the time a file of a job reached a phase.
+
+        Args:
+            job_id: Job identifier
+            file_index: Index of the file in the batch
+            phase: One of FILE_PHASES
+            timestamp: Epoch seconds (defaults to now)
+            status: Final file status, stored with the "completed" phase
+        """
+        if phase not in FILE_PHASES:
+            raise ValueError(f"Unknown file phase: {phase}")
+        fields = {f"file:{file_index}:{phase}": f"{timestamp or time.time():.3f}"}
+        if status:
+            fields[f"file:{file_index}:status"] = status
+        self._set_fields(job_id, fields)
+
+    def get_marks(self, job_id: str) -> Dict[str, str]:
+        """Get the raw timeline hash of a job (empty if none was recorded)."""
+        try:
+            return self._redis_client.hgetall(self._get_key(job_id))
+        except Exception as e:
+            logger.error(f"Failed to get timeline from Redis for job {job_id}: {e}")
+            return {}
+
+    def get_timeline(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the timeline of a job with derived phase durations.
+
+        Returns:
+            Dict with job phases (timestamp and offset from the first mark),
+            segment durations, per-file phases/durations and the file on the
+            critical path, or None if nothing was recorded
+        """
+        raw = self.get_marks(job_id)
+        if not raw:
+            return None
+
+        job_marks: Dict[str, float] = {}
+        file_marks: Dict[int, Dict[str, float]] = {}
+        file_status: Dict[int, str] = {}
+        for field, value in raw.items():
+            if field.startswith("file:"):
+                _, index, phase = field.split(":", 2)
+                if phase == "status":
+                    file_status[int(index)] = value
+                else:
+                    file_marks.setdefault(int(index), {})[phase] = float(value)
+            else:
+                job_marks[field] = float(value)
+
+        completions = {index: marks["completed"] for index, marks in file_marks.items() if "completed" in marks}
+        if completions:
+            job_marks["files_completed"] = max(completions.values())
+
+        origin = min(list(job_marks.values()) + [t for m in file_marks.values() for t in m.values()])
+
+        def phases(marks: Dict[str, float], names) -> Dict[str, Dict[str, Any]]:
+            return {
+                name: {
+                    "timestamp": datetime.fromtimestamp(marks[name]).isoformat(),
+                    "offset_seconds": round(marks[name] - origin, 3)
+                }
+                for name in names if name in marks
+            }
+
+        files: List[Dict[str, Any]] = []
+        for index in sorted(file_marks):
+            marks = dict(file_marks[index])
+            if "chord_dispatched" in job_marks:
+                marks["dispatched"] = job_marks["chord_dispatched"]
+            files.append({
+                "file_index": index,
+                "status": file_status.get(index),
+                "phases": phases(marks, FILE_PHASES),
+                "durations": _segment_durations(marks, FILE_SEGMENTS)
+            })
+
+        return {
+            "job_id": job_id,
+            "started_at": datetime.fromtimestamp(origin).isoformat(),
+            "phases": phases(job_marks, JOB_PHASES + ("files_completed",)),
+            "durations": _segment_durations(job_marks, JOB_SEGMENTS),
+            # The last file to complete gates finalization
+            "critical_file_index": max(completions, key=completions.get) if completions else None,
+            "files": files
+        }
+
+
+# Global job timeline instance
+job_timeline = JobTimeline()
@@ -0,0 +1,192 @@
+"""
+Mergeable streaming latency statistics.
+
+``LatencyDigest`` is a logarithmically bucketed histogram (DDSketch style): every
+value is counted in a bin whose bounds grow geometrically, so quantiles are
+reported with a bounded relative error and memory is bounded by the number of
+bins instead of the number of observations. Digests merge by adding bin counts,
+which makes them suitable for partial aggregates computed in parallel.
+
+``SlowestRequests`` keeps the top-K slowest requests in a bounded min-heap.
+"""
+
+import heapq
+import math
+from typing import Dict, Any, Iterable, List, Optional
+
+# Relative accuracy of reported quantiles (1%)
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Upper bound on the number of bins kept per digest; the lowest bins are collapsed beyond it
+DEFAULT_MAX_BINS = 2048
+
+# Values at or below this (in ms) are counted in the zero bin
+MIN_TRACKED_VALUE = 1e-3
+
+_GAMMA = (1 + DEFAULT_RELATIVE_ACCURACY) / (1 - DEFAULT_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+def bin_index(value: float) -> int:
+    """Get the index of the bin that holds ``value`` (must be > MIN_TRACKED_VALUE)."""
+    return int(math.ceil(math.log(value) / _LOG_GAMMA))
+
+
+def bin_value(index: int) -> float:
+    """Get the representative value of a bin (within the relative accuracy of its members)."""
+    return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+
+class LatencyDigest:
+    """Streaming, mergeable quantile sketch for non-negative latencies."""
+
+    def __init__(self, max_bins: int = DEFAULT_MAX_BINS):
+        self.max_bins = max_bins
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float, count: int = 1) -> None:
+        """Record ``count`` observations of ``value``."""
+        if value < 0:
+            value = 0.0
+        if value <= MIN_TRACKED_VALUE:
+            self.zero_count += count
+        else:
+            index = bin_index(value)
+            self.bins[index] = self.bins.get(index, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyDigest") -> "LatencyDigest":
+        """Merge another digest into this one."""
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def _collapse(self) -> None:
+        """Fold the lowest bins into one so that at most ``max_bins`` remain."""
+        indexes = sorted(self.bins)
+        excess = indexes[:len(indexes) - self.max_bins + 1]
+        folded = sum(self.bins.pop(index) for index in excess)
+        target = excess[-1]
+        self.bins[target] = self.bins.get(target, 0) + folded
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the ``q`` quantile (0 <= q <= 1).
+
+        Returns:
+            The estimated value, or None if the digest is empty
+        """
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # Clamp to the exact extremes so estimates never leave the observed range
+                return min(max(bin_value(index), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        """Get count, mean, p50/p95/p99 and max of the digest."""
+        return {
+            "count": self.count,
+            "avg": round(self.mean, 3),
+            "p50": _rounded(self.quantile(0.50)),
+            "p95": _rounded(self.quantile(0.95)),
+            "p99": _rounded(self.quantile(0.99)),
+            "max": _rounded(self.max)
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to a JSON-compatible dict."""
+        return {
+            "bins": {str(index): count for index, count in self.bins.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], max_bins: int = DEFAULT_MAX_BINS) -> "LatencyDigest":
+        """Deserialize a digest produced by :meth:`to_dict`."""
+        digest = cls(max_bins=max_bins)
+        digest.bins = {int(index): count for index, count in data.get("bins", {}).items()}
+        digest.zero_count = data.get("zero_count", 0)
+        digest.count = data.get("count", 0)
+        digest.total = data.get("total", 0.0)
+        digest.min = data.get("min")
+        digest.max = data.get("max")
+        return digest
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
+
+
+class SlowestRequests:
+    """Bounded top-K of the slowest requests, kept as a min-heap of ``[duration_ms, timestamp, endpoint]``."""
+
+    def __init__(self, limit: int = 20, entries: Optional[Iterable[List[Any]]] = None):
+        self.limit = limit
+        self.heap: List[List[Any]] = []
+        for entry in entries or ():
+            self.add(*entry)
+
+    def add(self, duration_ms: float, timestamp: Optional[str], endpoint: str) -> None:
+        """Offer a request; it is kept only if it is among the ``limit`` slowest."""
+        entry = [duration_ms, timestamp or "", endpoint]
+        if len(self.heap) < self.limit:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def merge(self, other: "SlowestRequests") -> "SlowestRequests":
+        """Merge another top-K into this one."""
+        for entry in other.heap:
+            self.add(*entry)
+        return self
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Get the kept requests, slowest first."""
+        return [
+            {"endpoint": endpoint, "duration_ms": duration_ms, "timestamp": timestamp or None}
+            for duration_ms, timestamp, endpoint in sorted(self.heap, reverse=True)
+        ]
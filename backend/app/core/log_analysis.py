@@ -0,0 +1,477 @@
+"""
+Incremental log analysis primitives.
+
+Log files are analyzed into time-bucketed partial aggregates that can be merged
+with each other. Each file keeps a persistent checkpoint (inode, byte offset and
+its partial aggregates) so repeated analyses only parse newly appended bytes.
+"""
+
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from app.core.error_fingerprint import (
+    count_top_k, merge_top_k, normalize_error_message, normalize_log_line, normalize_request_path
+)
+from app.core.latency_digest import LatencyDigest, SlowestRequests
+
+logger = logging.getLogger(__name__)
+
+# Width of a time bucket in seconds. Analysis windows are resolved to this granularity.
+BUCKET_SECONDS = 600
+
+# Buckets older than this are dropped from checkpoints (matches the API's max hours_back)
+MAX_BUCKET_AGE_SECONDS = 168 * 3600
+
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+# Requests slower than this (ms) count as slow; only the slowest few are kept per bucket
+SLOW_REQUEST_MS = 5000
+SLOW_REQUEST_LIMIT = 20
+
+# Per-bucket cap on endpoints with their own latency digest; the rest share OTHER_ENDPOINT.
+# Endpoints are route templates, so the cap is only reached by unexpected paths.
+MAX_LATENCY_ENDPOINTS = 200
+OTHER_ENDPOINT = "other"
+
+# Per-bucket capacity of the request pattern summary (see count_top_k)
+MAX_REQUEST_PATTERNS = 200
+
+# Bumped whenever the bucket layout changes so stale checkpoints are re-parsed
+INDEX_VERSION = 4
+
+# Number of leading bytes used to detect that an inode now holds a different file
+HEAD_SIGNATURE_BYTES = 512
+
+# Timestamp prefix of traditional log lines, e.g. "[2024-01-01 12:00:00] INFO ..."
+# or Celery's "[2024-01-01 12:00:00,123: INFO/MainProcess] ..."
+_TRADITIONAL_TIMESTAMP = re.compile(r"^\[?(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})")
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """Convert an ISO-8601 timestamp to epoch seconds (naive values are local time)."""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_line_timestamp(line: str) -> Optional[float]:
+    """Extract the leading timestamp of a traditional (non-JSON) log line."""
+    match = _TRADITIONAL_TIMESTAMP.match(line)
+    if not match:
+        return None
+    return parse_timestamp(f"{match.group(1)}T{match.group(2)}")
+
+
+def bucket_key(timestamp: float) -> str:
+    """Get the bucket key (bucket start in epoch seconds) for a timestamp."""
+    return str(int(timestamp // BUCKET_SECONDS) * BUCKET_SECONDS)
+
+
+def new_bucket() -> Dict[str, Any]:
+    """Create an empty partial aggregate."""
+    return {
+        "lines": 0,
+        "log_levels": {level: 0 for level in LOG_LEVELS},
+        "error_patterns": {},
+        "request_patterns": {},
+        "latency": {},
+        "slow_request_count": 0,
+        "slow_requests": []
+    }
+
+
+def merge_bucket(target: Dict[str, Any], source: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the partial aggregate ``source`` into ``target``."""
+    target["lines"] += source["lines"]
+    for level, count in source["log_levels"].items():
+        target["log_levels"][level] = target["log_levels"].get(level, 0) + count
+    merge_top_k(target["error_patterns"], source["error_patterns"])
+    merge_top_k(target["request_patterns"], source["request_patterns"], MAX_REQUEST_PATTERNS)
+    for endpoint, digest in source["latency"].items():
+        if endpoint not in target["latency"] and len(target["latency"]) >= MAX_LATENCY_ENDPOINTS:
+            endpoint = OTHER_ENDPOINT
+        if endpoint in target["latency"]:
+            merged = LatencyDigest.from_dict(target["latency"][endpoint]).merge(LatencyDigest.from_dict(digest))
+            target["latency"][endpoint] = merged.to_dict()
+        else:
+            target["latency"][endpoint] = LatencyDigest.from_dict(digest).to_dict()
+    target["slow_request_count"] += source["slow_request_count"]
+    slowest = SlowestRequests(SLOW_REQUEST_LIMIT, target["slow_requests"])
+    slowest.merge(SlowestRequests(SLOW_REQUEST_LIMIT, source["slow_requests"]))
+    target["slow_requests"] = slowest.heap
+    return target
+
+
+def merge_buckets(target: Dict[str, Dict[str, Any]], source: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Merge a mapping of bucket key -> partial aggregate into ``target``."""
+    for key, bucket in source.items():
+        if key in target:
+            merge_bucket(target[key], bucket)
+        else:
+            target[key] = merge_bucket(new_bucket(), bucket)
+    return target
+
+
+def request_endpoint(log_entry: Dict[str, Any]) -> str:
+    """
+    Get the endpoint of a request log entry: its route template when logged,
+    otherwise its path with the identifiers masked.
+    """
+    endpoint = log_entry.get('endpoint')
+    if isinstance(endpoint, str) and endpoint:
+        return endpoint
+    return normalize_request_path(str(log_entry['path']))
+
+
+def analyze_lines(lines: Iterable[str], buckets: Dict[str, Dict[str, Any]], fallback_timestamp: float) -> None:
+    """
+    Analyze log lines into time buckets.
+
+    Args:
+        lines: Decoded log lines
+        buckets: Bucket mapping updated in place
+        fallback_timestamp: Timestamp used for lines before the first dated line
+    """
+    last_timestamp = fallback_timestamp
+
+    # Latency statistics are kept as objects during the pass and serialized at the end
+    digests: Dict[str, Dict[str, LatencyDigest]] = {}
+    slowest: Dict[str, SlowestRequests] = {}
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith('{'):
+            try:
+                log_entry = json.loads(line)
+            except ValueError:
+                # Skip malformed lines
+                continue
+            if not isinstance(log_entry, dict):
+                continue
+
+            timestamp = parse_timestamp(log_entry.get('timestamp')) or last_timestamp
+            last_timestamp = timestamp
+            key = bucket_key(timestamp)
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = new_bucket()
+            bucket["lines"] += 1
+
+            # Count log levels
+            level = log_entry.get('level', 'INFO')
+            if isinstance(level, str):
+                level = level.upper()
+            if level in bucket["log_levels"]:
+                bucket["log_levels"][level] += 1
+
+            # Analyze error patterns
+            if level in ('ERROR', 'CRITICAL'):
+                error_msg = log_entry.get('message') or log_entry.get('event') or ''
+                if error_msg:
+                    count_top_k(bucket["error_patterns"], normalize_error_message(str(error_msg)))
+
+            # Analyze request patterns
+            if 'method' in log_entry and 'path' in log_entry:
+                endpoint = f"{log_entry['method']} {request_endpoint(log_entry)}"
+                count_top_k(bucket["request_patterns"], endpoint, MAX_REQUEST_PATTERNS)
+
+                # Track response times
+                duration = log_entry.get('duration_ms')
+                if isinstance(duration, (int, float)):
+                    bucket_digests = digests.get(key)
+                    if bucket_digests is None:
+                        bucket_digests = digests[key] = {
+                            name: LatencyDigest.from_dict(digest) for name, digest in bucket["latency"].items()
+                        }
+                    digest = bucket_digests.get(endpoint)
+                    if digest is None:
+                        name = endpoint if len(bucket_digests) < MAX_LATENCY_ENDPOINTS else OTHER_ENDPOINT
+                        digest = bucket_digests.setdefault(name, LatencyDigest())
+                    digest.add(duration)
+
+                    # Flag slow requests (>5 seconds)
+                    if duration > SLOW_REQUEST_MS:
+                        bucket["slow_request_count"] += 1
+                        if key not in slowest:
+                            slowest[key] = SlowestRequests(SLOW_REQUEST_LIMIT, bucket["slow_requests"])
+                        slowest[key].add(duration, log_entry.get('timestamp'), endpoint)
+        else:
+            # Traditional log format; undated lines (tracebacks) inherit the previous timestamp
+            timestamp = parse_line_timestamp(line) or last_timestamp
+            last_timestamp = timestamp
+            bucket = buckets.get(bucket_key(timestamp))
+            if bucket is None:
+                bucket = buckets[bucket_key(timestamp)] = new_bucket()
+            bucket["lines"] += 1
+
+            # Basic pattern matching for traditional logs
+            for level in ("ERROR", "WARNING", "INFO", "DEBUG", "CRITICAL"):
+                if f" {level} " in line:
+                    bucket["log_levels"][level] += 1
+                    if level in ('ERROR', 'CRITICAL'):
+                        count_top_k(bucket["error_patterns"], normalize_log_line(line))
+                    break
+
+    for key, bucket_digests in digests.items():
+        buckets[key]["latency"] = {name: digest.to_dict() for name, digest in bucket_digests.items()}
+    for key, requests in slowest.items():
+        buckets[key]["slow_requests"] = requests.heap
+
+
+def analyze_file_range(path: str, start: int = 0, end: Optional[int] = None,
+                       fallback_timestamp: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Analyze the complete lines of a log file starting at a byte offset.
+
+    Gzipped files are always analyzed as a whole. For plain files, a trailing line
+    without a newline is left for the next analysis since it may still be written.
+
+    Args:
+        path: Path to the log file
+        start: Byte offset to start from (plain files only)
+        end: Optional byte offset to stop at (plain files only)
+        fallback_timestamp: Timestamp for undated lines (defaults to file mtime)
+
+    Returns:
+        Dict with ``buckets`` and ``end_offset`` (offset after the last consumed line)
+    """
+    if fallback_timestamp is None:
+        fallback_timestamp = os.stat(path).st_mtime
+
+    buckets: Dict[str, Dict[str, Any]] = {}
+
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rt', encoding='utf-8', errors='ignore') as f:
+            analyze_lines(f, buckets, fallback_timestamp)
+        return {"buckets": buckets, "end_offset": os.stat(path).st_size}
+
+    offset = start
+
+    def complete_lines(f):
+        nonlocal offset
+        for raw_line in f:
+            if not raw_line.endswith(b'\n') or (end is not None and offset >= end):
+                break
+            offset += len(raw_line)
+            yield raw_line.decode('utf-8', errors='ignore')
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        analyze_lines(complete_lines(f), buckets, fallback_timestamp)
+
+    return {"buckets": buckets, "end_offset": offset}
+
+
+def split_ranges(path: str, start: int, size: int, chunk_size: int) -> List[Tuple[int, Optional[int]]]:
+    """
+    Split ``[start, size)`` of a plain file into line-aligned byte ranges.
+
+    Each range starts at a line boundary; the last range is open-ended so that
+    lines appended while the analysis runs are still consumed up to a full line.
+    """
+    if path.endswith('.gz') or size - start <= chunk_size:
+        return [(start, None)]
+
+    boundaries = [start]
+    with open(path, 'rb') as f:
+        position = start + chunk_size
+        while position < size:
+            f.seek(position)
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            boundaries.append(position)
+            position += chunk_size
+
+    return [
+        (boundary, boundaries[i + 1] if i + 1 < len(boundaries) else None)
+        for i, boundary in enumerate(boundaries)
+    ]
+
+
+def head_signature(path: str, size: int) -> str:
+    """Hash the first ``size`` bytes of a plain file to detect inode reuse."""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read(size)).hexdigest()
+
+
+class LogAnalysisIndex:
+    """
+    Persistent per-file checkpoints for incremental log analysis.
+
+    Checkpoints are keyed by device and inode so that renamed rotations
+    (``app.log`` -> ``app.log.1``) keep their already parsed aggregates.
+    """
+
+    def __init__(self, index_path: Path):
+        self.index_path = Path(index_path)
+        self._lock = threading.Lock()
+        self._checkpoints: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+
+    @staticmethod
+    def file_key(stat: os.stat_result) -> str:
+        """Get the checkpoint key for a file."""
+        return f"{stat.st_dev}:{stat.st_ino}"
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._checkpoints is None:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                # Checkpoints written with another bucket layout are re-parsed from scratch
+                self._checkpoints = data.get("checkpoints", {}) if data.get("version") == INDEX_VERSION else {}
+            except FileNotFoundError:
+                self._checkpoints = {}
+            except (ValueError, OSError) as e:
+                logger.warning(f"Discarding unreadable log analysis index {self.index_path}: {e}")
+                self._checkpoints = {}
+        return self._checkpoints
+
+    def plan(self, log_file: Path) -> Dict[str, Any]:
+        """
+        Determine what part of a log file still needs to be parsed.
+
+        Returns a plan with ``start`` (byte offset to resume from) and the already
+        parsed ``buckets``. ``pending`` is False when the checkpoint is current.
+        Truncated, replaced or rewritten files are planned from the start.
+        """
+        stat = log_file.stat()
+        key = self.file_key(stat)
+        compressed = log_file.suffix == '.gz'
+        plan = {
+            "key": key,
+            "path": str(log_file),
+            "compressed": compressed,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "start": 0,
+            "buckets": {},
+            "pending": True
+        }
+
+        with self._lock:
+            checkpoint = self._load().get(key)
+
+        if checkpoint and checkpoint["compressed"] == compressed:
+            if compressed:
+                if checkpoint["size"] == stat.st_size and checkpoint["mtime"] == stat.st_mtime:
+                    plan.update(buckets=self._touch(key, checkpoint, log_file), pending=False)
+            elif stat.st_size >= checkpoint["offset"] and (
+                checkpoint["head_size"] == 0
+                or head_signature(str(log_file), checkpoint["head_size"]) == checkpoint["head_digest"]
+            ):
+                plan.update(start=checkpoint["offset"], buckets=self._touch(key, checkpoint, log_file))
+                if stat.st_size == checkpoint["offset"]:
+                    plan["pending"] = False
+
+        return plan
+
+    def commit(self, plan: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Merge parsed ranges of a planned file into its checkpoint.
+
+        Args:
+            plan: Plan returned by :meth:`plan`
+            results: ``analyze_file_range`` results for consecutive ranges, in order
+
+        Returns:
+            The file's up-to-date buckets
+        """
+        buckets = plan["buckets"]
+        offset = plan["start"]
+        for result in results:
+            merge_buckets(buckets, result["buckets"])
+            offset = result["end_offset"]
+
+        head_size = 0 if plan["compressed"] else min(offset, HEAD_SIGNATURE_BYTES)
+        checkpoint = {
+            "path": plan["path"],
+            "compressed": plan["compressed"],
+            "size": plan["size"],
+            "mtime": plan["mtime"],
+            "offset": offset,
+            "head_size": head_size,
+            "head_digest": head_signature(plan["path"], head_size) if head_size else "",
+            "buckets": buckets
+        }
+
+        with self._lock:
+            self._load()[plan["key"]] = checkpoint
+            self._dirty = True
+
+        return buckets
+
+    def refresh(self, log_file: Path) -> Dict[str, Dict[str, Any]]:
+        """Bring the checkpoint of a log file up to date in-process and return its buckets."""
+        plan = self.plan(log_file)
+        if not plan["pending"]:
+            return plan["buckets"]
+        result = analyze_file_range(plan["path"], start=plan["start"], fallback_timestamp=plan["mtime"])
+        return self.commit(plan, [result])
+
+    def _touch(self, key: str, checkpoint: Dict[str, Any], log_file: Path) -> Dict[str, Dict[str, Any]]:
+        """Record a renamed file's new path without re-parsing it."""
+        if checkpoint["path"] != str(log_file):
+            with self._lock:
+                checkpoint["path"] = str(log_file)
+                self._dirty = True
+        return checkpoint["buckets"]
+
+    def prune(self, now: float) -> None:
+        """Drop checkpoints of deleted files and buckets beyond the retention window."""
+        cutoff = now - MAX_BUCKET_AGE_SECONDS
+        with self._lock:
+            checkpoints = self._load()
+            for key in list(checkpoints):
+                checkpoint = checkpoints[key]
+                try:
+                    stat = os.stat(checkpoint["path"])
+                except OSError:
+                    stat = None
+                if stat is None or self.file_key(stat) != key:
+                    del checkpoints[key]
+                    self._dirty = True
+                    continue
+                for bucket in [b for b in checkpoint["buckets"] if int(b) + BUCKET_SECONDS < cutoff]:
+                    del checkpoint["buckets"][bucket]
+                    self._dirty = True
+
+    def save(self) -> None:
+        """Atomically persist the checkpoints if they changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.tmp")
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"version": INDEX_VERSION, "checkpoints": self._checkpoints}, f)
+                os.replace(tmp_path, self.index_path)
+                self._dirty = False
+            except OSError as e:
+                logger.warning(f"Failed to persist log analysis index {self.index_path}: {e}")
+
+
+def merge_window(bucket_maps: Iterable[Dict[str, Dict[str, Any]]], start_timestamp: float) -> Dict[str, Any]:
+    """Merge all buckets overlapping ``[start_timestamp, now]`` into a single aggregate."""
+    merged = new_bucket()
+    for buckets in bucket_maps:
+        for key, bucket in buckets.items():
+            if int(key) + BUCKET_SECONDS > start_timestamp:
+                merge_bucket(merged, bucket)
+    return merged
@@ -0,0 +1,223 @@
+"""
+Streaming log export.
+
+Log files (plain and gzipped rotations) are read oldest first, filtered by
+timestamp and merged across log types in time order. Records are rendered as
+JSON Lines, CSV or text and optionally gzip-compressed, yielding byte chunks so
+that exports of any size run in bounded memory.
+"""
+
+import csv
+import gzip
+import heapq
+import io
+import json
+import logging
+import re
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+from app.core.log_analysis import parse_line_timestamp, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("json", "csv", "txt")
+
+CSV_FIELDS = ("timestamp", "log_type", "level", "logger", "message")
+
+# Size of the byte chunks yielded by the exporter
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# Minimum change (percent) of a file's progress before it is reported again
+PROGRESS_STEP_PERCENT = 5
+
+_TRADITIONAL_LEVEL = re.compile(r"\b(DEBUG|INFO|WARNING|ERROR|CRITICAL)\b")
+
+# Called with (file path, status, progress percent)
+ProgressCallback = Callable[[str, str, int], None]
+
+
+def export_extension(format: str, compress: bool) -> str:
+    """Get the file extension of an export."""
+    extension = "jsonl" if format == "json" else format
+    return f"{extension}.gz" if compress else extension
+
+
+def select_export_files(log_files: Dict[str, List[Path]], start_timestamp: float,
+                        log_types: Optional[List[str]] = None) -> Dict[str, List[Path]]:
+    """
+    Select the files that may hold records newer than ``start_timestamp``.
+
+    Args:
+        log_files: Log files by type, as returned by ``LogManager.get_log_files``
+        start_timestamp: Start of the export range (epoch seconds)
+        log_types: Types to export (None for all)
+
+    Returns:
+        Files by type, oldest first
+    """
+    selected = {}
+    for log_type, files in log_files.items():
+        if log_types and log_type not in log_types:
+            continue
+        # A file last written before the range starts cannot hold matching records
+        candidates = [f for f in files if f.exists() and f.stat().st_mtime >= start_timestamp]
+        if candidates:
+            selected[log_type] = sorted(candidates, key=lambda f: f.stat().st_mtime)
+    return selected
+
+
+def _parse_record(line: str, log_type: str, last_timestamp: float) -> Tuple[float, Dict[str, Any]]:
+    """Parse a log line into (epoch timestamp, record); undated lines inherit ``last_timestamp``."""
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            entry = None
+        if isinstance(entry, dict):
+            timestamp = parse_timestamp(entry.get('timestamp')) or last_timestamp
+            return timestamp, {
+                "timestamp": entry.get('timestamp'),
+                "log_type": log_type,
+                "level": str(entry.get('level', 'INFO')).upper(),
+                "logger": entry.get('logger'),
+                "message": entry.get('message') or entry.get('event'),
+                "entry": entry,
+                "raw": line
+            }
+
+    # Traditional log format; undated lines (tracebacks) inherit the previous timestamp
+    timestamp = parse_line_timestamp(line) or last_timestamp
+    level = _TRADITIONAL_LEVEL.search(line)
+    return timestamp, {
+        "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+        "log_type": log_type,
+        "level": level.group(1) if level else None,
+        "logger": None,
+        "message": line,
+        "entry": None,
+        "raw": line
+    }
+
+
+def _iter_file_records(path: Path, log_type: str, start_timestamp: float, end_timestamp: float,
+                       progress: Optional[ProgressCallback]) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """Yield the records of one file within ``[start_timestamp, end_timestamp)``."""
+    size = path.stat().st_size or 1
+    last_timestamp = start_timestamp
+    reported = 0
+
+    if progress:
+        progress(str(path), "processing", 0)
+
+    with open(path, 'rb') as raw:
+        stream = gzip.GzipFile(fileobj=raw) if path.suffix == '.gz' else raw
+        for line_number, raw_line in enumerate(stream):
+            line = raw_line.decode('utf-8', errors='ignore').strip()
+            if line:
+                timestamp, record = _parse_record(line, log_type, last_timestamp)
+                last_timestamp = timestamp
+                if start_timestamp <= timestamp < end_timestamp:
+                    yield timestamp, record
+
+            # Progress is measured on the (possibly compressed) bytes read from disk
+            if progress and line_number % 1000 == 0:
+                percent = min(99, int(raw.tell() * 100 / size))
+                if percent - reported >= PROGRESS_STEP_PERCENT:
+                    reported = percent
+                    progress(str(path), "processing", percent)
+
+    if progress:
+        progress(str(path), "completed", 100)
+
+
+def iter_export_records(files_by_type: Dict[str, List[Path]], start_timestamp: float, end_timestamp: float,
+                        progress: Optional[ProgressCallback] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield matching records of all log types merged in time order.
+
+    Each type's rotations are read oldest first; the per-type streams are then
+    merged lazily, so only one pending record per type is held in memory.
+    """
+    def type_stream(log_type: str, files: List[Path]) -> Iterator[Tuple[float, Dict[str, Any]]]:
+        for path in files:
+            try:
+                yield from _iter_file_records(path, log_type, start_timestamp, end_timestamp, progress)
+            except (OSError, EOFError, zlib.error) as e:
+                logger.warning(f"Skipping unreadable log file {path} during export: {e}")
+                if progress:
+                    progress(str(path), "failed", 100)
+
+    streams = [type_stream(log_type, files) for log_type, files in files_by_type.items()]
+    for _, record in heapq.merge(*streams, key=lambda item: item[0]):
+        yield record
+
+
+def _render(record: Dict[str, Any], format: str, csv_writer, csv_buffer: io.StringIO) -> str:
+    """Render a record in the export format."""
+    if format == "json":
+        entry = dict(record["entry"]) if record["entry"] is not None else {
+            "timestamp": record["timestamp"], "level": record["level"], "message": record["message"]
+        }
+        entry["log_type"] = record["log_type"]
+        return json.dumps(entry, default=str) + "\n"
+
+    if format == "csv":
+        csv_buffer.seek(0)
+        csv_buffer.truncate()
+        csv_writer.writerow([record[field] for field in CSV_FIELDS])
+        return csv_buffer.getvalue()
+
+    return f"[{record['log_type']}] {record['raw']}\n"
+
+
+def stream_export(records: Iterator[Dict[str, Any]], format: str = "json",
+                  compress: bool = False) -> Iterator[bytes]:
+    """
+    Render records incrementally as byte chunks.
+
+    Args:
+        records: Records from :func:`iter_export_records`
+        format: Export format ('json', 'csv', 'txt')
+        compress: Whether to gzip the output
+
+    Yields:
+        Chunks of roughly ``EXPORT_CHUNK_BYTES``
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {format}")
+
+    # wbits=31 produces a gzip container from a streaming compressor
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    csv_buffer = io.StringIO()
+    csv_writer = csv.writer(csv_buffer)
+
+    pending: List[bytes] = []
+    pending_size = 0
+
+    def flush() -> bytes:
+        nonlocal pending, pending_size
+        data = b"".join(pending)
+        pending, pending_size = [], 0
+        return compressor.compress(data) if compressor else data
+
+    if format == "csv":
+        csv_writer.writerow(CSV_FIELDS)
+        pending.append(csv_buffer.getvalue().encode('utf-8'))
+
+    for record in records:
+        data = _render(record, format, csv_writer, csv_buffer).encode('utf-8')
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= EXPORT_CHUNK_BYTES:
+            chunk = flush()
+            if chunk:
+                yield chunk
+
+    chunk = flush()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
@@ -7,14 +7,22 @@ import gzip
 import shutil
 import time
 import logging
-import json
+import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Iterator, Optional
 from pathlib import Path
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import psutil
 
+from app.core.latency_digest import LatencyDigest, SlowestRequests
+from app.core.log_analysis import (
+    SLOW_REQUEST_LIMIT, LogAnalysisIndex, analyze_file_range, merge_window, split_ranges
+)
+from app.core.log_export import export_extension, iter_export_records, select_export_files, stream_export
+from app.core.progress_tracker import progress_tracker
+
 logger = logging.getLogger(__name__)
 
 
@@ -26,7 +34,9 @@ class LogManager:
                  max_file_size_mb: int = 50,
                  max_files_per_type: int = 10,
                  compression_enabled: bool = True,
-                 cleanup_older_than_days: int = 30):
+                 cleanup_older_than_days: int = 30,
+                 analysis_workers: Optional[int] = None,
+                 analysis_chunk_size_mb: int = 8):
         """
         Initialize log manager.
         
@@ -36,6 +46,8 @@ class LogManager:
             max_files_per_type: Maximum number of rotated files to keep
             compression_enabled: Whether to compress rotated logs
             cleanup_older_than_days: Age in days after which logs are cleaned up
+            analysis_workers: Processes used for log analysis (defaults to CPU count)
+            analysis_chunk_size_mb: Size of the byte ranges analyzed per process
         """
         self.log_directory = Path(log_directory)
         self.max_file_size_bytes = max_file_size_mb * 1024 * 1024
@@ -49,6 +61,15 @@ class LogManager:
         # Thread pool for async operations
         self.executor = ThreadPoolExecutor(max_workers=2)
         
+        # Per-file checkpoints so repeated analyses only parse appended bytes
+        self.analysis_index = LogAnalysisIndex(self.log_directory / ".analysis_index.json")
+        self._analysis_lock = asyncio.Lock()
+        
+        # Process pool for parsing large log volumes (created on first use)
+        self.analysis_workers = analysis_workers or os.cpu_count() or 1
+        self.analysis_chunk_size_bytes = analysis_chunk_size_mb * 1024 * 1024
+        self._analysis_pool: Optional[ProcessPoolExecutor] = None
+        
     def get_log_files(self) -> Dict[str, List[Path]]:
         """Get all log files organized by type."""
         log_files = {}
@@ -324,6 +345,10 @@ class LogManager:
         """
         Analyze log patterns for insights and anomalies.
         
+        Parsing is incremental: only bytes appended since the previous analysis
+        are read, the rest comes from the checkpoint index. Large volumes are
+        split per file and per chunk across a process pool.
+        
         Args:
             log_type: Type of log to analyze
             hours_back: How many hours back to analyze
@@ -331,145 +356,141 @@ class LogManager:
         Returns:
             Analysis results
         """
-        cutoff_time = datetime.now() - timedelta(hours=hours_back)
+        now = datetime.now()
+        cutoff_time = now - timedelta(hours=hours_back)
         log_files = self.get_log_files()
         
         if log_type not in log_files:
             return {"error": f"No log files found for type: {log_type}"}
         
-        analysis = {
-            "time_range": {
-                "start": cutoff_time.isoformat(),
-                "end": datetime.now().isoformat(),
-                "hours_analyzed": hours_back
-            },
-            "log_levels": {"DEBUG": 0, "INFO": 0, "WARNING": 0, "ERROR": 0, "CRITICAL": 0},
-            "error_patterns": {},
-            "request_patterns": {},
-            "performance_metrics": {
-                "avg_response_time": 0,
-                "slow_requests": [],
-                "error_rate": 0
-            },
-            "lines_analyzed": 0
-        }
+        loop = asyncio.get_event_loop()
         
         try:
-            for log_file in log_files[log_type]:
-                if not log_file.exists():
-                    continue
+            async with self._analysis_lock:
+                # Skip files that are too old, plan the rest from their checkpoints
+                candidates = [
+                    log_file for log_file in log_files[log_type]
+                    if log_file.exists()
+                    and datetime.fromtimestamp(log_file.stat().st_mtime) >= cutoff_time
+                ]
+                plans = await loop.run_in_executor(self.executor, self._plan_analysis, candidates)
                 
-                # Skip if file is too old
-                file_mtime = datetime.fromtimestamp(log_file.stat().st_mtime)
-                if file_mtime < cutoff_time:
-                    continue
+                # Parse the pending ranges of every file concurrently
+                pending_bytes = sum(plan["size"] - plan["start"] for plan in plans if plan["pending"])
+                executor = self._get_analysis_pool() if pending_bytes > self.analysis_chunk_size_bytes else self.executor
                 
-                # Analyze file
-                await self._analyze_log_file(log_file, analysis, cutoff_time)
-            
-            # Calculate derived metrics
-            total_requests = sum(analysis["request_patterns"].values())
-            total_errors = analysis["log_levels"]["ERROR"] + analysis["log_levels"]["CRITICAL"]
-            
-            if total_requests > 0:
-                analysis["performance_metrics"]["error_rate"] = (total_errors / total_requests) * 100
+                async def analyze_plan(plan):
+                    if not plan["pending"]:
+                        return plan["buckets"]
+                    try:
+                        ranges = await loop.run_in_executor(
+                            self.executor, split_ranges,
+                            plan["path"], plan["start"], plan["size"], self.analysis_chunk_size_bytes
+                        )
+                        results = await asyncio.gather(*[
+                            loop.run_in_executor(
+                                executor, analyze_file_range, plan["path"], start, end, plan["mtime"]
+                            )
+                            for start, end in ranges
+                        ])
+                        return self.analysis_index.commit(plan, list(results))
+                    except Exception as e:
+                        logger.warning(f"Error analyzing log file {plan['path']}: {e}")
+                        return plan["buckets"]
+                
+                bucket_maps = await asyncio.gather(*[analyze_plan(plan) for plan in plans])
+                
+                merged = await loop.run_in_executor(
+                    self.executor, self._finish_analysis, bucket_maps, cutoff_time, now
+                )
             
-            return analysis
+            return self._build_analysis(merged, cutoff_time, now, hours_back)
             
         except Exception as e:
             logger.error(f"Error analyzing log patterns: {e}")
             return {"error": str(e)}
     
-    async def _analyze_log_file(self, log_file: Path, analysis: Dict, cutoff_time: datetime):
-        """Analyze a single log file."""
-        try:
-            # Handle compressed files
-            if log_file.suffix == '.gz':
-                import gzip
-                file_opener = gzip.open
-                mode = 'rt'
-            else:
-                file_opener = open
-                mode = 'r'
-            
-            response_times = []
-            
-            with file_opener(log_file, mode, encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    try:
-                        analysis["lines_analyzed"] += 1
-                        
-                        # Try to parse as JSON (structured logs)
-                        if line.strip().startswith('{'):
-                            log_entry = json.loads(line.strip())
-                            
-                            # Check timestamp
-                            if 'timestamp' in log_entry:
-                                log_time = datetime.fromisoformat(log_entry['timestamp'].replace('Z', '+00:00'))
-                                if log_time < cutoff_time:
-                                    continue
-                            
-                            # Count log levels
-                            level = log_entry.get('level', 'INFO')
-                            if level in analysis["log_levels"]:
-                                analysis["log_levels"][level] += 1
-                            
-                            # Analyze error patterns
-                            if level in ['ERROR', 'CRITICAL']:
-                                error_msg = log_entry.get('message', '')
-                                if error_msg:
-                                    if error_msg not in analysis["error_patterns"]:
-                                        analysis["error_patterns"][error_msg] = 0
-                                    analysis["error_patterns"][error_msg] += 1
-                            
-                            # Analyze request patterns
-                            if 'method' in log_entry and 'path' in log_entry:
-                                endpoint = f"{log_entry['method']} {log_entry['path']}"
-                                if endpoint not in analysis["request_patterns"]:
-                                    analysis["request_patterns"][endpoint] = 0
-                                analysis["request_patterns"][endpoint] += 1
-                                
-                                # Track response times
-                                if 'duration_ms' in log_entry:
-                                    duration = log_entry['duration_ms']
-                                    response_times.append(duration)
-                                    
-                                    # Flag slow requests (>5 seconds)
-                                    if duration > 5000:
-                                        analysis["performance_metrics"]["slow_requests"].append({
-                                            "endpoint": endpoint,
-                                            "duration_ms": duration,
-                                            "timestamp": log_entry.get('timestamp')
-                                        })
-                        
-                        else:
-                            # Parse traditional log format
-                            self._parse_traditional_log_line(line, analysis, cutoff_time)
-                            
-                    except (json.JSONDecodeError, ValueError):
-                        # Skip malformed lines
-                        continue
-            
-            # Calculate average response time
-            if response_times:
-                analysis["performance_metrics"]["avg_response_time"] = sum(response_times) / len(response_times)
-                
-        except Exception as e:
-            logger.warning(f"Error analyzing log file {log_file}: {e}")
+    def _plan_analysis(self, log_files: List[Path]) -> List[Dict[str, Any]]:
+        """Plan incremental analysis for each file (runs in the thread pool)."""
+        plans = []
+        for log_file in log_files:
+            try:
+                plans.append(self.analysis_index.plan(log_file))
+            except Exception as e:
+                logger.warning(f"Error planning analysis of log file {log_file}: {e}")
+        return plans
+    
+    def _finish_analysis(self, bucket_maps: List[Dict[str, Any]], cutoff_time: datetime,
+                         now: datetime) -> Dict[str, Any]:
+        """Merge the analysis window and persist the checkpoint index (runs in the thread pool)."""
+        merged = merge_window(bucket_maps, cutoff_time.timestamp())
+        self.analysis_index.prune(now.timestamp())
+        self.analysis_index.save()
+        return merged
+    
+    def _get_analysis_pool(self) -> ProcessPoolExecutor:
+        """Get the process pool used to parse large log volumes, creating it on first use."""
+        if self._analysis_pool is None:
+            # Spawn instead of fork: the API process runs threads and an event loop
+            self._analysis_pool = ProcessPoolExecutor(
+                max_workers=self.analysis_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._analysis_pool
+    
+    def shutdown(self):
+        """
+        Release the analysis process pool.
+        
+        The thread pool is kept: log_manager is a module global and outlives the
+        application lifespan, which may start again in the same process (tests).
+        The process pool is recreated on next use.
+        """
+        if self._analysis_pool is not None:
+            self._analysis_pool.shutdown(wait=False, cancel_futures=True)
+            self._analysis_pool = None
     
-    def _parse_traditional_log_line(self, line: str, analysis: Dict, cutoff_time: datetime):
-        """Parse traditional log format lines."""
-        # Basic pattern matching for traditional logs
-        if " ERROR " in line:
-            analysis["log_levels"]["ERROR"] += 1
-        elif " WARNING " in line:
-            analysis["log_levels"]["WARNING"] += 1
-        elif " INFO " in line:
-            analysis["log_levels"]["INFO"] += 1
-        elif " DEBUG " in line:
-            analysis["log_levels"]["DEBUG"] += 1
-        elif " CRITICAL " in line:
-            analysis["log_levels"]["CRITICAL"] += 1
+    def _build_analysis(self, merged: Dict[str, Any], cutoff_time: datetime,
+                        now: datetime, hours_back: int) -> Dict[str, Any]:
+        """Convert a merged partial aggregate into the analysis response format."""
+        analysis = {
+            "time_range": {
+                "start": cutoff_time.isoformat(),
+                "end": now.isoformat(),
+                "hours_analyzed": hours_back
+            },
+            "log_levels": merged["log_levels"],
+            "error_patterns": merged["error_patterns"],
+            "request_patterns": merged["request_patterns"],
+            "performance_metrics": {
+                "avg_response_time": 0,
+                "latency": {},
+                "endpoint_latency": {},
+                "slow_request_count": merged["slow_request_count"],
+                "slow_requests": SlowestRequests(SLOW_REQUEST_LIMIT, merged["slow_requests"]).to_list(),
+                "error_rate": 0
+            },
+            "lines_analyzed": merged["lines"]
+        }
+        
+        # Calculate derived metrics
+        overall = LatencyDigest()
+        for endpoint, data in merged["latency"].items():
+            digest = LatencyDigest.from_dict(data)
+            overall.merge(digest)
+            analysis["performance_metrics"]["endpoint_latency"][endpoint] = digest.summary()
+        
+        if overall.count > 0:
+            analysis["performance_metrics"]["avg_response_time"] = overall.mean
+            analysis["performance_metrics"]["latency"] = overall.summary()
+        
+        total_requests = sum(analysis["request_patterns"].values())
+        total_errors = analysis["log_levels"]["ERROR"] + analysis["log_levels"]["CRITICAL"]
+        
+        if total_requests > 0:
+            analysis["performance_metrics"]["error_rate"] = (total_errors / total_requests) * 100
+        
+        return analysis
 
 
 class LogAggregator:
@@ -513,34 +534,110 @@ class LogAggregator:
         
         return summary
     
+    def iter_export(self,
+                    start_date: datetime,
+                    end_date: datetime,
+                    log_types: List[str] = None,
+                    format: str = "json",
+                    compress: bool = False,
+                    export_id: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Stream an export of the logs in ``[start_date, end_date)`` as byte chunks.
+        
+        The generator is blocking and should be consumed off the event loop.
+        When ``export_id`` is given, per-file progress is reported through the
+        job progress tracker under that id.
+        
+        Args:
+            start_date: Start of export range
+            end_date: End of export range (exclusive)
+            log_types: Types of logs to export (None for all)
+            format: Export format ('json', 'csv', 'txt')
+            compress: Whether to gzip the output
+            export_id: Optional progress tracking id
+            
+        Returns:
+            Iterator of export chunks
+        """
+        files_by_type = select_export_files(
+            self.log_manager.get_log_files(), start_date.timestamp(), log_types
+        )
+        
+        progress = None
+        if export_id:
+            progress = self._export_progress_callback(export_id, files_by_type)
+        
+        records = iter_export_records(
+            files_by_type, start_date.timestamp(), end_date.timestamp(), progress
+        )
+        return stream_export(records, format, compress)
+    
+    def _export_progress_callback(self, export_id: str, files_by_type: Dict[str, List[Path]]):
+        """Register an export with the progress tracker and return its progress callback."""
+        file_paths = [str(path) for files in files_by_type.values() for path in files]
+        try:
+            progress_tracker.init_job(export_id, file_paths)
+        except Exception as e:
+            logger.warning(f"Export progress tracking unavailable for {export_id}: {e}")
+            return None
+        
+        def report(file_path: str, status: str, progress: int):
+            try:
+                progress_tracker.update_file_progress(export_id, file_path, status, progress)
+            except Exception as e:
+                logger.debug(f"Failed to report export progress for {export_id}: {e}")
+        
+        return report
+    
+    def get_export_path(self, export_id: str) -> Optional[Path]:
+        """Get the completed export file for an export id, if any."""
+        for path in (self.log_manager.log_directory / "exports").glob(f"logs_export_{export_id}.*"):
+            if not path.name.endswith(".partial"):
+                return path
+        return None
+    
     async def export_logs(self, 
                          start_date: datetime, 
                          end_date: datetime, 
                          log_types: List[str] = None,
-                         format: str = "json") -> str:
+                         format: str = "json",
+                         compress: bool = False,
+                         export_id: Optional[str] = None) -> str:
         """
         Export logs for a date range.
         
         Args:
             start_date: Start of export range
-            end_date: End of export range
+            end_date: End of export range (exclusive)
             log_types: Types of logs to export (None for all)
             format: Export format ('json', 'csv', 'txt')
+            compress: Whether to gzip the output
+            export_id: Export identifier (used for the file name and progress tracking)
             
         Returns:
             Path to exported file
         """
-        export_filename = f"logs_export_{start_date.date()}_{end_date.date()}.{format}"
+        export_id = export_id or uuid.uuid4().hex
+        export_filename = f"logs_export_{export_id}.{export_extension(format, compress)}"
         export_path = self.log_manager.log_directory / "exports" / export_filename
         
         # Ensure export directory exists
         export_path.parent.mkdir(exist_ok=True)
         
-        # Implementation would depend on the format
-        # This is a placeholder for the actual export logic
-        with open(export_path, 'w') as f:
-            f.write(f"# Log export from {start_date} to {end_date}\n")
-            f.write(f"# Generated on {datetime.now().isoformat()}\n")
+        def write_export():
+            # Write to a partial file so the export only becomes visible once complete
+            partial_path = export_path.with_name(f"{export_path.name}.partial")
+            try:
+                with open(partial_path, 'wb') as f:
+                    for chunk in self.iter_export(start_date, end_date, log_types, format, compress, export_id):
+                        f.write(chunk)
+                os.replace(partial_path, export_path)
+            finally:
+                if partial_path.exists():
+                    partial_path.unlink()
+        
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self.log_manager.executor, write_export)
         
         return str(export_path)
 
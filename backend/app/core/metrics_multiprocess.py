@@ -0,0 +1,193 @@
+"""
+Prometheus multiprocess mode support.
+
+When ``PROMETHEUS_MULTIPROC_DIR`` is set, every process (gunicorn workers, Celery
+prefork children) writes its samples to mmap-backed files in that directory and
+the exposition endpoint aggregates them at scrape time. File names carry a
+``<hostname>-<pid>`` identifier so that containers can share the directory.
+
+A container's hostname changes when it is recreated, so files of other hosts
+are removed once they have not been touched for ``STALE_HOST_SECONDS``: each
+container refreshes the modification time of its own files every
+``HEARTBEAT_SECONDS`` (see ``start_metric_files_heartbeat``).
+
+This module must stay free of application imports: it is loaded by the gunicorn
+master process through ``gunicorn.conf.py``.
+"""
+
+import os
+import glob
+import time
+import socket
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 300
+
+# Files of other hosts untouched for this long belong to containers that are gone
+STALE_HOST_SECONDS = 3600
+
+_heartbeat_thread: Optional[threading.Thread] = None
+
+
+def get_multiproc_dir() -> Optional[str]:
+    """Get the shared metrics directory, or None when multiprocess mode is disabled."""
+    return os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.getenv("prometheus_multiproc_dir")
+
+
+def _hostname() -> str:
+    # Underscores separate the type, mode and identifier in metric file names
+    return socket.gethostname().replace("_", "-")
+
+
+def metrics_process_identifier(pid: Optional[int] = None) -> str:
+    """Get the identifier used in the metric file names of a process."""
+    return f"{_hostname()}-{pid or os.getpid()}"
+
+
+def enable_multiprocess_values() -> bool:
+    """
+    Make metrics created from now on write to the shared directory.
+
+    Must run before any metric is instantiated.
+
+    Returns:
+        True if multiprocess mode is enabled
+    """
+    multiproc_dir = get_multiproc_dir()
+    if not multiproc_dir:
+        return False
+
+    from prometheus_client import values
+
+    os.makedirs(multiproc_dir, exist_ok=True)
+    values.ValueClass = values.MultiProcessValue(process_identifier=metrics_process_identifier)
+    return True
+
+
+def mark_process_dead(pid: int) -> None:
+    """Remove the live gauge files of an exited process."""
+    multiproc_dir = get_multiproc_dir()
+    if not multiproc_dir:
+        return
+
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(metrics_process_identifier(pid), multiproc_dir)
+
+
+def remove_stale_metric_files() -> int:
+    """
+    Remove metric files left by processes that are no longer running.
+
+    Called once at startup (gunicorn master, Celery worker main process), before
+    children are forked, so that a restarted container starts from fresh values.
+    Files of other hosts are removed as in ``remove_gone_host_metric_files``.
+
+    Returns:
+        Number of files removed
+    """
+    multiproc_dir = get_multiproc_dir()
+    if not multiproc_dir:
+        return 0
+
+    removed = 0
+    for path in _own_metric_files(multiproc_dir):
+        pid = path[:-3].rsplit("-", 1)[-1]
+        if pid.isdigit() and _pid_alive(int(pid)):
+            continue
+        removed += _remove(path)
+    return removed + remove_gone_host_metric_files()
+
+
+def remove_gone_host_metric_files() -> int:
+    """
+    Remove metric files of other hosts not touched for STALE_HOST_SECONDS.
+
+    They belong to containers that were removed or recreated under a new
+    hostname; live containers touch their files every HEARTBEAT_SECONDS.
+
+    Returns:
+        Number of files removed
+    """
+    multiproc_dir = get_multiproc_dir()
+    if not multiproc_dir:
+        return 0
+
+    own_files = set(_own_metric_files(multiproc_dir))
+    stale_before = time.time() - STALE_HOST_SECONDS
+    removed = 0
+    for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+        if path in own_files:
+            continue
+        try:
+            if os.path.getmtime(path) >= stale_before:
+                continue
+        except OSError:
+            continue
+        removed += _remove(path)
+    return removed
+
+
+def touch_metric_files() -> None:
+    """Refresh the modification time of this host's metric files so other containers keep them."""
+    multiproc_dir = get_multiproc_dir()
+    if not multiproc_dir:
+        return
+
+    for path in _own_metric_files(multiproc_dir):
+        try:
+            os.utime(path)
+        except OSError:
+            # The process exited and its files were removed meanwhile
+            pass
+
+
+def start_metric_files_heartbeat() -> None:
+    """
+    Touch this host's metric files every HEARTBEAT_SECONDS from a daemon thread
+    and remove the files of gone hosts (once per process).
+    """
+    global _heartbeat_thread
+    if not get_multiproc_dir() or (_heartbeat_thread is not None and _heartbeat_thread.is_alive()):
+        return
+
+    def beat():
+        while True:
+            touch_metric_files()
+            removed = remove_gone_host_metric_files()
+            if removed:
+                logger.info(f"Removed {removed} metric files of containers that are gone")
+            time.sleep(HEARTBEAT_SECONDS)
+
+    _heartbeat_thread = threading.Thread(target=beat, name="metrics-heartbeat", daemon=True)
+    _heartbeat_thread.start()
+
+
+def _remove(path: str) -> int:
+    try:
+        os.remove(path)
+        return 1
+    except FileNotFoundError:
+        # Removed by another container meanwhile
+        return 0
+    except OSError as e:
+        logger.warning(f"Failed to remove stale metrics file {path}: {e}")
+        return 0
+
+
+def _own_metric_files(multiproc_dir: str) -> list:
+    return glob.glob(os.path.join(multiproc_dir, f"*_{glob.escape(_hostname())}-*.db"))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
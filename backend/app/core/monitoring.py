@@ -7,15 +7,25 @@ import time
 import json
 import psutil
 import asyncio
+import queue
+import random
+import threading
 from typing import Dict, Any, Optional
 from datetime import datetime, timezone
 from functools import wraps
 from contextlib import asynccontextmanager
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from fastapi import Request, Response
 from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, generate_latest
+from prometheus_client import multiprocess
 import structlog
 
+from app.core.config import settings
+from app.core.metrics_multiprocess import enable_multiprocess_values
+
+# In multiprocess mode values are kept in mmap files shared by all worker processes
+MULTIPROCESS_MODE = enable_multiprocess_values()
+
 # Metrics collectors
 REGISTRY = CollectorRegistry()
 
@@ -38,7 +48,8 @@ REQUEST_DURATION = Histogram(
 ACTIVE_JOBS = Gauge(
     'active_jobs_total',
     'Number of active processing jobs',
-    registry=REGISTRY
+    registry=REGISTRY,
+    multiprocess_mode='livesum'
 )
 
 CELERY_TASK_COUNT = Counter(
@@ -48,30 +59,130 @@ CELERY_TASK_COUNT = Counter(
     registry=REGISTRY
 )
 
+# Task and FAL.AI phases take seconds to many minutes
+LONG_DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, float("inf"))
+
 CELERY_TASK_DURATION = Histogram(
     'celery_task_duration_seconds',
-    'Celery task duration',
-    ['task_name'],
+    'Celery task run time (started to finished)',
+    ['task_name', 'status'],
+    buckets=LONG_DURATION_BUCKETS,
+    registry=REGISTRY
+)
+
+CELERY_TASK_QUEUE_WAIT = Histogram(
+    'celery_task_queue_wait_seconds',
+    'Time between a Celery task being published (or its ETA) and starting',
+    ['task_name', 'queue'],
+    buckets=LONG_DURATION_BUCKETS,
+    registry=REGISTRY
+)
+
+CELERY_TASK_RETRIES = Counter(
+    'celery_task_retries_total',
+    'Celery task retries',
+    ['task_name', 'reason'],
+    registry=REGISTRY
+)
+
+# Queue backlog, published by the queue statistics collector (app.core.queue_stats)
+CELERY_QUEUE_LENGTH = Gauge(
+    'celery_queue_length',
+    'Messages waiting in a Celery queue',
+    ['queue'],
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
+)
+
+CELERY_QUEUE_OLDEST_AGE = Gauge(
+    'celery_queue_oldest_message_age_seconds',
+    'Age of the oldest message waiting in a Celery queue',
+    ['queue'],
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
+)
+
+CELERY_QUEUE_THROUGHPUT = Gauge(
+    'celery_queue_throughput_per_minute',
+    'Tasks of a Celery queue completed per minute (recent window)',
+    ['queue'],
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
+)
+
+CELERY_QUEUE_ESTIMATED_WAIT = Gauge(
+    'celery_queue_estimated_wait_seconds',
+    'Estimated wait of a task enqueued now (queue length / throughput)',
+    ['queue'],
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
+)
+
+CELERY_QUEUE_CONSUMERS = Gauge(
+    'celery_queue_consumer_concurrency',
+    'Worker pool slots consuming a Celery queue',
+    ['queue'],
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
+)
+
+CELERY_RESERVED_TASKS = Gauge(
+    'celery_reserved_tasks',
+    'Tasks delivered to workers and not yet acknowledged',
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
+)
+
+# Worker pool autoscaling, published by the autoscaler (app.core.autoscaler)
+AUTOSCALER_DECISIONS = Counter(
+    'autoscaler_decisions_total',
+    'Worker pool autoscaler decisions',
+    ['action'],
     registry=REGISTRY
 )
 
+AUTOSCALER_TARGET_CONCURRENCY = Gauge(
+    'autoscaler_target_concurrency',
+    'Pool size the autoscaler set for a worker',
+    ['worker'],
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
+)
+
+AUTOSCALER_DEMAND = Gauge(
+    'autoscaler_demand_tasks',
+    'Waiting plus running tasks of the autoscaled queue',
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
+)
+
+AUTOSCALER_RATE_LIMITED_RATIO = Gauge(
+    'autoscaler_fal_rate_limited_ratio',
+    'Share of recent FAL.AI requests that were rate limited',
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
+)
+
 # System metrics
 CPU_USAGE = Gauge(
     'system_cpu_usage_percent',
     'System CPU usage percentage',
-    registry=REGISTRY
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
 )
 
 MEMORY_USAGE = Gauge(
     'system_memory_usage_percent',
     'System memory usage percentage',
-    registry=REGISTRY
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
 )
 
 DISK_USAGE = Gauge(
     'system_disk_usage_percent',
     'System disk usage percentage',
-    registry=REGISTRY
+    registry=REGISTRY,
+    multiprocess_mode='mostrecent'
 )
 
 # FAL.AI API metrics
@@ -86,9 +197,92 @@ FAL_API_DURATION = Histogram(
     'fal_api_request_duration_seconds',
     'FAL.AI API request duration',
     ['operation'],
+    buckets=LONG_DURATION_BUCKETS,
+    registry=REGISTRY
+)
+
+# Phases of a FAL.AI model generation; the only values of the ``phase`` label
+FAL_PHASES = ("upload", "queue_wait", "inference", "result_processing")
+
+FAL_PHASE_DURATION = Histogram(
+    'fal_phase_duration_seconds',
+    'Duration of FAL.AI model generation phases',
+    ['phase', 'status'],
+    buckets=LONG_DURATION_BUCKETS,
+    registry=REGISTRY
+)
+
+FAL_HEDGES = Counter(
+    'fal_hedged_requests_total',
+    'Hedged FAL.AI generations (submitted, skipped over budget, won by the hedge or the original)',
+    ['outcome'],
+    registry=REGISTRY
+)
+
+FILES_DEDUPLICATED = Counter(
+    'files_deduplicated_total',
+    'Files that reused the result of another task instead of calling FAL.AI (same job or coalesced across jobs)',
+    ['scope'],
     registry=REGISTRY
 )
 
+# Job and per-file segments of the job timeline (see app.core.job_timeline)
+JOB_PHASE_DURATION = Histogram(
+    'job_phase_duration_seconds',
+    'Duration of batch job phases, from upload to stored results',
+    ['phase'],
+    buckets=LONG_DURATION_BUCKETS,
+    registry=REGISTRY
+)
+
+# Endpoint label for requests that matched no route (404s, scanners)
+UNMATCHED_ENDPOINT = "<unmatched>"
+
+# Endpoint label once the cardinality cap is reached
+OTHER_ENDPOINT = "<other>"
+
+
+class EndpointLabelGuard:
+    """
+    Bound the number of distinct endpoint label values on request metrics.
+    
+    Route templates are admitted until ``max_endpoints`` distinct values have
+    been seen; later values are reported as OTHER_ENDPOINT.
+    """
+    
+    def __init__(self, max_endpoints: int):
+        self.max_endpoints = max_endpoints
+        self._seen = set()
+        self._lock = threading.Lock()
+    
+    def label(self, endpoint: str) -> str:
+        """Get the label value to use for an endpoint."""
+        if endpoint in self._seen:
+            return endpoint
+        with self._lock:
+            if len(self._seen) < self.max_endpoints:
+                self._seen.add(endpoint)
+                return endpoint
+        return OTHER_ENDPOINT
+
+
+endpoint_label_guard = EndpointLabelGuard(settings.METRICS_MAX_ENDPOINTS)
+
+
+def get_route_template(request: Request) -> str:
+    """
+    Get the matched route template of a request (e.g. ``/api/v1/status/tasks/{task_id}/stream``).
+    
+    The router stores the matched route in the request scope, so this is only
+    meaningful once the request has been handled.
+    """
+    route = request.scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format:
+        return path_format
+    return UNMATCHED_ENDPOINT
+
+
 @dataclass
 class RequestMetrics:
     """Metrics data for HTTP requests."""
@@ -96,6 +290,7 @@ class RequestMetrics:
     path: str
     status_code: int
     duration_ms: float
+    endpoint: Optional[str] = None
     user_agent: Optional[str] = None
     ip_address: Optional[str] = None
     content_length: Optional[int] = None
@@ -126,30 +321,22 @@ class StructuredLogger:
     def __init__(self, name: str):
         self.logger = structlog.get_logger(name)
     
-    def log_request(self, metrics: RequestMetrics):
+    def log_request(self, metrics: RequestMetrics, record_metrics: bool = True):
         """Log HTTP request with structured data."""
+        # Shallow copy of the fields; dataclasses.asdict deep-copies every value
         self.logger.info(
             "HTTP request processed",
-            **asdict(metrics)
+            **vars(metrics)
         )
         
-        # Update Prometheus metrics
-        REQUEST_COUNT.labels(
-            method=metrics.method,
-            endpoint=metrics.path,
-            status_code=metrics.status_code
-        ).inc()
-        
-        REQUEST_DURATION.labels(
-            method=metrics.method,
-            endpoint=metrics.path
-        ).observe(metrics.duration_ms / 1000.0)
+        if record_metrics:
+            record_request_metrics(metrics.method, metrics.endpoint, metrics.status_code, metrics.duration_ms)
     
     def log_task(self, metrics: TaskMetrics):
         """Log Celery task with structured data."""
         self.logger.info(
             "Celery task processed",
-            **asdict(metrics)
+            **vars(metrics)
         )
         
         # Update Prometheus metrics
@@ -160,7 +347,8 @@ class StructuredLogger:
         
         if metrics.duration_ms:
             CELERY_TASK_DURATION.labels(
-                task_name=metrics.task_name
+                task_name=metrics.task_name,
+                status=metrics.status
             ).observe(metrics.duration_ms / 1000.0)
     
     def log_fal_api_call(self, operation: str, status: str, duration_ms: float, **kwargs):
@@ -201,23 +389,151 @@ class StructuredLogger:
             exc_info=True
         )
 
+def record_request_metrics(method: str, endpoint: Optional[str], status_code: int, duration_ms: float):
+    """Update the Prometheus request metrics (labelled by route template, never the raw path)."""
+    endpoint = endpoint_label_guard.label(endpoint or UNMATCHED_ENDPOINT)
+    REQUEST_COUNT.labels(
+        method=method,
+        endpoint=endpoint,
+        status_code=status_code
+    ).inc()
+    
+    REQUEST_DURATION.labels(
+        method=method,
+        endpoint=endpoint
+    ).observe(duration_ms / 1000.0)
+
+
+def parse_route_sample_rates(value: str) -> Dict[str, float]:
+    """Parse comma-separated ``route_prefix=rate`` pairs."""
+    rates = {}
+    for pair in value.split(","):
+        prefix, separator, rate = pair.strip().rpartition("=")
+        if not separator or not prefix:
+            continue
+        try:
+            rates[prefix.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            logging.getLogger(__name__).warning(f"Ignoring invalid request log sample rate: {pair}")
+    return rates
+
+
+class RequestLogSampler:
+    """
+    Decide which requests get a structured log line.
+    
+    Server errors and slow requests are always logged; other requests are
+    sampled with the rate of the longest matching route prefix.
+    """
+    
+    def __init__(self, default_rate: float, route_rates: Dict[str, float], slow_ms: float):
+        self.default_rate = default_rate
+        self.route_rates = sorted(route_rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self.slow_ms = slow_ms
+        self._rate_cache: Dict[str, float] = {}
+    
+    def rate_for(self, endpoint: str) -> float:
+        """Get the sample rate of a route template."""
+        rate = self._rate_cache.get(endpoint)
+        if rate is None:
+            rate = next(
+                (route_rate for prefix, route_rate in self.route_rates if endpoint.startswith(prefix)),
+                self.default_rate
+            )
+            # Endpoint labels are bounded, so the cache is too
+            if len(self._rate_cache) < settings.METRICS_MAX_ENDPOINTS:
+                self._rate_cache[endpoint] = rate
+        return rate
+    
+    def should_log(self, endpoint: str, status_code: int, duration_ms: float) -> bool:
+        """Check whether a request should be logged."""
+        if status_code >= 500 or duration_ms >= self.slow_ms:
+            return True
+        rate = self.rate_for(endpoint)
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+class RequestLogQueue:
+    """
+    Hand request log records to a background thread.
+    
+    The event loop only enqueues a tuple; building the structured record,
+    structlog processing and handler I/O happen on the writer thread. Records
+    are dropped (and counted) when the queue is full rather than blocking, and
+    when they fail to be formatted or written.
+    """
+    
+    def __init__(self, logger: StructuredLogger, maxsize: int = 10000):
+        self.logger = logger
+        self.dropped = 0
+        self._failure_logged = False
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    def submit(self, record: tuple) -> bool:
+        """Enqueue a record of RequestMetrics fields plus the request end time."""
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+    
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-log-writer", daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            *fields, end_time = record
+            try:
+                metrics = RequestMetrics(*fields, timestamp=datetime.fromtimestamp(end_time, timezone.utc).isoformat())
+                self.logger.log_request(metrics, record_metrics=False)
+            except Exception:
+                # Never let a bad record stop the writer; count it and report the first failure
+                self.dropped += 1
+                if not self._failure_logged:
+                    self._failure_logged = True
+                    logging.getLogger(__name__).warning("Failed to write a request log record", exc_info=True)
+    
+    def stop(self, timeout: float = 2.0):
+        """Flush pending records and stop the writer thread."""
+        thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        self._thread = None
+        if self.dropped:
+            self.logger.logger.warning("Request log records dropped", dropped=self.dropped)
+
+
 class MonitoringMiddleware:
     """FastAPI middleware for comprehensive request monitoring."""
     
     def __init__(self):
         self.logger = StructuredLogger("app.middleware.monitoring")
+        self.sampler = RequestLogSampler(
+            settings.REQUEST_LOG_SAMPLE_RATE,
+            parse_route_sample_rates(settings.REQUEST_LOG_ROUTE_SAMPLE_RATES),
+            settings.REQUEST_LOG_SLOW_MS
+        )
+        self.log_queue = RequestLogQueue(self.logger) if settings.REQUEST_LOG_ASYNC else None
     
     async def __call__(self, request: Request, call_next):
         """Process request with monitoring."""
-        start_time = time.time()
-        
-        # Extract request information
-        method = request.method
-        path = request.url.path
-        user_agent = request.headers.get("user-agent")
-        client_ip = request.client.host if request.client else None
-        content_length = request.headers.get("content-length")
-        
+        start_time = time.perf_counter()
         status_code = 500  # Default for exceptions
         
         try:
@@ -227,30 +543,45 @@ class MonitoringMiddleware:
         except Exception as e:
             # Log the error and return 500
             self.logger.log_error(e, {
-                "request_method": method,
-                "request_path": path,
-                "client_ip": client_ip
+                "request_method": request.method,
+                "request_path": request.url.path,
+                "client_ip": request.client.host if request.client else None
             })
             raise
         finally:
             # Calculate duration
-            duration_ms = (time.time() - start_time) * 1000
-            
-            # Create metrics
-            metrics = RequestMetrics(
-                method=method,
-                path=path,
-                status_code=status_code,
-                duration_ms=duration_ms,
-                user_agent=user_agent,
-                ip_address=client_ip,
-                content_length=int(content_length) if content_length else None
-            )
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            endpoint = get_route_template(request)
+            record_request_metrics(request.method, endpoint, status_code, duration_ms)
             
-            # Log request
-            self.logger.log_request(metrics)
+            if self.sampler.should_log(endpoint, status_code, duration_ms):
+                self._log_request(request, endpoint, status_code, duration_ms)
         
         return response
+    
+    def _log_request(self, request: Request, endpoint: str, status_code: int, duration_ms: float):
+        """Log a sampled request, on the writer thread when async logging is enabled."""
+        content_length = request.headers.get("content-length")
+        fields = (
+            request.method,
+            request.url.path,
+            status_code,
+            duration_ms,
+            endpoint,
+            request.headers.get("user-agent"),
+            request.client.host if request.client else None,
+            int(content_length) if content_length and content_length.isdigit() else None
+        )
+        
+        if self.log_queue is not None:
+            self.log_queue.submit(fields + (time.time(),))
+        else:
+            self.logger.log_request(RequestMetrics(*fields), record_metrics=False)
+    
+    def close(self):
+        """Flush and stop the background request log writer."""
+        if self.log_queue is not None:
+            self.log_queue.stop()
 
 class SystemMonitor:
     """System resource monitoring."""
@@ -298,6 +629,55 @@ class TaskMonitor:
     
     def __init__(self):
         self.logger = StructuredLogger("app.monitoring.tasks")
+        # Start times of tasks running in this process, by task id
+        self._started: Dict[str, float] = {}
+    
+    # Signal-driven instrumentation (connected in app.core.celery_app)
+    
+    @staticmethod
+    def stamp_published(headers: Dict[str, Any]):
+        """Record the publish time in the message headers (before_task_publish)."""
+        if headers is None:
+            return
+        sent_at = time.time()
+        eta = headers.get('eta')
+        if eta:
+            # Delayed tasks (countdown/ETA, retries) only start waiting at their ETA
+            try:
+                sent_at = max(sent_at, datetime.fromisoformat(str(eta)).timestamp())
+            except ValueError:
+                pass
+        headers['sent_at'] = sent_at
+    
+    def on_task_started(self, task_name: str, task_id: str, sent_at: Optional[float] = None,
+                        queue: Optional[str] = None):
+        """Record queue wait and mark a task as running (task_prerun)."""
+        now = time.time()
+        self._started[task_id] = now
+        ACTIVE_JOBS.inc()
+        
+        if sent_at:
+            try:
+                wait_seconds = max(0.0, now - float(sent_at))
+            except (TypeError, ValueError):
+                return
+            CELERY_TASK_QUEUE_WAIT.labels(task_name=task_name, queue=queue or "unknown").observe(wait_seconds)
+    
+    def on_task_finished(self, task_name: str, task_id: str, state: Optional[str]):
+        """Record run time and outcome of a task (task_postrun)."""
+        started = self._started.pop(task_id, None)
+        if started is None:
+            return
+        ACTIVE_JOBS.dec()
+        
+        status = (state or "unknown").lower()
+        CELERY_TASK_COUNT.labels(task_name=task_name, status=status).inc()
+        CELERY_TASK_DURATION.labels(task_name=task_name, status=status).observe(time.time() - started)
+    
+    def on_task_retry(self, task_name: str, reason: Any):
+        """Count a task retry by exception type (task_retry)."""
+        reason_label = type(reason).__name__ if isinstance(reason, BaseException) else "retry"
+        CELERY_TASK_RETRIES.labels(task_name=task_name, reason=reason_label).inc()
     
     def task_started(self, task_name: str, task_id: str, correlation_id: str = None):
         """Log task start."""
@@ -392,8 +772,35 @@ async def monitor_fal_api_call(operation: str):
         logger.log_error(e, {"operation": operation})
         raise
 
+def record_fal_phase(phase: str, duration_seconds: float, status: str = "success"):
+    """Record the duration of a FAL.AI phase (one of FAL_PHASES)."""
+    if phase not in FAL_PHASES:
+        raise ValueError(f"Unknown FAL.AI phase: {phase}")
+    FAL_PHASE_DURATION.labels(phase=phase, status=status).observe(max(0.0, duration_seconds))
+
+
+def record_fal_request(operation: str, status: str, duration_seconds: Optional[float] = None):
+    """Count a FAL.AI API request (status: success, error or rate_limited)."""
+    FAL_API_REQUESTS.labels(operation=operation, status=status).inc()
+    if duration_seconds is not None:
+        FAL_API_DURATION.labels(operation=operation).observe(duration_seconds)
+
+
+def record_job_timeline(timeline: Dict[str, Any]):
+    """Observe the segment durations of a finished job timeline (see JobTimeline.get_timeline)."""
+    for phase, duration in timeline.get("durations", {}).items():
+        JOB_PHASE_DURATION.labels(phase=phase).observe(duration)
+    for file_timeline in timeline.get("files", []):
+        for phase, duration in file_timeline.get("durations", {}).items():
+            JOB_PHASE_DURATION.labels(phase=phase).observe(duration)
+
+
 def get_metrics_data() -> str:
-    """Get Prometheus metrics data."""
+    """Get Prometheus metrics data (aggregated over all processes in multiprocess mode)."""
+    if MULTIPROCESS_MODE:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
     return generate_latest(REGISTRY)
 
 # Global monitors
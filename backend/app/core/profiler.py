@@ -0,0 +1,434 @@
+"""
+Opt-in statistical CPU profiler for API and worker processes.
+
+``SamplingProfiler`` runs a daemon thread that periodically snapshots the stacks
+of all other threads with ``sys._current_frames()`` and counts identical
+stacks. Threads parked in known blocking calls (selectors, locks, queues) are
+dropped, so the counts approximate where CPU goes. Sampling only reads frame
+objects; the overhead is proportional to the sampling rate, not to the work
+being profiled.
+
+Profiles are written as collapsed stacks (flamegraph.pl / speedscope input) or
+speedscope JSON under ``PROFILES_DIR``:
+
+- API processes profile themselves on demand (admin endpoint).
+- Worker children watch a Redis request key published by the
+  ``start_worker_profile`` control task and profile themselves for the
+  requested window.
+- Optionally, every process samples continuously at a low rate and flushes a
+  collapsed profile periodically; continuous profiles older than
+  ``PROFILER_CONTINUOUS_RETENTION_HOURS`` are deleted on flush.
+"""
+
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics_multiprocess import metrics_process_identifier
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FORMATS = ("collapsed", "speedscope")
+
+# Redis key holding the current worker profiling request
+PROFILE_REQUEST_KEY = "profiler:request"
+
+CONTINUOUS_PREFIX = "continuous-"
+
+# Leaf functions of threads that are waiting rather than running
+_IDLE_FUNCTIONS = {
+    ("selectors.py", "select"),
+    ("selectors.py", "poll"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+    ("socket.py", "readinto"),
+    ("ssl.py", "read"),
+    ("connection.py", "_recv"),
+}
+
+# Threads of the profiler itself, never sampled
+_PROFILER_THREADS = {"sampling-profiler", "profile-request-watcher", "continuous-profiler"}
+
+Stack = Tuple[str, ...]
+
+
+def profile_extension(format: str) -> str:
+    """Get the file extension of a profile format."""
+    return "speedscope.json" if format == "speedscope" else "txt"
+
+
+class SamplingProfiler:
+    """Statistical profiler sampling the stacks of all threads of this process."""
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False,
+                 ignore_threads: Tuple[int, ...] = ()):
+        """
+        Args:
+            interval: Seconds between samples
+            include_idle: Keep samples of threads parked in blocking calls
+            ignore_threads: Idents of threads not to sample (e.g. the thread waiting for the profile)
+        """
+        self.interval = interval
+        self.include_idle = include_idle
+        self.ignore_threads = set(ignore_threads)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self._labels: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "SamplingProfiler":
+        """Start sampling on a daemon thread."""
+        if self.running:
+            return self
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop sampling; collected stacks are kept."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            try:
+                self._sample(own_id)
+            except Exception as e:  # never let the sampler take the process down
+                logger.debug(f"Profiler sample failed: {e}")
+
+    def _label(self, code) -> str:
+        """Get the cached frame label of a code object."""
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            for prefix in sorted(map(os.path.abspath, sys.path + [os.getcwd()]), key=len, reverse=True):
+                if filename.startswith(prefix + os.sep):
+                    filename = filename[len(prefix) + 1:]
+                    break
+            label = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _sample(self, own_id: int) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        collected: List[Stack] = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or thread_id in self.ignore_threads or names.get(thread_id) in _PROFILER_THREADS:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_FUNCTIONS:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            collected.append(tuple(reversed(stack)))
+
+        with self._lock:
+            self.samples += 1
+            self.stacks.update(collected)
+
+    def drain(self) -> Tuple[Counter, float]:
+        """
+        Take the collected stacks and reset them.
+
+        Returns:
+            Tuple of (stack counts, seconds covered)
+        """
+        with self._lock:
+            stacks, self.stacks = self.stacks, Counter()
+            self.samples = 0
+        now = time.time()
+        duration = now - (self.started_at or now)
+        self.started_at = now
+        return stacks, duration
+
+
+def render_profile(stacks: Counter, format: str, name: str, interval: float, duration: float) -> str:
+    """
+    Render stack counts.
+
+    Args:
+        stacks: Counts of root-first stacks
+        format: 'collapsed' ("frame;frame;frame count" lines) or 'speedscope' (JSON)
+        name: Profile name shown by speedscope
+        interval: Sampling interval, used to weight speedscope samples in seconds
+        duration: Seconds covered by the profile
+
+    Returns:
+        Profile text
+    """
+    if format not in PROFILE_FORMATS:
+        raise ValueError(f"Unsupported profile format: {format}")
+
+    ordered = stacks.most_common()
+    if format == "collapsed":
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in ordered)
+
+    frame_index: Dict[str, int] = {}
+    samples, weights = [], []
+    for stack, count in ordered:
+        samples.append([frame_index.setdefault(frame, len(frame_index)) for frame in stack])
+        weights.append(round(count * interval, 6))
+    return json.dumps({
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": [{"name": frame} for frame in frame_index]},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": round(duration, 3),
+            "samples": samples,
+            "weights": weights
+        }],
+        "name": name,
+        "exporter": "image2model"
+    })
+
+
+def top_functions(stacks: Counter, limit: int = 20) -> List[Dict[str, Any]]:
+    """Get the functions with the most samples on top of the stack (self time)."""
+    leaves: Counter = Counter()
+    for stack, count in stacks.items():
+        leaves[stack[-1]] += count
+    total = sum(leaves.values()) or 1
+    return [
+        {"function": function, "samples": count, "percent": round(count * 100 / total, 2)}
+        for function, count in leaves.most_common(limit)
+    ]
+
+
+def write_profile(stacks: Counter, profile_id: str, role: str, format: str,
+                  interval: float, duration: float) -> str:
+    """
+    Write a profile to ``PROFILES_DIR/<profile_id>/<role>-<host>-<pid>.<ext>``.
+
+    Returns:
+        Path of the written file
+    """
+    directory = os.path.join(settings.PROFILES_DIR, profile_id)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{role}-{metrics_process_identifier()}"
+    path = os.path.join(directory, f"{name}.{profile_extension(format)}")
+    tmp_path = f"{path}.partial"
+    with open(tmp_path, "w") as f:
+        f.write(render_profile(stacks, format, name, interval, duration))
+    os.replace(tmp_path, path)
+    return path
+
+
+def new_profile_id() -> str:
+    """Get a sortable, unique profile id."""
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.urandom(3).hex()}"
+
+
+def profile_process(seconds: float, interval: float, format: str, profile_id: str, role: str) -> Dict[str, Any]:
+    """
+    Profile the current process for ``seconds`` (blocking) and write the result.
+
+    Returns:
+        Dict with the written file, sample count and top functions
+    """
+    profiler = SamplingProfiler(interval=interval, ignore_threads=(threading.get_ident(),)).start()
+    try:
+        time.sleep(seconds)
+    finally:
+        profiler.stop()
+    stacks, duration = profiler.drain()
+    return profile_summary(stacks, profile_id, role, format, interval, duration)
+
+
+def profile_summary(stacks: Counter, profile_id: str, role: str, format: str,
+                    interval: float, duration: float) -> Dict[str, Any]:
+    """Write a profile and summarize it (file, sample count, top functions)."""
+    path = write_profile(stacks, profile_id, role, format, interval, duration)
+    logger.info(f"Wrote {format} profile {path} ({sum(stacks.values())} stack samples)")
+    return {
+        "profile_id": profile_id,
+        "file": os.path.basename(path),
+        "process": metrics_process_identifier(),
+        "duration_seconds": round(duration, 3),
+        "stack_samples": sum(stacks.values()),
+        "top_functions": top_functions(stacks)
+    }
+
+
+def _redis_client():
+    import redis
+    return redis.from_url(settings.CELERY_RESULT_BACKEND, decode_responses=True)
+
+
+def publish_profile_request(profile_id: str, seconds: float, interval: float, format: str) -> Dict[str, Any]:
+    """
+    Ask every worker process to profile itself for the next ``seconds``.
+
+    The request expires with the window, so late or restarted processes ignore it.
+    """
+    request = {
+        "profile_id": profile_id,
+        "until": time.time() + seconds,
+        "interval": interval,
+        "format": format
+    }
+    _redis_client().set(PROFILE_REQUEST_KEY, json.dumps(request), ex=max(1, int(seconds)))
+    return request
+
+
+class ProfileRequestWatcher:
+    """Daemon thread that runs the profiling windows requested through Redis."""
+
+    def __init__(self, role: str, poll_seconds: float = 2.0):
+        self.role = role
+        self.poll_seconds = poll_seconds
+        self._seen: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="profile-request-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        client = _redis_client()
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                data = client.get(PROFILE_REQUEST_KEY)
+                if not data:
+                    continue
+                request = json.loads(data)
+                remaining = request["until"] - time.time()
+                if request["profile_id"] == self._seen or remaining <= 0:
+                    continue
+                self._seen = request["profile_id"]
+                profile_process(remaining, request["interval"], request["format"],
+                                request["profile_id"], self.role)
+            except Exception as e:
+                logger.warning(f"Worker profiling request failed: {e}")
+
+
+class ContinuousProfiler:
+    """Low-rate profiler that flushes a collapsed profile every ``flush_seconds``."""
+
+    def __init__(self, role: str, interval: float, flush_seconds: float):
+        self.role = role
+        self.flush_seconds = flush_seconds
+        self.profiler = SamplingProfiler(interval=interval)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self.profiler.start()
+            self._thread = threading.Thread(target=self._run, name="continuous-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and flush what was collected since the last flush."""
+        self._stop.set()
+        self.profiler.stop()
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+    def flush(self) -> None:
+        stacks, duration = self.profiler.drain()
+        if not stacks:
+            return
+        try:
+            write_profile(stacks, f"{CONTINUOUS_PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S')}", self.role,
+                          "collapsed", self.profiler.interval, duration)
+        except OSError as e:
+            logger.warning(f"Failed to write continuous profile: {e}")
+        prune_continuous_profiles(settings.PROFILER_CONTINUOUS_RETENTION_HOURS * 3600)
+
+
+def prune_continuous_profiles(max_age_seconds: float) -> int:
+    """
+    Delete continuous profile directories not written to for ``max_age_seconds``.
+
+    Every process prunes on flush, so a directory may already be gone.
+
+    Returns:
+        Number of directories deleted
+    """
+    try:
+        names = [name for name in os.listdir(settings.PROFILES_DIR) if name.startswith(CONTINUOUS_PREFIX)]
+    except OSError:
+        return 0
+    cutoff = time.time() - max_age_seconds
+    deleted = 0
+    for name in names:
+        path = os.path.join(settings.PROFILES_DIR, name)
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        deleted += 1
+    return deleted
+
+
+_continuous: Optional[ContinuousProfiler] = None
+_watcher: Optional[ProfileRequestWatcher] = None
+
+
+def start_process_profiling(role: str, watch_requests: bool = False) -> None:
+    """
+    Start the background profiling configured for this process (no-op unless PROFILER_ENABLED).
+
+    Args:
+        role: 'api' or 'worker', used in profile file names
+        watch_requests: Follow worker profiling requests published through Redis
+    """
+    global _continuous, _watcher
+    if not settings.PROFILER_ENABLED:
+        return
+    if settings.PROFILER_CONTINUOUS_INTERVAL_MS > 0 and _continuous is None:
+        _continuous = ContinuousProfiler(role, settings.PROFILER_CONTINUOUS_INTERVAL_MS / 1000,
+                                         settings.PROFILER_FLUSH_SECONDS)
+        _continuous.start()
+    if watch_requests and _watcher is None:
+        _watcher = ProfileRequestWatcher(role)
+        _watcher.start()
+
+
+def stop_process_profiling() -> None:
+    """Stop background profiling, flushing the continuous profile."""
+    global _continuous, _watcher
+    if _continuous is not None:
+        _continuous.stop()
+        _continuous = None
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
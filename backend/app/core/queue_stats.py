@@ -0,0 +1,238 @@
+"""
+Celery queue backlog statistics.
+
+Workers count completed tasks per queue in per-minute Redis buckets. The API
+runs ``QueueStatsCollector`` in the background: one process per interval
+(elected through a Redis key) reads, for every routed queue, the broker list
+length, the age of the oldest message (from the ``sent_at`` header stamped at
+publish time), recent throughput and the consuming worker capacity. It then
+derives an estimated wait, publishes Prometheus gauges and stores a snapshot in
+Redis for the admin endpoint and admission decisions.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from typing import Dict, Any, Optional
+
+import redis
+from app.core.config import settings
+from app.core.monitoring import (
+    MULTIPROCESS_MODE,
+    CELERY_QUEUE_LENGTH,
+    CELERY_QUEUE_OLDEST_AGE,
+    CELERY_QUEUE_THROUGHPUT,
+    CELERY_QUEUE_ESTIMATED_WAIT,
+    CELERY_QUEUE_CONSUMERS,
+    CELERY_RESERVED_TASKS
+)
+from app.core.scheduling import PRIORITY_STEPS, priority_queue_names
+from app.core.worker_health import (
+    get_async_clients,
+    get_live_workers,
+    get_queue_depths,
+    get_worker_queues,
+    summarize_capacity
+)
+
+logger = logging.getLogger(__name__)
+
+THROUGHPUT_KEY_PREFIX = "queue_throughput:"
+SNAPSHOT_KEY = "queue_stats:snapshot"
+LEADER_KEY = "queue_stats:leader"
+
+# Hash of delivered but unacknowledged messages kept by the kombu Redis transport
+UNACKED_KEY = "unacked"
+
+_completion_client = None
+
+
+def _throughput_key(queue: str, minute: int) -> str:
+    return f"{THROUGHPUT_KEY_PREFIX}{queue}:{minute}"
+
+
+def record_task_completion(queue: Optional[str]) -> None:
+    """Count a finished task of ``queue`` in the current minute's bucket (worker side)."""
+    global _completion_client
+    if not queue:
+        return
+    try:
+        if _completion_client is None:
+            _completion_client = redis.from_url(settings.CELERY_RESULT_BACKEND, decode_responses=True)
+        key = _throughput_key(queue, int(time.time() // 60))
+        pipe = _completion_client.pipeline(transaction=False)
+        pipe.incr(key)
+        pipe.expire(key, (settings.QUEUE_THROUGHPUT_WINDOW_MINUTES + 1) * 60)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Failed to record task completion for queue {queue}: {e}")
+
+
+def _message_sent_at(raw: Optional[str]) -> Optional[float]:
+    """Get the publish time of a raw kombu Redis message, if it carries one."""
+    if not raw:
+        return None
+    try:
+        sent_at = json.loads(raw).get("headers", {}).get("sent_at")
+        return float(sent_at) if sent_at is not None else None
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def estimate_wait_seconds(depth: int, throughput_per_minute: float) -> Optional[float]:
+    """
+    Estimate how long a message enqueued now waits before it starts.
+
+    Returns:
+        Seconds, 0 for an empty queue, or None when nothing completed recently
+    """
+    if depth <= 0:
+        return 0.0
+    if throughput_per_minute <= 0:
+        return None
+    return round(depth / throughput_per_minute * 60, 1)
+
+
+class QueueStatsCollector:
+    """Periodic collector of queue backlog statistics."""
+
+    def __init__(self, interval_seconds: Optional[float] = None):
+        self.interval_seconds = interval_seconds or settings.QUEUE_STATS_INTERVAL_SECONDS
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_read_at = 0.0
+
+    async def _get_throughput(self, client, queues) -> Dict[str, float]:
+        """Get completed tasks per minute of each queue over the throughput window."""
+        window = settings.QUEUE_THROUGHPUT_WINDOW_MINUTES
+        now = time.time()
+        current = int(now // 60)
+        minutes = list(range(current - window + 1, current + 1))
+        keys = [_throughput_key(queue, minute) for queue in queues for minute in minutes]
+        counts = await client.mget(keys)
+
+        # The current minute is only partially elapsed
+        elapsed_minutes = (window - 1) + (now % 60) / 60
+        throughput = {}
+        for index, queue in enumerate(queues):
+            completed = sum(int(count or 0) for count in counts[index * window:(index + 1) * window])
+            throughput[queue] = round(completed / elapsed_minutes, 2)
+        return throughput
+
+    async def collect(self) -> Dict[str, Any]:
+        """
+        Read the current backlog of every routed queue.
+
+        Returns:
+            Dict with per-queue depth, oldest message age, throughput, estimated
+            wait and consuming capacity, plus the reserved (unacked) task count
+        """
+        from app.core.celery_app import celery_app
+
+        broker, backend = get_async_clients()
+        queues = get_worker_queues(celery_app)
+
+        # Kombu LPUSHes and workers BRPOP, so the oldest message of each priority lane is its last element
+        lanes = len(PRIORITY_STEPS)
+        async with broker.pipeline(transaction=False) as pipe:
+            for queue in queues:
+                for name in priority_queue_names(queue):
+                    pipe.lindex(name, -1)
+            pipe.hlen(UNACKED_KEY)
+            *tails, reserved = await pipe.execute()
+
+        depths, workers, throughput = await asyncio.gather(
+            get_queue_depths(broker, queues),
+            get_live_workers(backend),
+            self._get_throughput(backend, queues)
+        )
+        capacity = summarize_capacity(workers, depths)
+
+        now = time.time()
+        stats = {}
+        for index, queue in enumerate(queues):
+            sent_times = [_message_sent_at(raw) for raw in tails[index * lanes:(index + 1) * lanes] if raw]
+            sent_at = min(sent_times) if sent_times and all(sent_times) else None
+            if sent_at:
+                oldest_age = round(max(0.0, now - sent_at), 1)
+            else:
+                # Messages published without the header have an unknown age
+                oldest_age = None if depths[queue] else 0.0
+            stats[queue] = {
+                **capacity[queue],
+                "oldest_age_seconds": oldest_age,
+                "throughput_per_minute": throughput[queue],
+                "estimated_wait_seconds": estimate_wait_seconds(depths[queue], throughput[queue])
+            }
+
+        return {
+            "queues": stats,
+            "reserved_tasks": reserved,
+            "live_workers": len(workers),
+            "timestamp": now
+        }
+
+    def publish_metrics(self, snapshot: Dict[str, Any]) -> None:
+        """Set the queue gauges from a snapshot."""
+        for queue, stats in snapshot["queues"].items():
+            CELERY_QUEUE_LENGTH.labels(queue=queue).set(stats["depth"])
+            CELERY_QUEUE_OLDEST_AGE.labels(queue=queue).set(_gauge_value(stats["oldest_age_seconds"]))
+            CELERY_QUEUE_THROUGHPUT.labels(queue=queue).set(stats["throughput_per_minute"])
+            CELERY_QUEUE_ESTIMATED_WAIT.labels(queue=queue).set(_gauge_value(stats["estimated_wait_seconds"]))
+            CELERY_QUEUE_CONSUMERS.labels(queue=queue).set(stats["concurrency"])
+        CELERY_RESERVED_TASKS.set(snapshot["reserved_tasks"])
+
+    async def _is_leader(self, client) -> bool:
+        """Elect one collecting process per interval; every process collects without multiprocess metrics."""
+        if not MULTIPROCESS_MODE:
+            return True
+        return bool(await client.set(LEADER_KEY, os.getpid(), nx=True, ex=max(1, int(self.interval_seconds))))
+
+    async def refresh(self) -> Optional[Dict[str, Any]]:
+        """Collect and publish a snapshot if this process is the collector for this interval."""
+        _, backend = get_async_clients()
+        if not await self._is_leader(backend):
+            return None
+
+        snapshot = await self.collect()
+        self.publish_metrics(snapshot)
+        await backend.set(SNAPSHOT_KEY, json.dumps(snapshot), ex=max(1, int(self.interval_seconds * 3)))
+        self._snapshot, self._snapshot_read_at = snapshot, time.monotonic()
+        return snapshot
+
+    async def get_snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the latest snapshot (cached locally for one interval).
+
+        Returns:
+            The snapshot dict, or None if none was collected recently
+        """
+        if self._snapshot is not None and time.monotonic() - self._snapshot_read_at < self.interval_seconds:
+            return self._snapshot
+
+        _, backend = get_async_clients()
+        data = await backend.get(SNAPSHOT_KEY)
+        if data:
+            self._snapshot, self._snapshot_read_at = json.loads(data), time.monotonic()
+            return self._snapshot
+        return None
+
+    async def start_background_collection(self):
+        """Collect queue statistics every interval."""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Queue statistics collection failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+def _gauge_value(value: Optional[float]) -> float:
+    # Unknown values are exported as NaN rather than a misleading number
+    return math.nan if value is None else value
+
+
+# Global queue statistics collector instance
+queue_stats_collector = QueueStatsCollector()
@@ -0,0 +1,54 @@
+"""
+Fair scheduling of model generation tasks across jobs.
+
+Every queue is split by the Redis transport into priority lanes (one Redis list
+per priority step) and workers always pop the highest lane first. Each file of
+a batch is published to a lane from its rank within its own job: the first
+``FAIR_LANE_FILES`` files go to lane 0, the next ones to lane 1 and so on. A
+single image uploaded while a 25-file batch is in flight lands in lane 0, ahead
+of the batch's tail, and files of concurrent jobs are taken in round-robin
+order of their rank instead of strictly first-in first-out.
+
+The rank ignores other jobs of the same API key unless ``FAIR_KEY_LANE_FILES``
+is set: deployments sharing one API key between all callers would otherwise
+push every upload behind the batches of unrelated callers. With distinct keys
+per tenant, it moves the larger jobs of a busy key down one lane per
+``FAIR_KEY_LANE_FILES`` files the key has in flight. Jobs of at most
+``FAIR_LANE_FILES`` files always stay in lane 0.
+"""
+
+from typing import List, Optional
+
+from app.core.config import settings
+
+# Priority lanes of the Redis transport; 0 is served first
+PRIORITY_STEPS = list(range(10))
+
+# Separator between a queue name and its priority lane in Redis list names
+PRIORITY_SEP = ":"
+
+
+def priority_queue_names(queue: str) -> List[str]:
+    """Get the Redis list names of all priority lanes of a queue, highest lane first."""
+    return [queue] + [f"{queue}{PRIORITY_SEP}{step}" for step in PRIORITY_STEPS[1:]]
+
+
+def file_priority(file_index: int, total_files: int = 1, inflight_files: int = 0) -> Optional[int]:
+    """
+    Get the priority lane of a file of a batch.
+
+    Args:
+        file_index: Index of the file in its batch
+        total_files: Number of files in the batch
+        inflight_files: Files of the same API key already in flight when the job was admitted
+
+    Returns:
+        Priority step (0 is served first), or None when fair scheduling is disabled
+    """
+    if not settings.FAIR_SCHEDULING_ENABLED:
+        return None
+    lane_files = max(1, settings.FAIR_LANE_FILES)
+    lane = file_index // lane_files
+    if settings.FAIR_KEY_LANE_FILES > 0 and total_files > lane_files:
+        lane += inflight_files // settings.FAIR_KEY_LANE_FILES
+    return min(PRIORITY_STEPS[-1], lane)
@@ -0,0 +1,83 @@
+"""
+Serializer of Celery messages and results.
+
+JSON stays the default. With ``CELERY_SERIALIZER=msgpack`` task messages and
+results are encoded with msgpack. If ``CELERY_COMPRESSION_THRESHOLD_BYTES`` is
+set, encoding uses the ``msgpack-compact`` serializer registered here instead:
+payloads larger than the threshold are also zlib compressed, and smaller ones
+(progress updates, file result references) are left as they are. The first byte
+of a ``msgpack-compact`` payload tells which case applies.
+
+The Redis result backend does not store the content type of a result, so API
+processes and workers must use the same serializer. Results written before a
+change cannot be read after it (they expire with ``result_expires``).
+"""
+
+import zlib
+from typing import Any, List
+
+from app.core.config import settings
+
+COMPACT_SERIALIZER = "msgpack-compact"
+COMPACT_CONTENT_TYPE = "application/x-msgpack-compact"
+
+# Leading byte of a msgpack-compact payload
+_PLAIN = b"\x00"
+_ZLIB = b"\x01"
+
+_registered = False
+
+
+def compact_dumps(obj: Any) -> bytes:
+    """Encode with msgpack, compressing payloads above the compression threshold."""
+    import msgpack
+
+    packed = msgpack.packb(obj, use_bin_type=True)
+    threshold = settings.CELERY_COMPRESSION_THRESHOLD_BYTES
+    if threshold > 0 and len(packed) > threshold:
+        compressed = zlib.compress(packed, settings.CELERY_COMPRESSION_LEVEL)
+        if len(compressed) < len(packed):
+            return _ZLIB + compressed
+    return _PLAIN + packed
+
+
+def compact_loads(data: bytes) -> Any:
+    """Decode a payload of compact_dumps."""
+    import msgpack
+
+    data = bytes(data)
+    body = zlib.decompress(data[1:]) if data[:1] == _ZLIB else data[1:]
+    return msgpack.unpackb(body, raw=False)
+
+
+def register_compact_serializer() -> None:
+    """Register msgpack-compact with kombu (idempotent)."""
+    global _registered
+    if _registered:
+        return
+    from kombu.serialization import register
+
+    register(COMPACT_SERIALIZER, compact_dumps, compact_loads,
+             content_type=COMPACT_CONTENT_TYPE, content_encoding="binary")
+    _registered = True
+
+
+def get_celery_serializer() -> str:
+    """
+    Get the name of the serializer of Celery messages and results.
+
+    Returns:
+        "json", "msgpack" or "msgpack-compact" (registered on first use)
+    """
+    if settings.CELERY_SERIALIZER != "msgpack":
+        return "json"
+    if settings.CELERY_COMPRESSION_THRESHOLD_BYTES > 0:
+        register_compact_serializer()
+        return COMPACT_SERIALIZER
+    return "msgpack"
+
+
+def get_accept_content() -> List[str]:
+    """Get the accepted content types: JSON (messages published before a switch) and the serializer in use."""
+    serializer = get_celery_serializer()
+    return ["json"] if serializer == "json" else ["json", serializer]
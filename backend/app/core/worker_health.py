@@ -0,0 +1,169 @@
+"""
+Worker heartbeats and queue depth for health checks.
+
+Each Celery worker main process writes a heartbeat key with a short TTL from a
+daemon thread. Liveness is then a key lookup instead of a broadcast
+``inspect()`` that waits for every worker to reply. Queue depth is the length
+of the broker's Redis lists for each queue (one per priority lane).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, Callable, Iterable, List, Optional, Union
+
+import redis
+from app.core.config import settings
+from app.core.scheduling import PRIORITY_STEPS, priority_queue_names
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_KEY_PREFIX = "worker_heartbeat:"
+
+# A worker is considered gone after missing this many heartbeats
+HEARTBEAT_MISSES = 3
+
+# Pooled async clients of the API process, see get_async_clients
+_async_clients = None
+
+
+def heartbeat_ttl() -> int:
+    """Get the TTL of heartbeat keys in seconds."""
+    return max(1, int(settings.WORKER_HEARTBEAT_SECONDS * HEARTBEAT_MISSES))
+
+
+def get_worker_queues(app) -> List[str]:
+    """Get the queues tasks are routed to (including the default queue)."""
+    queues = {route['queue'] for route in (app.conf.task_routes or {}).values() if 'queue' in route}
+    queues.add(app.conf.task_default_queue)
+    return sorted(queues)
+
+
+def get_async_clients():
+    """
+    Get pooled ``redis.asyncio`` clients of the broker and the result backend.
+
+    Created on first use and shared by the API process; the same client is
+    returned twice when both URLs are equal.
+
+    Returns:
+        Tuple of (broker client, result backend client)
+    """
+    global _async_clients
+    if _async_clients is None:
+        import redis.asyncio as aioredis
+        broker = aioredis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+        backend = (
+            broker if settings.CELERY_RESULT_BACKEND == settings.CELERY_BROKER_URL
+            else aioredis.from_url(settings.CELERY_RESULT_BACKEND, decode_responses=True)
+        )
+        _async_clients = (broker, backend)
+    return _async_clients
+
+
+class WorkerHeartbeat:
+    """
+    Daemon thread that periodically refreshes the heartbeat key of a worker.
+
+    ``concurrency`` and ``active`` may be callables so that every beat reports
+    the current pool size (which the autoscaler changes) and running tasks.
+    """
+
+    def __init__(self, hostname: str, queues: Iterable[str],
+                 concurrency: Union[int, Callable[[], Optional[int]], None],
+                 active: Optional[Callable[[], int]] = None):
+        self.hostname = hostname
+        self.queues = sorted(queues)
+        self.concurrency = concurrency
+        self.active = active
+        self._key = f"{HEARTBEAT_KEY_PREFIX}{hostname}"
+        self._redis_client = redis.from_url(settings.CELERY_RESULT_BACKEND, decode_responses=True)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._beat()
+            self._thread = threading.Thread(target=self._run, name="worker-heartbeat", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop beating and remove the key so the worker disappears immediately."""
+        self._stop.set()
+        try:
+            self._redis_client.delete(self._key)
+        except Exception as e:
+            logger.warning(f"Failed to remove worker heartbeat: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(settings.WORKER_HEARTBEAT_SECONDS):
+            self._beat()
+
+    def _beat(self) -> None:
+        try:
+            self._redis_client.setex(self._key, heartbeat_ttl(), json.dumps({
+                "hostname": self.hostname,
+                "pid": os.getpid(),
+                "queues": self.queues,
+                "concurrency": self.concurrency() if callable(self.concurrency) else self.concurrency,
+                "active": self.active() if self.active else None,
+                "timestamp": time.time()
+            }))
+        except Exception as e:
+            logger.warning(f"Failed to write worker heartbeat: {e}")
+
+
+async def get_live_workers(client) -> List[Dict[str, Any]]:
+    """
+    Get the heartbeats of live workers.
+
+    Args:
+        client: ``redis.asyncio`` client of the result backend
+
+    Returns:
+        Heartbeat dicts (hostname, pid, queues, concurrency, active, timestamp)
+    """
+    keys = [key async for key in client.scan_iter(match=f"{HEARTBEAT_KEY_PREFIX}*", count=100)]
+    if not keys:
+        return []
+    workers = []
+    for value in await client.mget(keys):
+        if value:
+            workers.append(json.loads(value))
+    return workers
+
+
+async def get_queue_depths(client, queues: Iterable[str]) -> Dict[str, int]:
+    """
+    Get the number of messages waiting in each queue.
+
+    Args:
+        client: ``redis.asyncio`` client of the broker
+        queues: Queue names
+
+    Returns:
+        Queue name -> pending messages
+    """
+    queues = list(queues)
+    lanes = len(PRIORITY_STEPS)
+    async with client.pipeline(transaction=False) as pipe:
+        for queue in queues:
+            for name in priority_queue_names(queue):
+                pipe.llen(name)
+        lengths = await pipe.execute()
+    return {queue: sum(lengths[index * lanes:(index + 1) * lanes]) for index, queue in enumerate(queues)}
+
+
+def summarize_capacity(workers: List[Dict[str, Any]], depths: Dict[str, int]) -> Dict[str, Dict[str, Any]]:
+    """Get depth, consuming workers and worker slots of each queue."""
+    summary = {}
+    for queue, depth in depths.items():
+        consumers = [w for w in workers if queue in w.get("queues", [])]
+        summary[queue] = {
+            "depth": depth,
+            "workers": len(consumers),
+            "concurrency": sum(w.get("concurrency") or 0 for w in consumers)
+        }
+    return summary
@@ -16,7 +16,11 @@ from app.api.api import api_router
 from app.core.config import settings
 from app.core.error_handlers import setup_error_handlers
 from app.core.logging_config import setup_logging, set_correlation_id
+from app.core.log_management import log_manager
 from app.core.monitoring import MonitoringMiddleware, system_monitor
+from app.core.profiler import start_process_profiling, stop_process_profiling
+from app.core.queue_stats import queue_stats_collector
+from app.core.autoscaler import worker_autoscaler
 
 # Create rate limiter
 limiter = Limiter(key_func=get_remote_address)
@@ -28,20 +32,26 @@ async def lifespan(app: FastAPI):
     setup_logging()
     
     # Configure structured logging
+    processors = [
+        structlog.stdlib.filter_by_level,
+        structlog.stdlib.add_logger_name,
+        structlog.stdlib.add_log_level,
+        structlog.stdlib.PositionalArgumentsFormatter(),
+    ]
+    if settings.DEBUG:
+        # Call-site lookup inspects stack frames on every log call; only worth it while debugging
+        processors.append(structlog.processors.CallsiteParameterAdder(
+            parameters=[structlog.processors.CallsiteParameter.FILENAME,
+                       structlog.processors.CallsiteParameter.FUNC_NAME,
+                       structlog.processors.CallsiteParameter.LINENO]
+        ))
+    processors += [
+        structlog.processors.TimeStamper(fmt="iso"),
+        structlog.dev.ConsoleRenderer() if settings.DEBUG else structlog.processors.JSONRenderer()
+    ]
+    
     structlog.configure(
-        processors=[
-            structlog.stdlib.filter_by_level,
-            structlog.stdlib.add_logger_name,
-            structlog.stdlib.add_log_level,
-            structlog.stdlib.PositionalArgumentsFormatter(),
-            structlog.processors.CallsiteParameterAdder(
-                parameters=[structlog.processors.CallsiteParameter.FILENAME,
-                           structlog.processors.CallsiteParameter.FUNC_NAME,
-                           structlog.processors.CallsiteParameter.LINENO]
-            ),
-            structlog.processors.TimeStamper(fmt="iso"),
-            structlog.dev.ConsoleRenderer() if settings.DEBUG else structlog.processors.JSONRenderer()
-        ],
+        processors=processors,
         context_class=dict,
         logger_factory=structlog.stdlib.LoggerFactory(),
         wrapper_class=structlog.stdlib.BoundLogger,
@@ -50,6 +60,9 @@ async def lifespan(app: FastAPI):
     
     # Start background system monitoring
     monitoring_task = asyncio.create_task(system_monitor.start_background_monitoring())
+    queue_stats_task = asyncio.create_task(queue_stats_collector.start_background_collection())
+    autoscaler_task = asyncio.create_task(worker_autoscaler.start_background_control())
+    start_process_profiling("api")
     
     logger = structlog.get_logger("app.startup")
     logger.info("Application startup completed", service="image2model-backend", version="1.0.0")
@@ -58,11 +71,15 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Application shutdown initiated")
-    monitoring_task.cancel()
-    try:
-        await monitoring_task
-    except asyncio.CancelledError:
-        pass
+    for task in (monitoring_task, queue_stats_task, autoscaler_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    log_manager.shutdown()
+    monitoring_middleware.close()
+    stop_process_profiling()
     logger.info("Application shutdown completed")
 
 # Create FastAPI application
@@ -90,7 +107,9 @@ if settings.BACKEND_CORS_ORIGINS:
             allow_origins=origins,
             allow_credentials=False,  # Disable credentials in production
             allow_methods=["GET", "POST", "OPTIONS"],
-            allow_headers=["Authorization", "Content-Type"],
+            allow_headers=["Authorization", "Content-Type", "Idempotency-Key"],
+            # Lets the frontend read the backoff of 409/429/503 responses
+            expose_headers=["Retry-After"],
         )
     else:
         # Development mode - more permissive
@@ -100,6 +119,7 @@ if settings.BACKEND_CORS_ORIGINS:
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            expose_headers=["Retry-After"],
         )
 
 # Add monitoring middleware
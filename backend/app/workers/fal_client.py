@@ -11,10 +11,18 @@ import time
 from typing import Dict, Any, Optional
 import requests
 import fal_client as fal
+from celery.exceptions import SoftTimeLimitExceeded
 from app.core.config import settings
+from app.core.monitoring import record_fal_phase, record_fal_request
+from app.core.autoscaler import record_fal_outcome
+from app.core.hedging import hedge_policy, record_hedge
+from app.core.fal_checkpoint import fal_checkpoints
 
 logger = logging.getLogger(__name__)
 
+# Interval between status polls of submitted generations
+POLL_INTERVAL_SECONDS = 0.5
+
 
 class FalAIError(Exception):
     """Base exception for FAL.AI related errors."""
@@ -161,6 +169,121 @@ class FalAIClient:
         except Exception as e:
             logger.warning(f"Failed to handle queue update: {str(e)}")
     
+    @staticmethod
+    def _is_rate_limited(error: Exception) -> bool:
+        """Check whether an error is a FAL.AI rate limit response."""
+        error_message = str(error).lower()
+        return "rate limit" in error_message or "too many requests" in error_message or "429" in error_message
+    
+    @staticmethod
+    def _record_generation_phases(submitted_at: float, in_progress_at: Optional[float],
+                                  finished_at: float, status: str) -> None:
+        """Split a subscribe call into queue wait and inference phases."""
+        record_fal_request("subscribe", status, finished_at - submitted_at)
+        record_fal_outcome(status == "rate_limited")
+        if in_progress_at is not None:
+            record_fal_phase("queue_wait", in_progress_at - submitted_at)
+            record_fal_phase("inference", finished_at - in_progress_at, status)
+        elif status == "success":
+            # No progress update was seen, so queue wait cannot be separated out
+            record_fal_phase("inference", finished_at - submitted_at, status)
+        else:
+            # Failed before leaving the queue (e.g. rejected or rate limited)
+            record_fal_phase("queue_wait", finished_at - submitted_at, status)
+    
+    def _subscribe_hedged(self, input_data: Dict[str, Any], on_queue_update: callable,
+                          checkpoint_key: Optional[str] = None,
+                          checkpoint: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Submit a generation and wait for its result, hedging a straggler.
+        
+        Behaves like ``fal.subscribe`` while the generation finishes within the
+        hedge deadline (see app.core.hedging). Past it, a duplicate request is
+        submitted if the hedge budget allows; the first successful result wins
+        and the other request is cancelled.
+        
+        Args:
+            input_data: Generation arguments
+            on_queue_update: Called with every status update of every request
+            checkpoint_key: Key the request id is checkpointed under (see app.core.fal_checkpoint)
+            checkpoint: Checkpoint of an earlier run to reattach to instead of submitting
+            
+        Returns:
+            The generation result
+        """
+        if checkpoint:
+            # Reattach to the generation submitted by an earlier run of the task
+            submitted_at = checkpoint["submitted_at"]
+            primary = fal.sync_client.get_handle(self.model_endpoint, checkpoint["request_id"])
+            logger.info(f"Reattaching to FAL.AI request {primary.request_id}")
+        else:
+            submitted_at = time.time()
+            primary = fal.submit(self.model_endpoint, arguments=input_data)
+            if checkpoint_key:
+                fal_checkpoints.save(checkpoint_key, primary.request_id, input_data, submitted_at)
+        handles = [primary]
+        deadline = hedge_policy.get_deadline()
+        hedge_decided = False
+        hedge = None
+        winner = None
+        interrupted = False
+        
+        try:
+            while True:
+                for handle in list(handles):
+                    status = handle.status(with_logs=True)
+                    on_queue_update(status)
+                    if not isinstance(status, fal.Completed):
+                        continue
+                    try:
+                        result = handle.get()
+                    except Exception as e:
+                        # A failed request loses to one that is still running
+                        handles.remove(handle)
+                        if not handles:
+                            raise
+                        logger.warning(f"FAL.AI request {handle.request_id} failed, waiting for its hedge: {e}")
+                        continue
+                    
+                    winner = handle
+                    hedge_policy.record_latency(time.time() - submitted_at)
+                    if hedge is not None:
+                        record_hedge("hedge_won" if handle is hedge else "primary_won")
+                        if handle is hedge and checkpoint_key:
+                            fal_checkpoints.save(checkpoint_key, hedge.request_id, input_data, submitted_at)
+                    return result
+                
+                if not hedge_decided and deadline is not None and time.time() - submitted_at > deadline:
+                    # At most one hedge per generation
+                    hedge_decided = True
+                    if hedge_policy.acquire():
+                        logger.info(
+                            f"FAL.AI request {primary.request_id} running for over {deadline:.0f}s, "
+                            f"submitting a hedged duplicate"
+                        )
+                        hedge = fal.submit(self.model_endpoint, arguments=input_data)
+                        handles.append(hedge)
+                        record_hedge("submitted")
+                    else:
+                        record_hedge("skipped")
+                
+                time.sleep(POLL_INTERVAL_SECONDS)
+        except SoftTimeLimitExceeded:
+            # The checkpointed request keeps running for the next run of the task
+            interrupted = checkpoint_key is not None
+            raise
+        except Exception:
+            if checkpoint_key:
+                fal_checkpoints.clear(checkpoint_key)
+            raise
+        finally:
+            for handle in handles:
+                if handle is not winner and not (interrupted and handle is primary):
+                    try:
+                        handle.cancel()
+                    except Exception as e:
+                        logger.debug(f"Failed to cancel FAL.AI request {handle.request_id}: {e}")
+    
     def _handle_fal_error(self, error: Exception, attempt: int) -> bool:
         """
         Handle FAL.AI errors and determine if retry is appropriate.
@@ -179,7 +302,7 @@ class FalAIClient:
             raise FalAIAuthenticationError(f"Authentication failed: {str(error)}")
         
         # Rate limiting - retry with backoff
-        if "rate limit" in error_message or "too many requests" in error_message or "429" in error_message:
+        if self._is_rate_limited(error):
             if attempt < self.max_retries:
                 logger.warning(f"Rate limited, waiting before retry attempt {attempt + 1}")
                 return True
@@ -219,7 +342,9 @@ class FalAIClient:
         face_limit: Optional[int] = None,
         texture_enabled: bool = True,
         progress_callback: Optional[callable] = None,
-        job_id: Optional[str] = None
+        job_id: Optional[str] = None,
+        phase_callback: Optional[callable] = None,
+        checkpoint_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Process a single image to generate a 3D model using FAL.AI.
@@ -228,6 +353,10 @@ class FalAIClient:
             file_path: Path to the input image file
             face_limit: Optional face limit parameter for the model
             progress_callback: Optional callback function for progress updates
+            phase_callback: Optional callback called with the phase name ("uploaded",
+                "submitted", "first_progress") when the generation reaches it
+            checkpoint_key: Optional key (the task id) the FAL.AI request is checkpointed
+                under; a checkpointed request is resumed instead of submitted again
             
         Returns:
             Dictionary containing processing result with status, paths, and metadata
@@ -241,49 +370,77 @@ class FalAIClient:
             try:
                 logger.info(f"Starting FAL.AI processing for image: {file_path} (attempt {attempt + 1})")
                 
-                # Upload the local file to get a URL that FAL.AI can access
-                logger.info("Uploading image file to FAL.AI...")
-                if progress_callback:
-                    progress_callback("Uploading image to FAL.AI...", 15)
+                checkpoint = fal_checkpoints.load(checkpoint_key) if checkpoint_key else None
+                if checkpoint:
+                    # An earlier run of the task submitted this image; its upload and arguments are reused
+                    input_data = checkpoint["input_data"]
+                else:
+                    # Upload the local file to get a URL that FAL.AI can access
+                    logger.info("Uploading image file to FAL.AI...")
+                    if progress_callback:
+                        progress_callback("Uploading image to FAL.AI...", 15)
                 
-                # Upload file and get URL using correct API
-                file_url = fal.upload_file(file_path)
-                logger.info(f"File uploaded to FAL.AI: {file_url}")
+                    # Upload file and get URL using correct API
+                    upload_start_time = time.time()
+                    try:
+                        file_url = fal.upload_file(file_path)
+                    except Exception as e:
+                        upload_status = "rate_limited" if self._is_rate_limited(e) else "error"
+                        record_fal_request("upload", upload_status, time.time() - upload_start_time)
+                        record_fal_outcome(upload_status == "rate_limited")
+                        record_fal_phase("upload", time.time() - upload_start_time, upload_status)
+                        raise
+                    record_fal_request("upload", "success", time.time() - upload_start_time)
+                    record_fal_outcome(False)
+                    record_fal_phase("upload", time.time() - upload_start_time)
+                    if phase_callback:
+                        phase_callback("uploaded")
+                    logger.info(f"File uploaded to FAL.AI: {file_url}")
                 
-                # Prepare input data for FAL.AI API according to their documentation
-                input_data = {
-                    "image_url": file_url,
-                    "texture": "standard" if texture_enabled else "no",
-                    "texture_alignment": "original_image",  # Per documentation
-                    "orientation": "default"  # Per documentation
-                }
+                    # Prepare input data for FAL.AI API according to their documentation
+                    input_data = {
+                        "image_url": file_url,
+                        "texture": "standard" if texture_enabled else "no",
+                        "texture_alignment": "original_image",  # Per documentation
+                        "orientation": "default"  # Per documentation
+                    }
+                
+                    # Add face_limit if specified
+                    # Note: We do NOT set quad=True as it forces FBX output instead of GLB
+                    if face_limit is not None and face_limit > 0:
+                        input_data["face_limit"] = face_limit
+                        logger.info(f"Using face_limit: {face_limit} (GLB output)")
                 
-                # Add face_limit if specified
-                # Note: We do NOT set quad=True as it forces FBX output instead of GLB
-                if face_limit is not None and face_limit > 0:
-                    input_data["face_limit"] = face_limit
-                    logger.info(f"Using face_limit: {face_limit} (GLB output)")
                 
                 # Submit the job to FAL.AI using correct API method
                 logger.info("Submitting job to FAL.AI API...")
                 if progress_callback:
                     progress_callback("Submitting job to FAL.AI API...", 25)
                 
-                # Track timing for monitoring
+                # Track timing for monitoring; the first InProgress update ends the queue wait
                 submit_start_time = time.time()
+                phase_marks = {}
+                if phase_callback:
+                    phase_callback("submitted")
+                
+                def on_queue_update(update):
+                    if "in_progress" not in phase_marks and isinstance(update, fal.InProgress):
+                        phase_marks["in_progress"] = time.time()
+                        if phase_callback:
+                            phase_callback("first_progress")
+                    if progress_callback:
+                        self._handle_queue_update(update, progress_callback, file_id=file_id)
                 
                 try:
-                    # Use the correct fal_client.subscribe method for real-time execution
-                    # This will handle the queue/progress automatically and provide real-time updates
-                    result = fal.subscribe(
-                        self.model_endpoint,
-                        arguments=input_data,
-                        with_logs=True,
-                        on_queue_update=lambda update: self._handle_queue_update(update, progress_callback, file_id=job_id or file_path) if progress_callback else None
-                    )
+                    # Submit and poll with progress updates; stragglers get a hedged duplicate
+                    result = self._subscribe_hedged(input_data, on_queue_update, checkpoint_key, checkpoint)
                     
                     # Log success metrics
-                    submit_duration_ms = (time.time() - submit_start_time) * 1000
+                    finished_time = time.time()
+                    self._record_generation_phases(
+                        submit_start_time, phase_marks.get("in_progress"), finished_time, "success"
+                    )
+                    submit_duration_ms = (finished_time - submit_start_time) * 1000
                     logger.info(
                         f"FAL.AI job completed successfully in {submit_duration_ms:.2f}ms",
                         extra={
@@ -301,7 +458,12 @@ class FalAIClient:
                         
                 except Exception as e:
                     # Log failure metrics
-                    submit_duration_ms = (time.time() - submit_start_time) * 1000
+                    finished_time = time.time()
+                    self._record_generation_phases(
+                        submit_start_time, phase_marks.get("in_progress"), finished_time,
+                        "rate_limited" if self._is_rate_limited(e) else "error"
+                    )
+                    submit_duration_ms = (finished_time - submit_start_time) * 1000
                     logger.error(
                         f"FAL.AI job failed after {submit_duration_ms:.2f}ms: {str(e)}",
                         extra={
@@ -319,11 +481,20 @@ class FalAIClient:
                 logger.info(f"FAL.AI API response received: {result}")
                 
                 # Process the successful result
-                return self._process_result(result, file_path, progress_callback, job_id)
+                processing_start_time = time.time()
+                processed = self._process_result(result, file_path, progress_callback, job_id)
+                record_fal_phase(
+                    "result_processing", time.time() - processing_start_time,
+                    "success" if processed.get('status') == 'success' else "error"
+                )
+                return processed
                 
             except (FalAIAuthenticationError, FalAIRateLimitError, FalAITimeoutError, FalAIAPIError):
                 # These are already properly handled exceptions
                 raise
+            except SoftTimeLimitExceeded:
+                # Out of time; the task decides whether to run again
+                raise
             except Exception as e:
                 # Try to handle and potentially retry the error
                 try:
@@ -446,7 +617,9 @@ class FalAIClient:
         face_limit: Optional[int] = None,
         texture_enabled: bool = True,
         progress_callback: Optional[callable] = None,
-        job_id: Optional[str] = None
+        job_id: Optional[str] = None,
+        phase_callback: Optional[callable] = None,
+        checkpoint_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Synchronous wrapper for process_single_image to use in Celery tasks.
@@ -470,7 +643,9 @@ class FalAIClient:
                 face_limit=face_limit,
                 texture_enabled=texture_enabled,
                 progress_callback=progress_callback,
-                job_id=job_id
+                job_id=job_id,
+                phase_callback=phase_callback,
+                checkpoint_key=checkpoint_key
             )
         )
 
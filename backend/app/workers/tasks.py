@@ -3,14 +3,18 @@ Background tasks for 3D model generation.
 """
 
 import os
+import math
 import logging
 import time
 from typing import Dict, Any, List, Optional
 
+import redis
 from celery import current_task
+from celery.utils import uuid
 from celery.exceptions import SoftTimeLimitExceeded, Retry
 
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.core.exceptions import (
     FALAPIException,
     ProcessingException,
@@ -22,6 +26,12 @@ from app.core.exceptions import (
 # Use enhanced logging from core
 from app.core.logging_config import get_task_logger, set_correlation_id
 from app.core.progress_tracker import progress_tracker
+from app.core.job_timeline import job_timeline
+from app.core.admission import release_job
+from app.core.scheduling import file_priority
+from app.core.idempotency import file_claims, file_digest, generation_scope, ClaimHeld, CLAIM_RETRY_SECONDS
+from app.core.batch_completion import batch_counter, counter_enabled
+from app.core.monitoring import record_job_timeline, FILES_DEDUPLICATED
 
 # Import FAL.AI client for real 3D model generation
 from app.workers.fal_client import FalAIClient
@@ -119,7 +129,8 @@ def generate_3d_model_task(self, file_id: str, file_path: str, job_id: str, qual
             face_limit=None,  # Quality setting handled by FAL.AI client
             texture_enabled=texture_enabled,
             progress_callback=progress_callback,
-            job_id=job_id  # Pass job_id for proper file organization
+            job_id=job_id,  # Pass job_id for proper file organization
+            checkpoint_key=self.request.id
         )
         
         if result["status"] == "success":
@@ -145,33 +156,6 @@ def generate_3d_model_task(self, file_id: str, file_path: str, job_id: str, qual
             # Store in job store
             job_store.set_job_result(job_id, job_result)
             
-            # Final completion state - update with result in meta for SSE endpoint  
-            task_meta = {
-                "current": 1,
-                "total": 1,
-                "progress": 100,
-                "status": f"3D model generated successfully for {original_filename}",
-                "filename": original_filename,
-                "job_id": job_id,
-                "file_id": file_id,
-                "total_files": 1,
-                "successful_files": 1,
-                "failed_files": 0,
-                "results": [{
-                    "file_path": file_path,
-                    "status": "completed",
-                    "result_path": result["output"],
-                    "download_url": result.get("download_url"),
-                    "model_format": result.get("model_format", "glb"),
-                    "rendered_image": result.get("rendered_image")
-                }]
-            }
-            
-            current_task.update_state(
-                state="SUCCESS",
-                meta=task_meta
-            )
-            
             logger.info(f"FAL.AI Tripo3D generation completed successfully for job {job_id}")
             
             # Update progress tracker for completion
@@ -186,22 +170,16 @@ def generate_3d_model_task(self, file_id: str, file_path: str, job_id: str, qual
                 except Exception as e:
                     logger.warning(f"Failed to update progress tracker: {e}")
             
-            # Return the full result including all necessary fields for SSE
+            # The task result only references the job record; files are listed by the download API
             return {
                 "job_id": job_id,
                 "file_id": file_id,
                 "status": "completed",
-                "result_path": result["output"],  # FAL.AI client returns "output" field
-                "model_format": result.get("model_format", "glb"),
-                "rendered_image": result.get("rendered_image"),
-                "processing_time": result.get("processing_time", 0),
                 "message": f"3D model generated successfully for {original_filename}",
                 "filename": original_filename,
                 "total_files": 1,
                 "successful_files": 1,
-                "failed_files": 0,
-                # Include job_result for download endpoint's Redis scan fallback
-                "job_result": job_result
+                "failed_files": 0
             }
         else:
             # Handle failure case
@@ -269,7 +247,8 @@ def cleanup_old_files():
 
 
 @celery_app.task(bind=True)
-def process_file_in_batch(self, file_path: str, job_id: str, face_limit: Optional[int] = None, file_index: int = 0, total_files: int = 1):
+def process_file_in_batch(self, file_path: str, job_id: str, face_limit: Optional[int] = None, file_index: int = 0, total_files: int = 1,
+                          batch_task_id: Optional[str] = None, claim_waits: int = 0):
     """
     Process a single file as part of a batch operation.
     This task is designed to be run in parallel with other files from the same batch.
@@ -280,12 +259,16 @@ def process_file_in_batch(self, file_path: str, job_id: str, face_limit: Optiona
         face_limit: Optional limit on number of faces in generated models
         file_index: Index of this file in the batch (for progress tracking)
         total_files: Total number of files in the batch
+        batch_task_id: Id of the batch result of a counter-completed batch (see
+            app.core.batch_completion); None when a chord callback finalizes the batch
+        claim_waits: Retries so far spent waiting for another task processing the same image
         
     Returns:
         Dict with processing result for this file
     """
     try:
         logger.info(f"Processing file {file_index + 1}/{total_files} in parallel: {os.path.basename(file_path)}")
+        job_timeline.mark_file(job_id, file_index, "started")
         
         # Create progress callback for this specific file
         def parallel_file_progress_callback(message: str, progress: int):
@@ -304,61 +287,193 @@ def process_file_in_batch(self, file_path: str, job_id: str, face_limit: Optiona
             # Don't update Celery task state here since we're in a subtask
             return None
 
+        def record_file_phase(phase: str):
+            job_timeline.mark_file(job_id, file_index, phase)
+
         # Process single image using FAL.AI with synchronous wrapper
         file_start_time = time.time()
         from app.workers.fal_client import fal_client
         
-        try:
-            # Use synchronous wrapper to avoid coroutine serialization issues
-            result = fal_client.process_single_image_sync(
-                file_path=file_path, 
-                face_limit=face_limit, 
-                texture_enabled=True,
-                progress_callback=parallel_file_progress_callback,
-                job_id=job_id
-            )
-        except Exception as process_error:
-            logger.error(f"Error processing image: {str(process_error)}", exc_info=True)
-            raise
-        
-        actual_processing_time = time.time() - file_start_time
+        def generate() -> Dict[str, Any]:
+            try:
+                # Use synchronous wrapper to avoid coroutine serialization issues
+                result = fal_client.process_single_image_sync(
+                    file_path=file_path, 
+                    face_limit=face_limit, 
+                    texture_enabled=True,
+                    progress_callback=parallel_file_progress_callback,
+                    job_id=job_id,
+                    phase_callback=record_file_phase,
+                    checkpoint_key=self.request.id
+                )
+            except Exception as process_error:
+                logger.error(f"Error processing image: {str(process_error)}", exc_info=True)
+                raise
         
-        if result["status"] == "success":
-            file_result = {
-                "file_path": file_path,
-                "status": "completed",
-                "result_path": result.get("download_url"),  # FAL.AI URL
-                "download_url": result.get("download_url"),
-                "model_url": result.get("model_url"),
-                "rendered_image": result.get("rendered_image"),
-                "filename": result.get("filename"),
-                "face_count": face_limit if face_limit else 1000,
-                "processing_time": actual_processing_time,
-                "model_format": result.get("model_format", "glb"),
-                "file_size": result.get("file_size", 0),
-                "content_type": result.get("content_type", "model/gltf-binary"),
-                "task_id": result.get("task_id")
-            }
-            logger.info(f"Successfully processed {os.path.basename(file_path)} in {actual_processing_time:.2f}s")
-        else:
-            file_result = {
-                "file_path": file_path,
-                "status": "failed",
-                "error": result.get("error", "Unknown error"),
-                "processing_time": actual_processing_time
-            }
-            logger.error(f"Failed to process {os.path.basename(file_path)}: {result.get('error', 'Unknown error')}")
+            actual_processing_time = time.time() - file_start_time
         
-        return file_result
+            if result["status"] == "success":
+                file_result = {
+                    "file_path": file_path,
+                    "status": "completed",
+                    "result_path": result.get("download_url"),  # FAL.AI URL
+                    "download_url": result.get("download_url"),
+                    "model_url": result.get("model_url"),
+                    "rendered_image": result.get("rendered_image"),
+                    "filename": result.get("filename"),
+                    "face_count": face_limit if face_limit else 1000,
+                    "processing_time": actual_processing_time,
+                    "model_format": result.get("model_format", "glb"),
+                    "file_size": result.get("file_size", 0),
+                    "content_type": result.get("content_type", "model/gltf-binary"),
+                    "task_id": result.get("task_id")
+                }
+                logger.info(f"Successfully processed {os.path.basename(file_path)} in {actual_processing_time:.2f}s")
+            else:
+                file_result = {
+                    "file_path": file_path,
+                    "status": "failed",
+                    "error": result.get("error", "Unknown error"),
+                    "processing_time": actual_processing_time
+                }
+                logger.error(f"Failed to process {os.path.basename(file_path)}: {result.get('error', 'Unknown error')}")
+            return file_result
+        
+        digest = file_digest(file_path)
+        
+        def generate_coalesced() -> Dict[str, Any]:
+            # Identical images of concurrent jobs share one FAL.AI request
+            if not settings.COALESCE_ENABLED:
+                return generate()
+            file_result, coalesced = file_claims.run_once(
+                generation_scope(digest, face_limit=face_limit, texture_enabled=True),
+                self.request.id,
+                generate,
+                result_ttl=settings.COALESCE_RESULT_SECONDS,
+                shareable=lambda result: result["status"] == "completed"
+            )
+            if coalesced:
+                logger.info(f"Coalesced {os.path.basename(file_path)} with an identical in-flight generation")
+                FILES_DEDUPLICATED.labels(scope="coalesced").inc()
+                file_result = {**file_result, "file_path": file_path}
+            return file_result
+        
+        # The same image twice in a job, or a redelivery of this task, reuses the first result
+        file_result, attached = file_claims.run_once(f"{job_id}:{digest}", self.request.id, generate_coalesced)
+        if attached:
+            logger.info(f"Reusing the result of an identical file for {os.path.basename(file_path)}")
+            FILES_DEDUPLICATED.labels(scope="job").inc()
+            file_result = {**file_result, "file_path": file_path}
+        
+        job_timeline.mark_file(job_id, file_index, "completed", status=file_result["status"])
+        
+    except ClaimHeld as held:
+        # Another task is generating the same image; wait for its result without holding a worker slot
+        if claim_waits < math.ceil(settings.FILE_CLAIM_SECONDS / CLAIM_RETRY_SECONDS) + 1:
+            logger.info(f"Waiting for task {held.holder} processing the same image as {os.path.basename(file_path)}")
+            raise self.retry(countdown=CLAIM_RETRY_SECONDS, max_retries=self.request.retries + 1,
+                             kwargs={**self.request.kwargs, "claim_waits": claim_waits + 1})
+        # Unreachable while claims expire after FILE_CLAIM_SECONDS; fail the file rather than wait forever
+        logger.error(f"Gave up waiting for task {held.holder} processing {os.path.basename(file_path)}")
+        job_timeline.mark_file(job_id, file_index, "completed", status="failed")
+        file_result = {
+            "file_path": file_path,
+            "status": "failed",
+            "error": "Timed out waiting for an identical file being processed",
+            "processing_time": 0
+        }
         
     except Exception as exc:
+        if isinstance(exc, SoftTimeLimitExceeded) and self.request.retries - claim_waits < settings.FAL_RESUME_RETRIES:
+            # The FAL.AI request was checkpointed and keeps running; the retry reattaches to it
+            logger.warning(f"Time limit reached for {os.path.basename(file_path)}, retrying to resume its generation")
+            raise self.retry(exc=exc, countdown=0, max_retries=self.request.retries + 1)
         logger.error(f"File processing failed for {file_path}: {str(exc)}", exc_info=True)
-        return {
+        job_timeline.mark_file(job_id, file_index, "completed", status="failed")
+        file_result = {
             "file_path": file_path,
             "status": "failed",
             "error": str(exc),
             "processing_time": time.time() - (file_start_time if 'file_start_time' in locals() else 0)
         }
+    
+    try:
+        _publish_file_result(job_id, file_index, total_files, file_result)
+    except redis.RedisError as exc:
+        # The published entry is the only copy of the file's model; fail the batch rather than drop it
+        logger.error(f"Failed to publish file {file_index} of job {job_id}, failing the batch: {exc}")
+        if batch_task_id:
+            _fail_counted_batch(job_id, batch_task_id, exc)
+        raise
+    
+    if batch_task_id:
+        try:
+            counted, remaining = batch_counter.complete_file(job_id, file_index)
+        except redis.RedisError as exc:
+            # The counter can no longer reach zero; fail the batch instead of leaving it in progress
+            logger.error(f"Failed to count file {file_index} of job {job_id} as completed, failing the batch: {exc}")
+            _fail_counted_batch(job_id, batch_task_id, exc)
+            raise
+        if remaining == 0:
+            _finalize_counted_batch(job_id, total_files, face_limit, batch_task_id, counted)
+    return _file_result_ref(job_id, file_index, file_result)
+
+
+def _publish_file_result(job_id: str, file_index: int, total_files: int, file_result: Dict[str, Any]) -> None:
+    """Make a finished file downloadable before the rest of its batch completes."""
+    from app.core.job_store import job_store
+    
+    job_store.add_file_result(job_id, file_index, total_files, {
+        "file_index": file_index,
+        "status": file_result["status"],
+        "filename": file_result.get("filename") or os.path.basename(file_result["file_path"]),
+        "model_url": file_result.get("download_url"),
+        "file_size": file_result.get("file_size", 0),
+        "content_type": file_result.get("content_type", "model/gltf-binary"),
+        "rendered_image": file_result.get("rendered_image"),
+        "task_id": file_result.get("task_id"),
+        "error": file_result.get("error")
+    })
+
+
+def _file_result_ref(job_id: str, file_index: int, file_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the task result of a file: its outcome and where the published file entry is."""
+    ref = {"job_id": job_id, "file_index": file_index, "status": file_result["status"]}
+    if file_result.get("error"):
+        ref["error"] = file_result["error"]
+    return ref
+
+
+def _fail_counted_batch(job_id: str, batch_task_id: str, exc: Exception) -> None:
+    """Mark a counter-completed batch as failed and release its admission reservation."""
+    try:
+        celery_app.backend.store_result(batch_task_id, exc, "FAILURE")
+    except Exception as e:
+        logger.error(f"Failed to store the failure of batch {batch_task_id}: {e}")
+    release_job(job_id)
+    batch_counter.clear(job_id)
+
+
+def _finalize_counted_batch(job_id: str, total_files: int, face_limit: Optional[int], batch_task_id: str,
+                            counted: bool) -> None:
+    """
+    Finalize a counter-completed batch from the file task that completed it.
+    
+    The summary is stored as the result of the batch task id, which clients track
+    like a chord callback. A redelivered task finding no files remaining
+    finalizes again (counted is False): the task that counted the last file may
+    have been lost before it finished finalizing.
+    """
+    if not counted:
+        logger.warning(f"Finalizing job {job_id} again from a redelivered file task")
+    
+    try:
+        summary = _finalize_batch(job_id, total_files, face_limit)
+    except Exception as exc:
+        celery_app.backend.store_result(batch_task_id, exc, "FAILURE")
+        raise
+    celery_app.backend.store_result(batch_task_id, summary, "SUCCESS")
+    batch_counter.clear(job_id)
 
 
 @celery_app.task(bind=True)
@@ -367,10 +482,11 @@ def finalize_batch_results(self, results: List[Dict[str, Any]], job_id: str, tot
     Callback task to finalize batch processing results after all files are processed.
     
     This task is called by the chord after all parallel file processing tasks complete.
-    It aggregates results and stores them in the job store.
+    Batches completed by the per-job counter are finalized inline by their last
+    file task instead (see _finalize_counted_batch).
     
     Args:
-        results: List of results from each file processing task
+        results: List of results from each file processing task (see _file_result_ref)
         job_id: Unique job identifier
         total_files: Total number of files in the batch
         face_limit: Optional limit on number of faces in generated models
@@ -378,7 +494,35 @@ def finalize_batch_results(self, results: List[Dict[str, Any]], job_id: str, tot
     Returns:
         Dict with batch processing summary
     """
+    return _finalize_batch(job_id, total_files, face_limit, results)
+
+
+def _finalize_batch(job_id: str, total_files: int, face_limit: Optional[int] = None,
+                    results: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Aggregate the results of a batch and store them in the job store.
+    
+    The file entries come from the per-file results each task published (see
+    _publish_file_result); the task results only carry each file's outcome.
+    
+    Args:
+        job_id: Unique job identifier
+        total_files: Total number of files in the batch
+        face_limit: Optional limit on number of faces in generated models
+        results: Outcome of each file task (see _file_result_ref); the published
+            file entries are used when not given
+        
+    Returns:
+        Dict with batch processing summary
+    """
+    from app.core.job_store import job_store
+    
     try:
+        job_timeline.mark(job_id, "finalize_started")
+        file_results = job_store.get_file_results(job_id) or {"files": []}
+        if results is None:
+            results = file_results["files"]
+        
         # Final completion update
         success_count = sum(1 for r in results if r["status"] == "completed")
         failure_count = sum(1 for r in results if r["status"] == "failed")
@@ -396,14 +540,11 @@ def finalize_batch_results(self, results: List[Dict[str, Any]], job_id: str, tot
             "failed_files": failure_count,
             "timeout_files": timeout_count,
             "face_limit": face_limit,
-            "results": results,
             "message": f"Batch processing completed. {success_count} successful, {failure_count} failed, {timeout_count} timed out."
         }
         
         # Store job results for later retrieval by the download API
         if success_count > 0:
-            from app.core.job_store import job_store
-            
             # Prepare job result data in the format expected by download API
             job_result = {
                 "job_id": job_id,
@@ -414,29 +555,107 @@ def finalize_batch_results(self, results: List[Dict[str, Any]], job_id: str, tot
             }
             
             # Add successful files to job result
-            for result in results:
-                if result["status"] == "completed" and result.get("download_url"):
+            for entry in file_results["files"]:
+                if entry["status"] == "completed" and entry.get("model_url"):
                     job_result["files"].append({
-                        "filename": result.get("filename", os.path.basename(result["file_path"])),
-                        "model_url": result.get("download_url"),
-                        "file_size": result.get("file_size", 0),
-                        "content_type": result.get("content_type", "model/gltf-binary"),
-                        "rendered_image": result.get("rendered_image"),
-                        "task_id": result.get("task_id")
+                        "filename": entry.get("filename"),
+                        "model_url": entry.get("model_url"),
+                        "file_size": entry.get("file_size", 0),
+                        "content_type": entry.get("content_type", "model/gltf-binary"),
+                        "rendered_image": entry.get("rendered_image"),
+                        "task_id": entry.get("task_id")
                     })
             
             # Store in job store
             job_store.set_job_result(job_id, job_result)
             logger.info(f"Stored job results for {job_id} with {len(job_result['files'])} files")
         
+        # The job's files no longer count against its API key's in-flight limit
+        release_job(job_id)
+        
+        # Close the timeline and feed its phase durations into the aggregate histograms
+        job_timeline.mark(job_id, "results_stored")
+        timeline = job_timeline.get_timeline(job_id)
+        if timeline:
+            record_job_timeline(timeline)
+        
         logger.info(f"Batch processing completed for job {job_id}: {result_summary['message']}")
         return result_summary
         
     except Exception as exc:
         logger.error(f"Failed to finalize batch results for job {job_id}: {str(exc)}", exc_info=True)
+        release_job(job_id)
         raise
 
 
+def dispatch_batch(job_id: str, file_paths: List[str], face_limit: Optional[int] = None,
+                   inflight_files: int = 0) -> Dict[str, Any]:
+    """
+    Dispatch the files of a batch as a chord of process_file_in_batch tasks.
+    
+    Called by the upload endpoint directly, so files start without a hop through
+    the batch_processing queue. Task ids are assigned before publishing and the
+    chord callback (finalize_batch_results) starts in the PROGRESS state with the
+    job id and file count, which lets clients track the batch by its id alone.
+    Each file is published to the priority lane of its rank among the caller's
+    in-flight files (see app.core.scheduling).
+    
+    With BATCH_COMPLETION=counter the files are published without a chord and
+    the last one to finish finalizes the batch, storing the summary under the
+    same callback task id (see app.core.batch_completion).
+    
+    Args:
+        job_id: Unique job identifier
+        file_paths: List of paths to uploaded image files
+        face_limit: Optional limit on number of faces in generated models
+        inflight_files: Files of the same API key already in flight
+        
+    Returns:
+        Dict with the chord callback task id and the task id of each file, in order
+    """
+    from celery import chord
+    
+    total_files = len(file_paths)
+    file_task_ids = [uuid() for _ in file_paths]
+    chord_task_id = uuid()
+    use_counter = counter_enabled()
+    
+    parallel_tasks = [
+        process_file_in_batch.s(
+            file_path=file_path,
+            job_id=job_id,
+            face_limit=face_limit,
+            file_index=i,
+            total_files=total_files,
+            batch_task_id=chord_task_id if use_counter else None
+        ).set(task_id=file_task_ids[i], priority=file_priority(i, total_files, inflight_files))
+        for i, file_path in enumerate(file_paths)
+    ]
+    
+    # Clients may poll the callback before any file finishes; report the batch instead of PENDING
+    celery_app.backend.store_result(chord_task_id, {
+        "current": 0,
+        "total": total_files,
+        "total_files": total_files,
+        "status": f"Processing {total_files} files in parallel across workers...",
+        "job_id": job_id
+    }, "PROGRESS")
+    
+    if use_counter:
+        batch_counter.start(job_id, total_files)
+        with celery_app.producer_or_acquire() as producer:
+            for task in parallel_tasks:
+                task.apply_async(producer=producer)
+    else:
+        chord(parallel_tasks)(
+            finalize_batch_results.s(job_id=job_id, total_files=total_files, face_limit=face_limit).set(task_id=chord_task_id)
+        )
+    job_timeline.mark(job_id, "chord_dispatched")
+    logger.info(f"Dispatched {total_files} files of job {job_id} with {'batch' if use_counter else 'chord'} ID: {chord_task_id}")
+    
+    return {"chord_task_id": chord_task_id, "file_task_ids": file_task_ids}
+
+
 @celery_app.task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60})
 def process_batch(self, job_id: str, file_paths: List[str], face_limit: Optional[int] = None):
     """
@@ -445,6 +664,9 @@ def process_batch(self, job_id: str, file_paths: List[str], face_limit: Optional
     This task creates individual subtasks for each file and executes them in parallel
     using Celery's chord primitive, which handles the callback automatically.
     
+    Uploads dispatch their chord directly (see dispatch_batch); this task remains for
+    batches queued by earlier releases and for manual reprocessing.
+    
     Args:
         job_id: Unique job identifier
         file_paths: List of paths to uploaded image files
@@ -459,6 +681,7 @@ def process_batch(self, job_id: str, file_paths: List[str], face_limit: Optional
         
         # Store start time for timeout tracking
         start_time = time.time()
+        job_timeline.mark(job_id, "batch_started", start_time)
         
         # Update progress to starting
         current_task.update_state(
@@ -472,20 +695,6 @@ def process_batch(self, job_id: str, file_paths: List[str], face_limit: Optional
             }
         )
         
-        # Import Celery's chord primitive for parallel execution with callback
-        from celery import chord
-        
-        # Create a list of parallel tasks for each file
-        parallel_tasks = [
-            process_file_in_batch.s(
-                file_path=file_path,
-                job_id=job_id,
-                face_limit=face_limit,
-                file_index=i,
-                total_files=total_files
-            ) for i, file_path in enumerate(file_paths)
-        ]
-        
         # Execute all tasks in parallel with a callback to finalize results
         logger.info(f"Dispatching {total_files} files to process in parallel")
         
@@ -501,14 +710,10 @@ def process_batch(self, job_id: str, file_paths: List[str], face_limit: Optional
             }
         )
         
-        # Use chord to execute tasks in parallel and call finalize_batch_results when done
-        # The chord will automatically handle result collection without blocking
-        chord_result = chord(parallel_tasks)(
-            finalize_batch_results.s(job_id=job_id, total_files=total_files, face_limit=face_limit)
-        )
+        dispatch = dispatch_batch(job_id, file_paths, face_limit)
         
-        # Return the chord result ID so the upload endpoint can track it
-        logger.info(f"Batch processing initiated for job {job_id} with chord ID: {chord_result.id}")
+        # Return the chord result ID so the stream endpoint can switch to tracking it
+        logger.info(f"Batch processing initiated for job {job_id} with chord ID: {dispatch['chord_task_id']}")
         
         # Return a response indicating processing has started
         return {
@@ -516,7 +721,7 @@ def process_batch(self, job_id: str, file_paths: List[str], face_limit: Optional
             "status": "processing",
             "total_files": total_files,
             "message": f"Processing {total_files} files in parallel",
-            "chord_task_id": chord_result.id
+            "chord_task_id": dispatch["chord_task_id"]
         }
         
     except SoftTimeLimitExceeded:
@@ -604,7 +809,8 @@ def process_single_image_with_retry(self, file_path: str, face_limit: Optional[i
             file_path=file_path, 
             face_limit=face_limit, 
             texture_enabled=True,
-            progress_callback=retry_progress_callback
+            progress_callback=retry_progress_callback,
+            checkpoint_key=self.request.id
         )
         
         # Check if result indicates a retryable error
@@ -747,4 +953,18 @@ def health_check_task():
     """
     Simple health check task for monitoring worker status.
     """
-    return {"status": "healthy", "worker": "image2model-worker"}
\ No newline at end of file
+    return {"status": "healthy", "worker": "image2model-worker"}
+
+@celery_app.task
+def start_worker_profile(profile_id: str, seconds: float, interval: float = 0.01, format: str = "collapsed"):
+    """
+    Control task asking every worker process to profile itself for ``seconds``.
+    
+    Runs on the priority queue; worker processes pick the request up from Redis
+    (see app.core.profiler) and write their profiles under PROFILES_DIR/<profile_id>.
+    """
+    from app.core.profiler import publish_profile_request
+    
+    request = publish_profile_request(profile_id, seconds, interval, format)
+    logger.info(f"Published worker profiling request {profile_id} for {seconds}s")
+    return {"status": "accepted", "worker": current_task.request.hostname, **request}
@@ -0,0 +1,25 @@
+"""
+Gunicorn configuration for the production API server.
+
+Keeps Prometheus multiprocess metrics consistent across worker processes:
+stale files are removed on startup, the files of this container are kept fresh
+for the other containers sharing the directory, and live gauges of exited
+workers are dropped.
+"""
+
+from app.core.metrics_multiprocess import (
+    mark_process_dead, remove_stale_metric_files, start_metric_files_heartbeat
+)
+
+
+def on_starting(server):
+    """Remove metric files left by a previous run or by removed containers."""
+    removed = remove_stale_metric_files()
+    if removed:
+        server.log.info(f"Removed {removed} stale Prometheus metric files")
+    start_metric_files_heartbeat()
+
+
+def child_exit(server, worker):
+    """Drop the live gauge values of an exited worker."""
+    mark_process_dead(worker.pid)
@@ -0,0 +1,249 @@
+"""
+Benchmark of batch completion: Celery chord vs per-job counter.
+
+Replays against Redis the completion traffic of a batch whose files finish on
+``--concurrency`` workers at once, for both BATCH_COMPLETION modes:
+
+- chord: what the Redis result backend does for each chord member
+  (RedisBackend.on_chord_part_return in Celery 5.3): push the encoded result
+  to the chord list, read the counters and refresh expiries. The last member
+  reads the whole list back, decodes it and publishes the
+  finalize_batch_results message carrying every result, which a worker then
+  decodes before finalizing.
+- counter: BatchCounter.complete_file for each file (app.core.batch_completion);
+  the last file finalizes inline.
+
+In both modes each file task also stores its result and publishes its entry
+to ``job_files:{job_id}``, and finalizing reads ``job_files`` and writes
+``job_result``. No FAL.AI call is made. The chord callback's wait in the
+queue for a free worker is not included, so the chord figures are a lower
+bound.
+
+For each batch size it reports the Redis round trips of the batch, the bytes
+read back to finalize it, the wall time of the completion traffic and the time
+from the last file's completion to the stored job result (median of
+``--rounds``).
+
+Usage (from backend/):
+    python -m scripts.benchmark_batch_completion [--files 25 250] [--concurrency 8] [--rounds 5] [--redis-url redis://localhost:6379/15]
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List
+
+import redis
+from kombu.serialization import dumps, loads
+
+from app.core.config import settings
+from app.core.serialization import get_celery_serializer
+
+RESULT_EXPIRES = 3600
+JOB_TTL = 24 * 3600
+
+# Stands in for the queue of the chord callback, so real queues are not touched
+CALLBACK_QUEUE = "benchmark:batch_completion:callbacks"
+
+
+@lru_cache(maxsize=None)
+def content_type() -> tuple:
+    """Get the content type and encoding of the configured Celery serializer."""
+    return dumps(None, serializer=get_celery_serializer())[:2]
+
+
+def encode(payload: Any) -> bytes:
+    return dumps(payload, serializer=get_celery_serializer())[2]
+
+
+def decode(data: bytes) -> Any:
+    mime, encoding = content_type()
+    return loads(data, mime, encoding, accept={mime})
+
+
+class BatchRun:
+    """Completion traffic of one batch, with its Redis round trips and bytes read to finalize."""
+
+    def __init__(self, client, mode: str, total_files: int):
+        from app.core.batch_completion import BatchCounter
+
+        self.client = client
+        self.mode = mode
+        self.total_files = total_files
+        self.job_id = str(uuid.uuid4())
+        self.group_id = str(uuid.uuid4())
+        self.batch_task_id = str(uuid.uuid4())
+        self.counter = BatchCounter()
+        self.task_ids = [str(uuid.uuid4()) for _ in range(total_files)]
+        self.round_trips = 0
+        self.finalize_bytes = 0
+        self.last_completed_at = None
+        self.stored_at = None
+        self._lock = threading.Lock()
+
+    def _count(self, round_trips: int, read_bytes: int = 0) -> None:
+        with self._lock:
+            self.round_trips += round_trips
+            self.finalize_bytes += read_bytes
+
+    def dispatch(self) -> None:
+        if self.mode == "counter":
+            self.counter.start(self.job_id, self.total_files)
+        else:
+            # RedisBackend.set_chord_size
+            self.client.set(f"chord-unlock-{self.group_id}.s", self.total_files)
+        self._count(1)
+
+    def complete_file(self, file_index: int) -> None:
+        task_id = self.task_ids[file_index]
+        ref = {"job_id": self.job_id, "file_index": file_index, "status": "completed"}
+
+        # Task result (store_result) and published file entry (JobStore.add_file_result)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(f"celery-task-meta-{task_id}", encode({
+            "status": "SUCCESS", "result": ref, "traceback": None, "children": [],
+            "date_done": "2024-03-15T12:34:56.789012", "task_id": task_id
+        }), ex=RESULT_EXPIRES)
+        pipe.publish(f"celery-task-meta-{task_id}", b"")
+        pipe.execute()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(f"job_files:{self.job_id}", mapping={
+            "total_files": self.total_files,
+            f"file:{file_index}": json.dumps({
+                "file_index": file_index,
+                "status": "completed",
+                "filename": f"image_{file_index}.glb",
+                "model_url": f"https://v3.fal.media/files/lion/{uuid.uuid4().hex}_model.glb",
+                "file_size": 2389102,
+                "content_type": "model/gltf-binary",
+                "rendered_image": {
+                    "url": f"https://v3.fal.media/files/tiger/{uuid.uuid4().hex}_preview.webp",
+                    "file_size": 48213,
+                    "content_type": "image/webp"
+                },
+                "task_id": str(uuid.uuid4()),
+                "error": None
+            })
+        })
+        pipe.expire(f"job_files:{self.job_id}", JOB_TTL)
+        pipe.execute()
+        self._count(2)
+
+        if self.mode == "counter":
+            _, remaining = self.counter.complete_file(self.job_id, file_index)
+            self._count(1)
+            if remaining == 0:
+                self.last_completed_at = time.perf_counter()
+                self.finalize()
+            return
+
+        jkey, tkey, skey = (f"chord-unlock-{self.group_id}{suffix}" for suffix in (".j", ".t", ".s"))
+        pipe = self.client.pipeline()
+        pipe.rpush(jkey, encode([1, task_id, "SUCCESS", ref])).llen(jkey).get(tkey).get(skey)
+        pipe.expire(jkey, RESULT_EXPIRES).expire(tkey, RESULT_EXPIRES).expire(skey, RESULT_EXPIRES)
+        _, ready, _, size = pipe.execute()[:4]
+        self._count(1)
+        if ready != int(size):
+            return
+
+        self.last_completed_at = time.perf_counter()
+        # GroupResult.restore, then the stashed member results
+        self.client.get(f"celery-taskset-meta-{self.group_id}")
+        members = self.client.lrange(jkey, 0, self.total_files)
+        results = [decode(member)[3] for member in members]
+        self.client.lpush(CALLBACK_QUEUE, encode([[results], {
+            "job_id": self.job_id, "total_files": self.total_files, "face_limit": None
+        }, {"callbacks": None, "errbacks": None, "chain": None, "chord": None}]))
+        self.client.pipeline().delete(jkey).delete(tkey).delete(skey).execute()
+        self._count(4, sum(len(member) for member in members))
+
+        # The worker receiving finalize_batch_results
+        message = self.client.rpop(CALLBACK_QUEUE)
+        self._count(1, len(message))
+        args, _, _ = decode(message)
+        self.finalize(args[0])
+
+    def finalize(self, results: List[Dict[str, Any]] = None) -> None:
+        data = self.client.hgetall(f"job_files:{self.job_id}")
+        entries = [json.loads(value) for field, value in data.items() if field.startswith(b"file:")]
+        if results is None:
+            results = entries
+        successful = sum(1 for result in results if result["status"] == "completed")
+        self.client.set(f"job_result:{self.job_id}", json.dumps({
+            "job_id": self.job_id,
+            "files": [entry for entry in entries if entry["status"] == "completed"],
+            "total_files": self.total_files,
+            "successful_files": successful,
+            "failed_files": len(results) - successful
+        }), ex=JOB_TTL)
+        self.stored_at = time.perf_counter()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(f"celery-task-meta-{self.batch_task_id}", encode({
+            "status": "SUCCESS", "result": {"job_id": self.job_id, "successful_files": successful},
+            "traceback": None, "children": [], "date_done": "2024-03-15T12:34:56.789012",
+            "task_id": self.batch_task_id
+        }), ex=RESULT_EXPIRES)
+        pipe.publish(f"celery-task-meta-{self.batch_task_id}", b"")
+        pipe.execute()
+        self._count(3, sum(len(field) + len(value) for field, value in data.items()))
+        if self.mode == "counter":
+            self.counter.clear(self.job_id)
+            self._count(1)
+
+    def cleanup(self) -> None:
+        keys = [f"job_files:{self.job_id}", f"job_result:{self.job_id}", f"celery-task-meta-{self.batch_task_id}"]
+        keys += [f"celery-task-meta-{task_id}" for task_id in self.task_ids]
+        self.client.delete(*keys)
+
+
+def run(client, mode: str, total_files: int, concurrency: int) -> Dict[str, float]:
+    """Complete one batch of ``total_files`` files on ``concurrency`` threads."""
+    batch = BatchRun(client, mode, total_files)
+    batch.dispatch()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(batch.complete_file, range(total_files)))
+    finished = time.perf_counter()
+    batch.cleanup()
+    return {
+        "round_trips": batch.round_trips,
+        "finalize_bytes": batch.finalize_bytes,
+        "wall_ms": (finished - started) * 1000,
+        "finalize_ms": (batch.stored_at - batch.last_completed_at) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[25, 250], help="Files per batch")
+    parser.add_argument("--concurrency", type=int, default=8, help="Files completing at once (worker slots)")
+    parser.add_argument("--rounds", type=int, default=5, help="Batches per mode and size")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15",
+                        help="Redis to run against (use a database without live data)")
+    args = parser.parse_args()
+
+    settings.CELERY_RESULT_BACKEND = args.redis_url
+    client = redis.from_url(args.redis_url, decode_responses=False)
+    client.ping()
+
+    header = (f"{'files':>6} {'mode':<8} {'round trips':>12} {'finalize bytes':>15} "
+              f"{'wall ms':>9} {'finalize ms':>12}")
+    print(f"{args.concurrency} concurrent workers, {args.rounds} rounds, serializer {get_celery_serializer()}\n")
+    print(header)
+    print("-" * len(header))
+    for total_files in args.files:
+        for mode in ("chord", "counter"):
+            rounds = [run(client, mode, total_files, args.concurrency) for _ in range(args.rounds)]
+            print(f"{total_files:>6} {mode:<8} {rounds[0]['round_trips']:>12} {rounds[0]['finalize_bytes']:>15} "
+                  f"{statistics.median(r['wall_ms'] for r in rounds):>9.1f} "
+                  f"{statistics.median(r['finalize_ms'] for r in rounds):>12.2f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark of the Celery serializers on batch payloads.
+
+Compares json, msgpack and msgpack-compact (see app.core.serialization) on the
+payloads a 25-file batch writes: chord header task messages, progress updates,
+file result references, the finalize summary, and the per-file results list
+that finalize returned before results were reduced to references. For each
+payload it reports the encoded size, encode/decode time and, with
+``--redis-url``, the Redis memory of the encoded value.
+
+Usage (from backend/):
+    python -m scripts.benchmark_serializers [--files 25] [--threshold 1024] [--redis-url redis://localhost:6379/0]
+"""
+
+import argparse
+import timeit
+import uuid
+from typing import Dict, Any, List, Tuple
+
+from kombu.serialization import dumps, loads
+
+from app.core.config import settings
+from app.core.serialization import COMPACT_SERIALIZER, register_compact_serializer
+
+SERIALIZERS = ["json", "msgpack", COMPACT_SERIALIZER]
+
+
+def batch_payloads(total_files: int) -> List[Tuple[str, Any]]:
+    """Build the payloads of a batch of ``total_files`` files, shaped as Celery writes them."""
+    job_id = str(uuid.uuid4())
+    batch_id = str(uuid.uuid4())
+    chord_task_id = str(uuid.uuid4())
+    finalize_signature = {
+        "task": "app.workers.tasks.finalize_batch_results",
+        "args": [],
+        "kwargs": {"job_id": job_id, "total_files": total_files, "face_limit": None},
+        "options": {"task_id": chord_task_id, "queue": "default"},
+        "subtask_type": None,
+        "immutable": False,
+        "chord_size": total_files
+    }
+    # Protocol 2 message body: (args, kwargs, embed)
+    file_message = [[], {
+        "file_path": f"uploads/{batch_id}/{uuid.uuid4()}.jpg",
+        "job_id": job_id,
+        "face_limit": None,
+        "file_index": 3,
+        "total_files": total_files
+    }, {"callbacks": None, "errbacks": None, "chain": None, "chord": finalize_signature}]
+
+    def task_meta(status: str, result: Any) -> Dict[str, Any]:
+        return {"status": status, "result": result, "traceback": None, "children": [],
+                "date_done": None if status == "PROGRESS" else "2024-03-15T12:34:56.789012",
+                "task_id": str(uuid.uuid4())}
+
+    progress = task_meta("PROGRESS", {
+        "current": 3,
+        "total": total_files,
+        "total_files": total_files,
+        "status": f"Processing {total_files} files in parallel across workers...",
+        "job_id": job_id
+    })
+    file_ref = task_meta("SUCCESS", {"job_id": job_id, "file_index": 3, "status": "completed"})
+    full_results = [{
+        "file_path": f"uploads/{batch_id}/{uuid.uuid4()}.jpg",
+        "status": "completed",
+        "result_path": f"https://v3.fal.media/files/lion/{uuid.uuid4().hex}_model.glb",
+        "download_url": f"https://v3.fal.media/files/lion/{uuid.uuid4().hex}_model.glb",
+        "model_url": f"https://v3.fal.media/files/lion/{uuid.uuid4().hex}_model.glb",
+        "rendered_image": {
+            "url": f"https://v3.fal.media/files/tiger/{uuid.uuid4().hex}_preview.webp",
+            "file_size": 48213,
+            "content_type": "image/webp"
+        },
+        "filename": f"image_{index}.glb",
+        "face_count": 1000,
+        "processing_time": 87.35,
+        "model_format": "glb",
+        "file_size": 2389102,
+        "content_type": "model/gltf-binary",
+        "task_id": str(uuid.uuid4())
+    } for index in range(total_files)]
+    counts = {"job_id": job_id, "status": "completed", "total_files": total_files,
+              "successful_files": total_files, "failed_files": 0, "timeout_files": 0, "face_limit": None,
+              "message": f"Batch processing completed. {total_files} successful, 0 failed, 0 timed out."}
+
+    return [
+        ("file task message", file_message),
+        ("progress meta", progress),
+        ("file result ref", file_ref),
+        ("legacy file result", task_meta("SUCCESS", full_results[0])),
+        ("finalize summary", task_meta("SUCCESS", counts)),
+        ("legacy finalize summary", task_meta("SUCCESS", {**counts, "results": full_results}))
+    ]
+
+
+def measure(payload: Any, serializer: str, number: int) -> Dict[str, float]:
+    """Get the encoded size and mean encode/decode time (microseconds) of a payload."""
+    content_type, content_encoding, data = dumps(payload, serializer=serializer)
+    encode_seconds = timeit.timeit(lambda: dumps(payload, serializer=serializer), number=number)
+    decode_seconds = timeit.timeit(lambda: loads(data, content_type, content_encoding, accept={content_type}), number=number)
+    return {
+        "data": data,
+        "bytes": len(data),
+        "encode_us": encode_seconds / number * 1e6,
+        "decode_us": decode_seconds / number * 1e6
+    }
+
+
+def redis_memory(client, data) -> int:
+    """Get the Redis memory used by a key holding ``data``."""
+    key = f"benchmark:serializer:{uuid.uuid4()}"
+    client.set(key, data, ex=60)
+    try:
+        return client.memory_usage(key, samples=0)
+    finally:
+        client.delete(key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=25, help="Files per batch")
+    parser.add_argument("--threshold", type=int, default=1024, help="Compression threshold of msgpack-compact (bytes)")
+    parser.add_argument("--number", type=int, default=2000, help="Encode/decode repetitions per payload")
+    parser.add_argument("--redis-url", help="Also measure Redis memory per value")
+    args = parser.parse_args()
+
+    settings.CELERY_COMPRESSION_THRESHOLD_BYTES = args.threshold
+    register_compact_serializer()
+    client = None
+    if args.redis_url:
+        import redis
+        client = redis.from_url(args.redis_url)
+
+    header = f"{'payload':<24} {'serializer':<16} {'bytes':>8} {'encode us':>10} {'decode us':>10}"
+    if client:
+        header += f" {'redis bytes':>12}"
+    print(f"{args.files} files per batch, msgpack-compact threshold {args.threshold} bytes\n")
+    print(header)
+    print("-" * len(header))
+    for name, payload in batch_payloads(args.files):
+        for serializer in SERIALIZERS:
+            result = measure(payload, serializer, args.number)
+            line = (f"{name:<24} {serializer:<16} {result['bytes']:>8} "
+                    f"{result['encode_us']:>10.1f} {result['decode_us']:>10.1f}")
+            if client:
+                line += f" {redis_memory(client, result['data']):>12}"
+            print(line)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ Tests API functionality, error handling, and response formats.
 
 import pytest
 import json
+import time
 import uuid
 from typing import Dict, Any
 
@@ -51,6 +52,21 @@ class TestAPIEndpoints:
             assert 'response_time_ms' in component
             assert component['status'] in ['healthy', 'unhealthy', 'degraded']
     
+    def test_detailed_health_reports_worker_capacity(self, http_session, test_config, services_ready):
+        """Test celery health comes from worker heartbeats and reports queue depth."""
+        url = f"{test_config['backend_url']}/api/v1/health/detailed"
+        response = http_session.get(url, timeout=test_config['timeout'])
+        
+        assert response.status_code == 200
+        celery = next(c for c in response.json()['components'] if c['name'] == 'celery')
+        
+        assert celery['details']['active_workers'] >= 1
+        queues = celery['details']['queues']
+        assert 'model_generation' in queues
+        for queue in queues.values():
+            assert queue['depth'] >= 0
+            assert queue['workers'] >= 0
+    
     def test_metrics_endpoint(self, http_session, test_config, services_ready):
         """Test Prometheus metrics endpoint."""
         url = f"{test_config['backend_url']}/api/v1/health/metrics"
@@ -234,6 +250,40 @@ class TestAPIEndpoints:
         error_data = response.json()
         assert error_data.get('error') == True
     
+    @pytest.mark.slow
+    def test_job_download_reports_file_statuses(self, auth_http_session, test_config, multiple_image_files, services_ready):
+        """Test that the job files listing reports per-file status while the batch runs."""
+        upload_url = f"{test_config['backend_url']}/api/v1/upload"
+        files = [('files', (img_file.name, open(img_file, 'rb'), 'image/jpeg')) for img_file in multiple_image_files[:2]]
+        try:
+            upload_response = auth_http_session.post(upload_url, files=files, timeout=test_config['timeout'])
+        finally:
+            for _, (_, f, _) in files:
+                f.close()
+        assert upload_response.status_code == 200, f"Upload failed: {upload_response.text}"
+        job_id = upload_response.json()['job_id']
+        
+        url = f"{test_config['backend_url']}/api/v1/download/{job_id}/all"
+        listings = []
+        deadline = time.time() + 180
+        while time.time() < deadline:
+            response = auth_http_session.get(url, timeout=test_config['timeout'])
+            if response.status_code == 200:
+                data = response.json()
+                listings.append(data)
+                if data['status'] == "completed":
+                    break
+            time.sleep(2)
+        
+        if not listings:
+            pytest.skip("No file of the job finished in time")
+        for data in listings:
+            for file_status in data['file_statuses']:
+                assert 'file_index' in file_status
+                assert 'status' in file_status
+            assert data['pending_files'] == 2 - len(data['file_statuses'])
+            assert data['status'] == ("processing" if data['pending_files'] > 0 else "completed")
+    
     def test_cleanup_endpoint_post(self, admin_http_session, test_config, services_ready):
         """Test manual cleanup endpoint."""
         url = f"{test_config['backend_url']}/api/v1/admin/cleanup"
@@ -61,6 +61,14 @@ class TestAuthentication:
         error_data = response.json()
         assert error_data.get('message') == 'Invalid admin API key'
     
+    def test_log_export_requires_admin_key(self, auth_http_session, test_config, services_ready):
+        """Test that log exports can only be streamed or downloaded with the admin API key."""
+        for endpoint in ("/api/v1/logs/export/stream", "/api/v1/logs/export/some-export/download"):
+            url = f"{test_config['backend_url']}{endpoint}"
+            response = auth_http_session.get(url, timeout=test_config['timeout'])
+            assert response.status_code == 403, f"{endpoint} allowed a regular API key"
+            assert response.json().get('message') == 'Invalid admin API key'
+    
     def test_admin_endpoint_with_admin_key_succeeds(self, admin_http_session, test_config, services_ready):
         """Test that admin API key allows access to admin endpoints."""
         url = f"{test_config['backend_url']}/api/v1/admin/disk-usage"
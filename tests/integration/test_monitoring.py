@@ -149,6 +149,29 @@ class TestMonitoring:
             "http_request_duration_seconds" in updated_metrics
         ), "Request duration metrics not found"
 
+    def test_request_metrics_use_route_templates(
+        self, http_session, test_config, services_ready
+    ):
+        """Test that request metrics are labelled by route template, not raw path."""
+        job_id = f"metrics-label-{int(time.time() * 1000)}"
+        http_session.get(
+            f"{test_config['backend_url']}/api/v1/status/jobs/{job_id}/progress",
+            timeout=test_config["timeout"],
+        )
+
+        response = http_session.get(
+            f"{test_config['backend_url']}/api/v1/health/metrics",
+            timeout=test_config["timeout"],
+        )
+        assert response.status_code == 200
+
+        assert (
+            'endpoint="/api/v1/status/jobs/{job_id}/progress"' in response.text
+        ), "Request metrics should be labelled with the route template"
+        assert (
+            job_id not in response.text
+        ), "Raw request paths must not appear as metric labels"
+
     def test_health_check_endpoints(
         self, http_session, test_config, services_ready
     ):
@@ -12,7 +12,9 @@ import pytest
 import asyncio
 import time
 import json
+import uuid
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 import requests
 import sseclient
@@ -366,4 +368,101 @@ class TestUploadAPIErrors:
         # Should be able to reconnect
         response2 = requests.get(sse_url, stream=True, timeout=5)
         assert response2.status_code == 200
-        response2.close()
\ No newline at end of file
+        response2.close()
+
+@pytest.mark.integration
+class TestUploadIdempotency:
+    """Test the Idempotency-Key contract of the upload endpoint."""
+    
+    def _upload(self, session, test_config, image_files, idempotency_key, face_limit=None):
+        url = f"{test_config['backend_url']}/api/v1/upload"
+        files = [('files', (img_file.name, open(img_file, 'rb'), 'image/jpeg')) for img_file in image_files]
+        data = {'face_limit': str(face_limit)} if face_limit is not None else None
+        try:
+            return session.post(url, files=files, data=data, headers={'Idempotency-Key': idempotency_key},
+                                timeout=test_config['timeout'])
+        finally:
+            for _, (_, f, _) in files:
+                f.close()
+    
+    def test_retry_replays_first_response(self, auth_http_session, test_config, multiple_image_files, services_ready):
+        """Test that a retry with the same key gets the same job instead of a second one."""
+        key = str(uuid.uuid4())
+        first = self._upload(auth_http_session, test_config, multiple_image_files[:2], key)
+        assert first.status_code == 200, f"Upload failed: {first.text}"
+        
+        retry = self._upload(auth_http_session, test_config, multiple_image_files[:2], key)
+        assert retry.status_code == 200, f"Retry failed: {retry.text}"
+        assert retry.json()['job_id'] == first.json()['job_id']
+        assert retry.json()['task_id'] == first.json()['task_id']
+        assert retry.json()['batch_id'] == first.json()['batch_id']
+    
+    def test_key_reused_for_different_upload(self, auth_http_session, test_config, multiple_image_files, services_ready):
+        """Test that reusing a key for other files or parameters is rejected."""
+        key = str(uuid.uuid4())
+        first = self._upload(auth_http_session, test_config, multiple_image_files[:1], key)
+        assert first.status_code == 200, f"Upload failed: {first.text}"
+        
+        other_file = self._upload(auth_http_session, test_config, multiple_image_files[1:2], key)
+        assert other_file.status_code == 422
+        assert other_file.json().get('error') == True
+        
+        other_face_limit = self._upload(auth_http_session, test_config, multiple_image_files[:1], key, face_limit=5000)
+        assert other_face_limit.status_code == 422
+    
+    def test_concurrent_requests_with_same_key(self, test_config, multiple_image_files, services_ready):
+        """Test that concurrent requests with one key start a single job; the others get 409."""
+        key = str(uuid.uuid4())
+        headers = {'Authorization': f"Bearer {test_config['api_key']}"}
+        
+        def send(_):
+            # Plain requests so 409 is not retried and each thread has its own connection
+            with requests.Session() as session:
+                session.headers.update(headers)
+                return self._upload(session, test_config, multiple_image_files[:3], key)
+        
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            responses = list(pool.map(send, range(4)))
+        
+        statuses = [response.status_code for response in responses]
+        assert set(statuses) <= {200, 409}, f"Unexpected statuses: {statuses}"
+        assert 200 in statuses
+        assert len({response.json()['job_id'] for response in responses if response.status_code == 200}) == 1
+        for response in responses:
+            if response.status_code == 409:
+                assert int(response.headers['Retry-After']) > 0
+
+
+@pytest.mark.integration
+@pytest.mark.slow
+class TestUploadAdmission:
+    """Test admission control responses of the upload endpoint."""
+    
+    def test_rejected_upload_carries_retry_after(self, test_config, multiple_image_files, services_ready):
+        """Test that uploads over the in-flight limit or capacity get 429/503 with Retry-After."""
+        url = f"{test_config['backend_url']}/api/v1/upload"
+        # Plain requests: the shared sessions retry 429 and 503
+        headers = {'Authorization': f"Bearer {test_config['api_key']}"}
+        
+        # Full batches of repeated images, so most files are deduplicated instead of generated
+        for _ in range(6):
+            files = [
+                ('files', (f"burst_{i}.jpg", open(multiple_image_files[i % len(multiple_image_files)], 'rb'), 'image/jpeg'))
+                for i in range(25)
+            ]
+            try:
+                response = requests.post(url, files=files, headers=headers, timeout=test_config['timeout'])
+            finally:
+                for _, (_, f, _) in files:
+                    f.close()
+            if response.status_code in (429, 503):
+                break
+            assert response.status_code == 200, f"Upload failed: {response.text}"
+        else:
+            pytest.skip("Admission limits were not reached")
+        
+        retry_after = int(response.headers['Retry-After'])
+        assert retry_after > 0
+        data = response.json()
+        assert data.get('error') == True
+        assert data['details']['retry_after'] == retry_after